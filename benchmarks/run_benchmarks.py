@@ -0,0 +1,308 @@
+"""
+Benchmarks of the hot paths of milex_scheduler on synthetic bundles (see synthetic_bundles.py).
+
+Every run is appended to a JSON history file, and compared with the previous run of the history,
+so that regressions can be caught and versions compared. The benchmarks run in a temporary
+milex directory with its own configuration, and submit to the simulated cluster of milex_scheduler.fake_cluster.
+
+Example:
+    python benchmarks/run_benchmarks.py --sizes 10 100 1000 10000 --shapes chain random_dag
+    python benchmarks/run_benchmarks.py --sizes 100000 --stages save_bundle load_bundle dependency_graph
+"""
+
+from synthetic_bundles import SHAPES
+from argparse import ArgumentParser
+from contextlib import redirect_stdout
+from datetime import datetime, timedelta
+import subprocess
+import platform
+import tempfile
+import warnings
+import copy
+import json
+import time
+import sys
+import os
+
+STAGES = [
+    "save_bundle",
+    "save_job_append",
+    "nearest_bundle_filename",
+    "load_bundle",
+    "dependency_graph",
+    "create_slurm_script",
+    "submit_jobs",
+]
+DATE_FORMAT = "%Y%m%d%H%M%S"
+HISTORY_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.json")
+
+
+def setup_milex_home(workdir: str) -> dict:
+    """Creates a milex configuration in a temporary HOME. Must run before milex_scheduler is imported."""
+    os.environ["HOME"] = workdir
+    milex = os.path.join(workdir, "milex")
+    for directory in ["jobs", "slurm"]:
+        os.makedirs(os.path.join(milex, directory), exist_ok=True)
+    config = {
+        "local": {
+            "path": milex,
+            "slurm_account": "def-bench",
+            "env_command": "true",
+        }
+    }
+    with open(os.path.join(workdir, ".milexconfig"), "w") as f:
+        json.dump(config, f)
+    return config
+
+
+def populate_jobs_directory(jobs_dir: str, name: str, size: int) -> None:
+    """Fills the jobs directory with size bundle files, half of them of the benchmarked bundle."""
+    date = datetime(2020, 1, 1)
+    for i in range(size):
+        bundle_name = name if i % 2 == 0 else f"other{i % 97}"
+        filename = (
+            f"{bundle_name}_{(date + timedelta(minutes=i)).strftime(DATE_FORMAT)}.json"
+        )
+        with open(os.path.join(jobs_dir, filename), "w") as f:
+            f.write("{}")
+
+
+def timed(function, repeat: int) -> float:
+    """Best time of repeat calls of function, in seconds. Output and warnings of milex are discarded."""
+    best = float("inf")
+    with open(os.devnull, "w") as devnull, redirect_stdout(
+        devnull
+    ), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_case(shape: str, size: int, stages: list, args, config: dict) -> list:
+    from milex_scheduler import (
+        save_bundle,
+        save_job,
+        load_bundle,
+        nearest_bundle_filename,
+        dependency_graph,
+        submit_jobs,
+    )
+    from milex_scheduler.job_to_slurm import create_slurm_script
+
+    bundle = SHAPES[shape](size)
+    name = f"{shape}{size}"
+    jobs_dir = os.path.join(config["local"]["path"], "jobs")
+    results = []
+
+    def record(stage, seconds, jobs=size):
+        results.append(
+            {
+                "shape": shape,
+                "size": size,
+                "stage": stage,
+                "jobs": jobs,
+                "seconds": seconds,
+            }
+        )
+        print(f"{shape:>12} {size:>7} {stage:>24} {jobs:>7} jobs {seconds:10.4f} s")
+
+    if "save_bundle" in stages:
+        record(
+            "save_bundle",
+            timed(lambda: save_bundle(copy.deepcopy(bundle), name), args.repeat),
+        )
+    else:
+        timed(lambda: save_bundle(copy.deepcopy(bundle), name), 1)
+
+    if "save_job_append" in stages:
+        n = min(size, args.max_append)
+        jobs = [copy.deepcopy(job) for job in list(bundle.values())[:n]]
+        record(
+            "save_job_append",
+            timed(
+                lambda: [
+                    save_job(dict(job), f"append{name}", append=True) for job in jobs
+                ],
+                1,
+            ),
+            jobs=n,
+        )
+
+    if "nearest_bundle_filename" in stages:
+        populate_jobs_directory(jobs_dir, name, size)
+        record(
+            "nearest_bundle_filename",
+            timed(lambda: nearest_bundle_filename(name), args.repeat),
+        )
+
+    if "load_bundle" in stages:
+        record("load_bundle", timed(lambda: load_bundle(name), args.repeat))
+
+    if "dependency_graph" in stages:
+        record("dependency_graph", timed(lambda: dependency_graph(bundle), args.repeat))
+
+    jobs, _, date = load_bundle(name)
+    if "create_slurm_script" in stages:
+        record(
+            "create_slurm_script",
+            timed(
+                lambda: [
+                    create_slurm_script(job, date, config["local"]) for job in jobs
+                ],
+                args.repeat,
+            ),
+        )
+
+    if "submit_jobs" in stages and size <= args.max_submit:
+        record("submit_jobs", timed(lambda: submit_jobs(name, config["local"]), 1))
+    return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except OSError:
+        return ""
+
+
+def compare(results: list, previous: dict, threshold: float) -> list:
+    """Prints the ratio of each time to the same case of the previous run. Returns the regressions."""
+    reference = {
+        (r["shape"], r["size"], r["stage"], r["jobs"]): r["seconds"]
+        for r in previous["results"]
+    }
+    regressions = []
+    print(
+        f"\nComparison with the run of {previous['date']} ({previous.get('commit') or previous.get('label')}):"
+    )
+    for r in results:
+        before = reference.get((r["shape"], r["size"], r["stage"], r["jobs"]))
+        if not before:
+            continue
+        ratio = r["seconds"] / before
+        flag = " REGRESSION" if ratio > threshold else ""
+        print(f"{r['shape']:>12} {r['size']:>7} {r['stage']:>24} x{ratio:6.2f}{flag}")
+        if flag:
+            regressions.append(r)
+    return regressions
+
+
+def parse_args():
+    parser = ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=[10, 100, 1000],
+        help="Number of jobs of the bundles.",
+    )
+    parser.add_argument(
+        "--shapes",
+        nargs="+",
+        default=list(SHAPES),
+        choices=list(SHAPES),
+        help="Dependency structures.",
+    )
+    parser.add_argument(
+        "--stages",
+        nargs="+",
+        default=STAGES,
+        choices=STAGES,
+        help="Functions to benchmark.",
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Number of repetitions, the best time is kept.",
+    )
+    parser.add_argument(
+        "--max_append",
+        type=int,
+        default=1000,
+        help="Maximum number of jobs appended one by one with save_job.",
+    )
+    parser.add_argument(
+        "--max_submit",
+        type=int,
+        default=200,
+        help="Maximum size of the bundles submitted to the simulated cluster.",
+    )
+    parser.add_argument(
+        "--history",
+        default=HISTORY_PATH,
+        help="JSON file where the results are appended.",
+    )
+    parser.add_argument(
+        "--label",
+        default=None,
+        help="Label of the run in the history (e.g. a version).",
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=1.25,
+        help="Ratio to the previous run above which a time is a regression.",
+    )
+    parser.add_argument(
+        "--fail_on_regression",
+        action="store_true",
+        help="Exit with status 1 if a regression is found.",
+    )
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    workdir = tempfile.mkdtemp(prefix="milex-bench-")
+    config = setup_milex_home(workdir)
+    from milex_scheduler.fake_cluster import install_shims
+
+    os.environ.update(
+        install_shims(
+            os.path.join(workdir, "bin"),
+            os.path.join(workdir, "cluster"),
+            cpus=100000,
+            mem="100000G",
+        )
+    )
+
+    results = []
+    for shape in args.shapes:
+        for size in args.sizes:
+            results.extend(run_case(shape, size, args.stages, args, config))
+
+    from importlib.metadata import version
+
+    run = {
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "label": args.label,
+        "commit": git_commit(),
+        "version": version("milex_scheduler"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    history = []
+    if os.path.exists(args.history):
+        with open(args.history, "r") as f:
+            history = json.load(f)
+    regressions = compare(results, history[-1], args.threshold) if history else []
+    history.append(run)
+    with open(args.history, "w") as f:
+        json.dump(history, f, indent=4)
+    print(f"\nResults appended to {args.history}")
+    if regressions and args.fail_on_regression:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Generators of synthetic job bundles with the dependency structures found in practice
+"""
+
+import random
+
+__all__ = ["chain", "fan", "diamond", "random_dag", "sweep", "SHAPES"]
+
+
+def make_job(name: str, index: int, dependencies: list = None) -> dict:
+    job = {
+        "name": name,
+        "script": "echo",
+        "script_args": {
+            "index": index,
+            "learning_rate": 10 ** -(index % 5),
+            "seed": index,
+        },
+        "slurm": {"time": "00:10:00", "cpus_per_task": 1, "mem": "1G"},
+        "pre_commands": ["#MILEX_SIM runtime=60"],
+    }
+    if dependencies:
+        job["dependencies"] = dependencies
+    return job
+
+
+def chain(n: int) -> dict:
+    """Every job depends on the previous one."""
+    return {
+        f"job{i}": make_job(f"job{i}", i, [f"job{i-1}"] if i > 0 else None)
+        for i in range(n)
+    }
+
+
+def fan(n: int) -> dict:
+    """A single job followed by n - 1 jobs depending on it."""
+    bundle = {"job0": make_job("job0", 0)}
+    for i in range(1, n):
+        bundle[f"job{i}"] = make_job(f"job{i}", i, ["job0"])
+    return bundle
+
+
+def diamond(n: int) -> dict:
+    """Stacked diamonds: each top job has two children that both lead to the top of the next diamond."""
+    bundle = {"job0": make_job("job0", 0)}
+    top, i = "job0", 1
+    while i + 2 < n:
+        left, right, bottom = f"job{i}", f"job{i+1}", f"job{i+2}"
+        bundle[left] = make_job(left, i, [top])
+        bundle[right] = make_job(right, i + 1, [top])
+        bundle[bottom] = make_job(bottom, i + 2, [left, right])
+        top, i = bottom, i + 3
+    for j in range(i, n):  # Pad to n jobs
+        bundle[f"job{j}"] = make_job(f"job{j}", j, [top])
+    return bundle
+
+
+def random_dag(n: int, max_parents: int = 3, seed: int = 42) -> dict:
+    """Every job depends on up to max_parents jobs chosen at random among the previous ones."""
+    rng = random.Random(seed)
+    bundle = {}
+    for i in range(n):
+        parents = rng.sample(range(i), min(i, rng.randint(0, max_parents)))
+        bundle[f"job{i}"] = make_job(f"job{i}", i, [f"job{p}" for p in parents])
+    return bundle
+
+
+def sweep(n: int) -> dict:
+    """Independent jobs with different arguments, like a hyperparameter sweep."""
+    return {f"job{i}": make_job(f"job{i}", i) for i in range(n)}
+
+
+SHAPES = {
+    "chain": chain,
+    "fan": fan,
+    "diamond": diamond,
+    "random_dag": random_dag,
+    "sweep": sweep,
+}
@@ -1,6 +1,105 @@
-from .definitions import *
-from .utils import *
-from .job_dependency import *
-from .save_load_jobs import *
-from .run_slurm import *
-from .job_runner import *
+"""
+The API of milex is loaded lazily: a submodule is only imported when one of its names is first accessed,
+so that the command line applications only pay for the modules they use.
+"""
+
+import importlib
+
+# Public names of each submodule (their __all__)
+_SUBMODULES = {
+    "definitions": ["CONFIG_FILE_PATH", "MACHINE_KEYS", "DATE_FORMAT"],
+    "tracing": ["span", "traced", "enable_tracing", "disable_tracing", "write_trace"],
+    "utils": ["load_config", "machine_config"],
+    "job_dependency": [
+        "dependency_graph",
+        "update_slurm_with_dependencies",
+        "dependency_options",
+    ],
+    "save_load_jobs": [
+        "save_job",
+        "save_bundle",
+        "load_bundle",
+        "transfer_slurm_to_remote",
+        "transfer_slurm_bundle_to_remote",
+        "nearest_bundle_filename",
+        "list_bundles",
+    ],
+    "governor": [
+        "is_transient_error",
+        "SubmissionGovernor",
+        "machine_governor",
+        "governor_metrics",
+    ],
+    "run_slurm": [
+        "get_job_id_from_sbatch_output",
+        "run_slurm_remotely",
+        "run_slurm_locally",
+        "run_slurm_from_stdin",
+        "run_slurm_command",
+        "ssh_control_options",
+        "ssh_args",
+        "query_sacct",
+    ],
+    "job_db": [
+        "connect_job_db",
+        "record_submission",
+        "query_jobs",
+        "set_failure",
+        "set_job_state",
+        "sync_job_states",
+        "script_hash",
+    ],
+    "rightsizing": [
+        "collect_usage",
+        "recommend_resources",
+        "rightsize_job",
+        "wasted_core_hours",
+    ],
+    "instrumentation": ["collect_instrumentation", "summarize_instrumentation"],
+    "env_snapshot": ["env_snapshot_hash", "env_snapshot_commands"],
+    "staging": ["stage_in_commands", "stage_out_commands"],
+    "checkpoint": [
+        "checkpoint_policy",
+        "checkpoint_directives",
+        "checkpoint_commands",
+        "checkpoint_requeue_commands",
+    ],
+    "local_executor": ["run_bundle_locally"],
+    "backlog": [
+        "is_submit_limit_error",
+        "count_queued_jobs",
+        "free_submit_slots",
+        "backlog_jobs",
+        "submit_backlog",
+    ],
+    "remote_bundle": [
+        "deploy_remote_helper",
+        "submit_with_remote_helper",
+        "query_with_remote_helper",
+    ],
+    "job_runner": ["submit_jobs", "submit_bundles"],
+    "retry": [
+        "classify_failure",
+        "escalate_resources",
+        "retry_failed_jobs",
+        "prune_orphaned_jobs",
+    ],
+    "queue_probe": ["probe_start_times", "estimate_makespan", "select_machine"],
+    "resource_shapes": ["expand_shapes", "optimize_shapes"],
+    "report": ["bundle_timeline", "analyze_timeline", "timeline_trace"],
+    "daemon": ["daemon_socket_path", "delegate_to_daemon", "serve"],
+}
+_EXPORTS = {name: module for module, names in _SUBMODULES.items() for name in names}
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(importlib.import_module(f".{_EXPORTS[name]}", __name__), name)
+        globals()[name] = value  # Later accesses do not go through __getattr__
+        return value
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
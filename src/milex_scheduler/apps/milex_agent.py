@@ -0,0 +1,50 @@
+import argparse
+import threading
+import time
+from ..daemon import daemon_lock, serve
+
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    argparse.Namespace: The parsed command line arguments.
+    """
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Submit the backlogged jobs as slots free up in the queue of the user.")
+    parser.add_argument("--machine", required=False, help="Only submit the backlog of this machine (hostname or hosturl, 'local' for the local machine).")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between two submission cycles.")
+    parser.add_argument("--once", action="store_true", help="Run a single submission cycle.")
+    parser.add_argument("--serve", action="store_true", help="Also run the milex daemon: milex-schedule, milex-submit and milex-status "
+                                                              "then run in this process, with warm SSH connections. "
+                                                              "The agent keeps running when the backlog is empty.")
+    # fmt: on
+    return parser.parse_args()
+
+
+def submit_backlog_cycles(args, keep_running: bool = False):
+    from ..backlog import submit_backlog
+
+    while True:
+        # Not while the daemon runs a command, whose output is redirected to its client
+        with daemon_lock:
+            remaining = submit_backlog(machine=args.machine)
+            if remaining:
+                print(f"{remaining} jobs left in the backlog.")
+            elif not keep_running:
+                print("The backlog is empty.")
+        if (remaining == 0 and not keep_running) or args.once:
+            break
+        time.sleep(args.interval)
+
+
+def main():
+    args = parse_args()
+    if args.serve:
+        threading.Thread(
+            target=submit_backlog_cycles, args=(args, True), daemon=True
+        ).start()
+        serve()
+    else:
+        submit_backlog_cycles(args)
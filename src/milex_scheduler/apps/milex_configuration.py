@@ -1,10 +1,15 @@
 import os
 import subprocess
 import json
+import shlex
 import socket
 from ..definitions import CONFIG_FILE_PATH
 from ..utils import ssh_host_from_config
 
+MILEX_DIRECTORIES = ["data", "models", "slurm", "jobs", "results"]
+PROVISION_WORKERS = 8  # Machines provisioned concurrently
+PROVISION_TIMEOUT = 60  # Seconds before the provisioning of a machine is abandoned
+
 
 def expand_path(path):
     """Expand environment variables, the tilde, and the current directory in a file path."""
@@ -32,9 +37,15 @@ def setup_directories(base_path, directories, hostname=None):
                 print(f"Directory already exists: {path}")
 
 
+def export_command(base_path):
+    """Shell command appending the MILEX environment variable to .bashrc, unless it is already there."""
+    line = shlex.quote(f'export MILEX="{base_path}"')
+    return f"grep -qxF {line} ~/.bashrc 2>/dev/null || echo {line} >> ~/.bashrc"
+
+
 def update_bashrc(base_path, hostname=None):
     """Append MILEX environment variable to .bashrc for persistence, locally or remotely."""
-    bash_command = f'echo "export MILEX=\\"{base_path}\\"" >> ~/.bashrc'
+    bash_command = export_command(base_path)
     if hostname is not None:
         ssh_command = ["ssh", hostname, bash_command]
         subprocess.run(ssh_command)
@@ -42,6 +53,43 @@ def update_bashrc(base_path, hostname=None):
         os.system(bash_command)
 
 
+def provision_command(base_path, directories):
+    """Idempotent shell command creating the directories of milex and exporting MILEX, in a single session."""
+    # Unquoted, like the paths of the configuration elsewhere, so that ~ and variables expand on the machine
+    paths = " ".join(os.path.join(base_path, d) for d in directories)
+    return f"mkdir -p {paths} && {{ {export_command(base_path)}; }}"
+
+
+def provision_remote_machine(machine_name, machine_config, timeout=PROVISION_TIMEOUT):
+    """
+    Creates the directories of milex on a remote machine and exports MILEX in its .bashrc, with a single SSH command.
+
+    Returns:
+        str: A message describing the outcome.
+    """
+    # The name resolved is the host, not the SSH destination, which can include the key (-i key user@host)
+    host = machine_config.get("hosturl") or machine_config.get("hostname")
+    if not check_host(host):
+        return f"Error: Unable to resolve hostname '{host}' for {machine_name}."
+    destination = shlex.split(ssh_host_from_config(machine_config, machine_name))
+    ssh_command = [
+        "ssh",
+        "-o",
+        f"ConnectTimeout={timeout}",
+        *destination,
+        provision_command(machine_config["path"], MILEX_DIRECTORIES),
+    ]
+    try:
+        result = subprocess.run(
+            ssh_command, capture_output=True, text=True, timeout=timeout
+        )
+    except subprocess.TimeoutExpired:
+        return f"Error: Setting up {machine_name} timed out after {timeout} s."
+    if result.returncode != 0:
+        return f"Error setting up {machine_name}: {result.stderr}"
+    return f"Set up {machine_name}: created or found the directories in {machine_config['path']}."
+
+
 def check_host(hostname):
     """Check if the SSH hostname is resolvable."""
     try:
@@ -105,14 +153,13 @@ def main():
             "Invalid configuration. Please make sure the 'local' has a path specified."
         )
 
-    # Handle machines setup
+    # Handle machines setup. Remote machines are provisioned concurrently
+    remote_machines = {}
     for machine_name, machine_config in config.items():
         print(f"Setting up {machine_name} machine...")
 
         if machine_name == "local":
-            setup_directories(
-                machine_config["path"], ["data", "models", "slurm", "jobs", "results"]
-            )
+            setup_directories(machine_config["path"], MILEX_DIRECTORIES)
             update_bashrc(machine_config["path"])
 
         else:
@@ -126,21 +173,7 @@ def main():
             if any(
                 key in machine_config for key in ["hostname", "username", "hosturl"]
             ):
-                # Check if hostname is resolvable
-                hostname = ssh_host_from_config(machine_config, machine_name)
-                if not check_host(hostname):
-                    print(
-                        f"Error: Unable to resolve hostname '{machine_config['hostname']}' for {machine_name}."
-                    )
-                    continue
-                else:
-                    # Machine is resolvable, proceed with setting up directories
-                    setup_directories(
-                        machine_config["path"],
-                        ["data", "models", "slurm", "jobs", "results"],
-                        hostname=hostname,
-                    )
-                    update_bashrc(machine_config["path"], hostname=hostname)
+                remote_machines[machine_name] = machine_config
             else:  # Local machine
                 if machine_config["path"] != config["local"]["path"]:
                     print(
@@ -149,4 +182,17 @@ def main():
                     )
                 continue
 
+    if remote_machines:
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        with ThreadPoolExecutor(
+            max_workers=min(PROVISION_WORKERS, len(remote_machines))
+        ) as pool:
+            futures = [
+                pool.submit(provision_remote_machine, name, machine_config)
+                for name, machine_config in remote_machines.items()
+            ]
+            for future in as_completed(futures):
+                print(future.result())
+
     print("Milex setup is complete.")
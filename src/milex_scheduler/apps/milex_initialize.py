@@ -1,5 +1,4 @@
 import argparse
-from ..save_load_jobs import save_bundle
 
 
 def parse_args():
@@ -13,4 +12,7 @@ def parse_args():
 
 def main():
     args = parse_args()
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..save_load_jobs import save_bundle
+
     save_bundle({}, args.name)
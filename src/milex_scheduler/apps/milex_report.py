@@ -0,0 +1,70 @@
+import argparse
+
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    argparse.Namespace: The parsed command line arguments.
+    """
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Report the queue wait, run time, critical path and parallelism of a bundle.")
+    parser.add_argument("name", help="Name of the job bundle")
+    parser.add_argument("--output", required=False, help="Path of the Gantt chart in trace-event format (open it in Perfetto). "
+                                                          "Defaults to NAME_timeline.json.")
+
+    # Optional arguments for machine configuration
+    parser.add_argument("--machine", required=False, help="Machine name the jobs were submitted to (e.g., local, remote_1)")
+    parser.add_argument("--hostname", required=False, help="Hostname of the remote machine")
+    parser.add_argument("--hosturl", required=False, help="The url of the machine")
+    parser.add_argument("--username", required=False, help="Username for SSH login")
+    parser.add_argument("--key_path", required=False, help="Path to the SSH private key")
+    parser.add_argument("--env_command", required=False, help="Command to activate the environment on the remote machine")
+    parser.add_argument("--slurm_account", required=False, help="SLURM account to use for job submission")
+    # fmt: on
+    return parser.parse_args()
+
+
+def hours(seconds: float) -> str:
+    return f"{seconds / 3600:.2f}h"
+
+
+def main():
+    args = parse_args()
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..utils import machine_config
+    from ..report import bundle_timeline, analyze_timeline, timeline_trace
+    from ..tracing import write_trace
+
+    config = machine_config(args)
+    dependencies, timeline = bundle_timeline(args.name, config)
+    analysis = analyze_timeline(dependencies, timeline)
+    if not analysis["jobs"]:
+        print(f"No job of bundle {args.name} has started yet.")
+        return
+
+    output = args.output or f"{args.name}_timeline.json"
+    write_trace(output, timeline_trace(timeline))
+    print(f"Timeline written to {output}")
+
+    print(
+        f"{'JOB':<30} {'STATE':<12} {'DEP. WAIT':>10} {'QUEUE WAIT':>10} {'RUN TIME':>10}"
+    )
+    for name, job in analysis["jobs"].items():
+        print(
+            f"{name:<30} {timeline[name]['state']:<12} {hours(job['dependency_wait']):>10} "
+            f"{hours(job['queue_wait']):>10} {hours(job['run_time']):>10}"
+        )
+    print()
+    print(f"Makespan:          {hours(analysis['makespan'])}")
+    print(f"Total queue wait:  {hours(analysis['total_queue_wait'])}")
+    print(f"Total run time:    {hours(analysis['total_run_time'])}")
+    print(
+        f"Critical path:     {' -> '.join(analysis['critical_path'])} "
+        f"({hours(analysis['critical_queue_wait'])} queued, {hours(analysis['critical_run_time'])} running)"
+    )
+    print(
+        f"Parallelism:       {analysis['parallelism']:.2f} on average, "
+        f"{analysis['max_concurrency']} jobs at most"
+    )
@@ -1,11 +1,9 @@
 import argparse
+from ..daemon import delegate_to_daemon
 import subprocess
 import shlex
 import json
 import sys
-from ..job_runner import submit_jobs
-from ..save_load_jobs import save_job
-from ..utils import machine_config
 
 
 def parse_script_args(script, unknown_args) -> dict:
@@ -56,6 +54,20 @@ def parse_args():
     # parser.add_argument('--dependency_type', nargs="+", default='afterany', choices=['afterany', 'afterok', 'afternotok', 'singleton'],
                             # help='Type of dependency to use for SLURM job submission.')
     parser.add_argument('--pre-commands', required=False, nargs="+", help='List of bash commands to run before the script.')
+    parser.add_argument('--retry', required=False, type=int, help='Opt in automatic retries with escalated resources, up to RETRY attempts in total '
+                                                                 '(see milex-status).')
+    parser.add_argument('--rightsize', required=False, choices=['suggest', 'apply'], help='Compare the requested mem and time with the usage of past runs '
+                                                                                         'of the script (see milex-usage), and apply tighter values if requested.')
+    parser.add_argument('--checkpointable', required=False, type=int, help='The script saves a checkpoint and exits on SIGUSR1, sent 5 minutes before the time limit. '
+                                                                          'The job is then requeued, up to CHECKPOINTABLE times.')
+    parser.add_argument('--stage_in', required=False, nargs='+', help='Files, directories or tar archives copied (or extracted) to node-local scratch '
+                                                                     '($MILEX_SCRATCH) before the script runs.')
+    parser.add_argument('--stage_out', required=False, nargs='+', help='Paths in node-local scratch copied to $MILEX/results/JOB_NAME when the job exits, '
+                                                                      'even if it fails.')
+    parser.add_argument('--instrument', action='store_true', help='Time each section of the SLURM script and record its CPU time and peak memory '
+                                                                  'in a JSON sidecar next to the output of the job (see milex-status --profile).')
+    parser.add_argument('--trace', required=False, help='Write a trace of the scheduling and submission phases to this JSON file (open it in Perfetto), '
+                                                       'and print a summary of the time spent in each phase.')
 
     # SLURM configuration options
     slurm = parser.add_argument_group('slurm', 'SLURM configuration options.')
@@ -68,7 +80,8 @@ def parse_args():
 
     # Optional arguments for custom machine configuration
     machine_config = parser.add_argument_group('machine_config', 'Custom machine configuration options.')
-    machine_config.add_argument('--machine', required=False, help='Machine name to run the jobs (e.g., local, remote_1).')
+    machine_config.add_argument('--machine', required=False, help='Machine name to run the jobs (e.g., local, remote_1). '
+                                                                              "Use 'auto' to select the machine where the bundle is estimated to complete first.")
     machine_config.add_argument('--hostname', required=False, help='Hostname of the remote machine. This requires ssh config to be set.')
     machine_config.add_argument('--hosturl', required=False, help='The url of the machine. When provided, consider providing username and key_path also.')
     machine_config.add_argument('--username', required=False, help='Username for SSH login')
@@ -76,6 +89,8 @@ def parse_args():
     machine_config.add_argument('--remote_path', required=False, help='Path to the remote directory where scripts will be run.')
     machine_config.add_argument('--env_command', required=False, help='Command to activate the environment on the remote machine.')
     machine_config.add_argument('--slurm_account', required=False, help='SLURM account to use for job submission.')
+    machine_config.add_argument('--env_snapshot', action='store_true', help='Activate the environment of the machine once and source a snapshot '
+                                                                          'of its variables in every job.')
     machine_config.add_argument('--path', required=False, help='Path to the directory where scripts will be run.')
     # fmt: on
 
@@ -85,7 +100,18 @@ def parse_args():
 
 
 def main():
+    if delegate_to_daemon("milex-schedule"):
+        return
     args, script_args = parse_args()
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..job_runner import submit_jobs
+    from ..save_load_jobs import save_job
+    from ..utils import machine_config
+    from ..queue_probe import select_machine
+    from ..tracing import enable_tracing
+
+    if args.trace is not None:
+        enable_tracing(args.trace)
     job = {
         "name": args.script if args.job_name is None else args.job_name,
         "script": args.script,
@@ -101,10 +127,26 @@ def main():
             "time": args.time,
         },
     }
+    if args.retry is not None:
+        job["retry"] = {"max_attempts": args.retry}
+    if args.rightsize is not None:
+        job["rightsize"] = args.rightsize
+    if args.instrument:
+        job["instrument"] = True
+    if args.checkpointable is not None:
+        job["checkpointable"] = {"max_continuations": args.checkpointable}
+    if args.stage_in:
+        job["stage_in"] = args.stage_in
+    if args.stage_out:
+        job["stage_out"] = args.stage_out
 
     name = args.name if args.name is not None else args.script
     save_job(job, bundle_name=name, append=args.append)
 
     if args.submit:
+        if args.machine == "auto":
+            args.machine = select_machine(name)
         config = machine_config(args)
+        if args.env_snapshot:
+            config["env_snapshot"] = True
         submit_jobs(name, machine_config=config)
@@ -0,0 +1,100 @@
+import argparse
+from ..daemon import delegate_to_daemon
+import time
+from contextlib import closing
+
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    argparse.Namespace: The parsed command line arguments.
+    """
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Show the state of the jobs of a bundle, and optionally retry failed jobs.")
+    parser.add_argument("name", help="Name of the job bundle")
+    parser.add_argument("--retry", action="store_true", help="Resubmit failed jobs with escalated resources. The 'retry' entry of a job "
+                                                              "overrides the default policy ('retry': false opts out). "
+                                                              "Without this flag, no job is resubmitted.")
+    parser.add_argument("--max_attempts", type=int, default=None, help="Maximum number of attempts per job when using --retry.")
+    parser.add_argument("--prune", action="store_true", help="Cancel the jobs that will never start because a job they depend on failed "
+                                                              "and is not retried.")
+    parser.add_argument("--profile", action="store_true", help="Show the time, CPU time and peak memory of each section of the instrumented jobs.")
+    parser.add_argument("--watch", type=float, default=None, help="Poll the job states every WATCH seconds, "
+                                                                   "retrying failed jobs with --retry, until every job is finished.")
+
+    # Optional arguments for machine configuration
+    parser.add_argument("--machine", required=False, help="Machine name the jobs were submitted to (e.g., local, remote_1)")
+    parser.add_argument("--hostname", required=False, help="Hostname of the remote machine")
+    parser.add_argument("--hosturl", required=False, help="The url of the machine")
+    parser.add_argument("--username", required=False, help="Username for SSH login")
+    parser.add_argument("--key_path", required=False, help="Path to the SSH private key")
+    parser.add_argument("--env_command", required=False, help="Command to activate the environment on the remote machine")
+    parser.add_argument("--slurm_account", required=False, help="SLURM account to use for job submission")
+    # fmt: on
+    return parser.parse_args()
+
+
+def print_status(rows):
+    print(f"{'JOB':<30} {'ATTEMPT':>7} {'SLURM ID':>12} {'STATE':<15} {'FAILURE':<15}")
+    for row in rows:
+        print(
+            f"{row['job_name']:<30} {row['attempt']:>7} {row['slurm_id']:>12} {row['state']:<15} {row['failure'] or '':<15}"
+        )
+
+
+def print_profile(summary):
+    print(
+        f"{'JOB':<30} {'TASKS':>5} {'FAILED':>6} {'SECTION':<14} {'WALL (s)':>10} {'CPU (s)':>10} {'MAX RSS':>10}"
+    )
+    for job_name, job in summary.items():
+        rss = f"{job['max_rss_mb']:.0f}M" if job["max_rss_mb"] is not None else ""
+        for section, usage in job["sections"].items():
+            print(
+                f"{job_name:<30} {job['tasks']:>5} {job['failed']:>6} {section:<14} {usage['wall']:>10.2f} {usage['cpu']:>10.2f} "
+                f"{rss if section == 'main' else '':>10}"
+            )
+
+
+def main():
+    if delegate_to_daemon("milex-status"):
+        return
+    args = parse_args()
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..utils import machine_config
+    from ..job_db import connect_job_db, query_jobs, sync_job_states, TERMINAL_STATES
+    from ..retry import retry_failed_jobs, prune_orphaned_jobs
+    from ..instrumentation import collect_instrumentation, summarize_instrumentation
+
+    config = machine_config(args)
+    policy = {}
+    if args.max_attempts is not None:
+        policy["max_attempts"] = args.max_attempts
+
+    while True:
+        new_ids = {}
+        if args.retry:
+            new_ids = retry_failed_jobs(args.name, machine_config=config, policy=policy)
+        if args.prune:
+            pruned = prune_orphaned_jobs(args.name, machine_config=config)
+            if pruned:
+                print(
+                    f"Cancelled {len(pruned)} jobs whose dependencies failed: {', '.join(pruned)}"
+                )
+        with closing(connect_job_db()) as job_db:
+            sync_job_states(job_db, config, bundle=args.name)
+            rows = query_jobs(job_db, bundle=args.name, latest_attempt=True)
+        if rows:
+            # Only show the most recent bundle
+            bundle_date = max(row["bundle_date"] for row in rows)
+            rows = [row for row in rows if row["bundle_date"] == bundle_date]
+        print_status(rows)
+        if args.profile:
+            print_profile(
+                summarize_instrumentation(collect_instrumentation(args.name, config))
+            )
+        finished = all(row["state"] in TERMINAL_STATES for row in rows)
+        if args.watch is None or (finished and not new_ids):
+            break
+        time.sleep(args.watch)
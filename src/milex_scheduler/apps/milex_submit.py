@@ -1,6 +1,6 @@
 import argparse
-from ..utils import machine_config
-from ..job_runner import submit_jobs
+import sys
+from ..daemon import delegate_to_daemon
 
 
 def parse_args():
@@ -11,7 +11,12 @@ def parse_args():
     argparse.Namespace: The parsed command line arguments.
     """
     parser = argparse.ArgumentParser(description="Run scripts on a SLURM cluster.")
-    parser.add_argument("name", help="Name of the job")
+    parser.add_argument(
+        "names",
+        nargs="+",
+        help="Names of the bundles, or glob patterns of the saved bundles (e.g. 'sweep_*'). "
+        "Several bundles are submitted concurrently.",
+    )
     # parser.add_argument('date', required=False, help='If provided, will look for job closest to this date. Otherwise, latest job is ran.'
     # 'Provide in the format [Y]YYYY-[M]MM-[D]DD-[H]HH-[m]mm-[s]ss.'
     # 'E.g., Y2021 will yield the latest job of 2021. M09 will yield the latest job of last September.'
@@ -21,7 +26,81 @@ def parse_args():
     parser.add_argument(
         "--machine",
         required=False,
-        help="Machine name to run the jobs (e.g., local, remote_1)",
+        help="Machine name to run the jobs (e.g., local, remote_1). "
+        "Use 'auto' to select the configured machine where the bundle is estimated to complete first.",
+    )
+
+    parser.add_argument(
+        "--optimize_shapes",
+        action="store_true",
+        help="For jobs with alternative resource shapes, submit the shape with the earliest estimated completion.",
+    )
+
+    parser.add_argument(
+        "--backend",
+        default="slurm",
+        choices=["slurm", "local"],
+        help="'slurm' submits the jobs with sbatch, 'local' runs the bundle on this machine without SLURM.",
+    )
+
+    parser.add_argument(
+        "--env_snapshot",
+        action="store_true",
+        help="Activate the environment of the machine once and source a snapshot of its variables in every job.",
+    )
+
+    parser.add_argument(
+        "--max_submit",
+        type=int,
+        required=False,
+        help="Maximum number of queued jobs of the user (MaxSubmitJobs). The jobs beyond it are backlogged "
+        "and submitted by milex-agent as slots free up.",
+    )
+
+    parser.add_argument(
+        "--dedupe",
+        action="store_true",
+        help="Store the scripts on the remote machine under the hash of their content, "
+        "and only transfer the scripts the machine does not have yet.",
+    )
+
+    parser.add_argument(
+        "--in_memory",
+        action="store_true",
+        help="Pipe the scripts to sbatch over a shared SSH connection, without writing or transferring files.",
+    )
+
+    parser.add_argument(
+        "--archive",
+        action="store_true",
+        help="With --in_memory, keep a copy of the submitted scripts in the local slurm directory.",
+    )
+
+    parser.add_argument(
+        "--remote_helper",
+        action="store_true",
+        help="Send the whole bundle to a helper deployed on the remote machine, "
+        "which submits the jobs and wires their dependencies in a single SSH round trip.",
+    )
+
+    parser.add_argument(
+        "--max_workers",
+        type=int,
+        default=4,
+        help="Maximum number of bundles submitted at the same time.",
+    )
+
+    parser.add_argument(
+        "--journal",
+        required=False,
+        help="Write the outcome of every bundle (machine, job IDs or error) to this JSON file.",
+    )
+
+    parser.add_argument(
+        "--trace",
+        required=False,
+        help="Write a trace of the submission phases to this JSON file (open it in Perfetto), "
+        "and print a summary of the time spent in each phase.",
     )
 
     # Optional arguments for custom machine configuration
@@ -53,6 +132,68 @@ def parse_args():
 
 
 def main():
+    if delegate_to_daemon("milex-submit"):
+        return
     args = parse_args()
-    config = machine_config(args)
-    submit_jobs(args.name, machine_config=config)
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..utils import machine_config
+    from ..job_runner import submit_jobs, submit_bundles
+    from ..save_load_jobs import list_bundles
+    from ..queue_probe import select_machine
+    from ..tracing import enable_tracing
+    from ..governor import governor_metrics
+
+    if args.trace is not None:
+        enable_tracing(args.trace)
+    names = list_bundles(args.names)
+    if not names:
+        raise ValueError(f"No saved bundle matches {' '.join(args.names)}")
+    options = dict(
+        optimize_shapes=args.optimize_shapes,
+        backend=args.backend,
+        dedupe=args.dedupe,
+        in_memory=args.in_memory,
+        archive=args.archive,
+        remote_helper=args.remote_helper,
+    )
+
+    # The configuration of each machine is built once, and shared by the bundles submitted to it
+    configs = {}
+
+    def config_of(name: str) -> dict:
+        machine = select_machine(name) if args.machine == "auto" else args.machine
+        if machine not in configs:
+            config = machine_config(
+                argparse.Namespace(**{**vars(args), "machine": machine})
+            )
+            if args.env_snapshot:
+                config["env_snapshot"] = True
+            if args.max_submit is not None:
+                config["max_submit"] = args.max_submit
+            configs[machine] = config
+        return configs[machine]
+
+    bundles = {name: config_of(name) for name in names}
+    failed = False
+    if len(bundles) == 1 and args.journal is None:
+        name, config = next(iter(bundles.items()))
+        submit_jobs(name, machine_config=config, **options)
+    else:
+        results = submit_bundles(
+            bundles, max_workers=args.max_workers, journal=args.journal, **options
+        )
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                failed = True
+                print(f"{name}: failed: {type(result).__name__}: {result}")
+            else:
+                print(f"{name}: {len(result)} jobs submitted")
+    for label, metrics in governor_metrics().items():
+        if metrics["transient_errors"]:
+            print(
+                f"{label}: {metrics['calls']} sbatch calls, {metrics['transient_errors']} transient errors, "
+                f"{metrics['retries']} retries, {metrics['failures']} failures. "
+                f"Final rate {metrics['rate']:.1f} submissions/s, mean latency {metrics['mean_latency']:.2f} s."
+            )
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,70 @@
+import argparse
+from contextlib import closing
+from datetime import datetime, timedelta
+
+
+def parse_args():
+    """
+    Parses command line arguments.
+
+    Returns:
+    argparse.Namespace: The parsed command line arguments.
+    """
+    # fmt: off
+    parser = argparse.ArgumentParser(description="Collect the resource usage of past jobs and report wasted core-hours per script.")
+    parser.add_argument("--script", required=False, help="Also print the recommended mem and time for this script.")
+    parser.add_argument("--days", type=float, default=None, help="Only report jobs that ended in the last DAYS days.")
+    parser.add_argument("--quantile", type=float, default=0.95, help="Quantile of the observed usage used for recommendations.")
+    parser.add_argument("--margin", type=float, default=0.2, help="Relative margin added to the quantile for recommendations.")
+
+    # Optional arguments for machine configuration
+    parser.add_argument("--machine", required=False, help="Machine name to collect accounting data from (e.g., local, remote_1)")
+    parser.add_argument("--hostname", required=False, help="Hostname of the remote machine")
+    parser.add_argument("--hosturl", required=False, help="The url of the machine")
+    parser.add_argument("--username", required=False, help="Username for SSH login")
+    parser.add_argument("--key_path", required=False, help="Path to the SSH private key")
+    parser.add_argument("--env_command", required=False, help="Command to activate the environment on the remote machine")
+    parser.add_argument("--slurm_account", required=False, help="SLURM account to use for job submission")
+    # fmt: on
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # The scheduler is imported once the arguments are parsed, so that --help and the daemon clients start fast
+    from ..utils import machine_config
+    from ..job_db import connect_job_db, sync_job_states
+    from ..rightsizing import collect_usage, recommend_resources, wasted_core_hours
+
+    config = machine_config(args)
+    since = None
+    if args.days is not None:
+        since = datetime.now() - timedelta(days=args.days)
+
+    with closing(connect_job_db()) as job_db:
+        sync_job_states(job_db, config)
+        collected = collect_usage(job_db, config)
+        print(f"Collected accounting data of {collected} jobs.")
+
+        print(
+            f"{'SCRIPT':<30} {'JOBS':>6} {'ALLOCATED':>12} {'USED':>12} {'WASTED':>12} {'MEM EFF.':>9}"
+        )
+        for row in wasted_core_hours(job_db, since=since):
+            efficiency = row["memory_efficiency"]
+            efficiency = f"{efficiency:.0%}" if efficiency is not None else "-"
+            print(
+                f"{row['script'] or '':<30} {row['jobs']:>6} {row['allocated_core_hours']:>12.1f} "
+                f"{row['used_core_hours']:>12.1f} {row['wasted_core_hours']:>12.1f} {efficiency:>9}"
+            )
+
+        if args.script is not None:
+            recommendation = recommend_resources(
+                job_db, args.script, q=args.quantile, margin=args.margin
+            )
+            if recommendation:
+                options = " ".join(f"--{k}={v}" for k, v in recommendation.items())
+                print(f"Recommended resources for {args.script}: {options}")
+            else:
+                print(
+                    f"Not enough completed runs of {args.script} to recommend resources."
+                )
@@ -0,0 +1,192 @@
+"""
+Local backlog of the jobs that could not be submitted because of the limit on the number of queued jobs of the user
+(MaxSubmitJobs). Backlogged jobs are submitted in dependency order as slots free up (see milex-agent), with their
+dependencies on the SLURM IDs of their submitted parents.
+
+A machine can declare its limit with a 'max_submit' entry: submissions then stop before reaching it. Otherwise,
+the jobs are backlogged when sbatch rejects a submission because of the limit.
+"""
+
+from .job_db import connect_job_db, query_jobs, record_submission
+from .job_db import sync_job_states, machine_label, script_hash, ISO_FORMAT
+from .job_to_slurm import create_slurm_script
+from .job_dependency import update_slurm_with_dependencies
+from .run_slurm import run_slurm_command, run_slurm_remotely, run_slurm_locally
+from .run_slurm import is_remote_machine
+from .save_load_jobs import load_bundle, transfer_slurm_to_remote
+from .definitions import DATE_FORMAT
+from .utils import load_config
+from contextlib import closing
+from datetime import datetime
+from typing import Optional
+import sqlite3
+import json
+import re
+import os
+
+__all__ = [
+    "is_submit_limit_error",
+    "count_queued_jobs",
+    "free_submit_slots",
+    "backlog_jobs",
+    "submit_backlog",
+]
+
+
+# Errors of sbatch when the user reached the maximum number of queued jobs
+SUBMIT_LIMIT_ERROR = re.compile(
+    r"MaxSubmitJobs|MaxSubmitJob(Per)?(User|Account)|QOSMaxSubmitJob|AssocMaxSubmitJob|job submit limit"
+)
+
+
+def is_submit_limit_error(message: str) -> bool:
+    """Whether a failed sbatch was rejected because the user reached its limit of queued jobs."""
+    return SUBMIT_LIMIT_ERROR.search(message) is not None
+
+
+def count_queued_jobs(machine_config: dict) -> int:
+    """Number of pending and running jobs of the user on a machine, with a single squeue call."""
+    result = run_slurm_command('squeue -h -u "$USER" -o %i', machine_config)
+    if result.returncode != 0:
+        raise ValueError(f"Error running squeue command: {result.stderr}")
+    return len(result.stdout.split())
+
+
+def free_submit_slots(machine_config: dict) -> Optional[int]:
+    """Number of jobs that can be submitted before reaching the 'max_submit' entry of a machine. None if unlimited."""
+    max_submit = machine_config.get("max_submit")
+    if max_submit is None:
+        return None
+    return max(int(max_submit) - count_queued_jobs(machine_config), 0)
+
+
+def backlog_jobs(
+    connection: sqlite3.Connection,
+    bundle: str,
+    bundle_date: datetime,
+    job_names: list,
+    machine_config: dict,
+) -> None:
+    """Adds jobs of a bundle, in dependency order, to the backlog of a machine."""
+    now = datetime.now().strftime(ISO_FORMAT)
+    connection.executemany(
+        "INSERT INTO backlog (bundle, bundle_date, job_name, machine, machine_config, queued_time) "
+        "VALUES (?, ?, ?, ?, ?, ?)",
+        [
+            (
+                bundle,
+                bundle_date.strftime(DATE_FORMAT),
+                job_name,
+                machine_label(machine_config),
+                json.dumps(machine_config),
+                now,
+            )
+            for job_name in job_names
+        ],
+    )
+    connection.commit()
+
+
+def submit_backlog(machine: Optional[str] = None) -> int:
+    """
+    Submits the backlogged jobs, oldest first, until the backlog is empty or the limit of queued jobs is reached.
+    The queue of each machine with a 'max_submit' entry is counted once.
+
+    Args:
+        machine (Optional[str]): Only submit the backlog of this machine (see job_db.machine_label).
+
+    Returns:
+        int: The number of jobs left in the backlog.
+    """
+    slurm_dir = os.path.join(load_config()["local"]["path"], "slurm")
+    with closing(connect_job_db()) as job_db:
+        where, parameters = "", []
+        if machine is not None:
+            where, parameters = " WHERE machine = ?", [machine]
+        rows = job_db.execute(
+            f"SELECT * FROM backlog{where} ORDER BY id", parameters
+        ).fetchall()
+        bundles = {}
+        free_slots = {}
+        # Machines that reached their limit, and bundles with a parent left in the backlog
+        blocked = set()
+        for row in rows:
+            machine_config = json.loads(row["machine_config"])
+            key = (row["bundle"], row["bundle_date"])
+            if row["machine"] in blocked or key in blocked:
+                continue
+            if row["machine"] not in free_slots:
+                free_slots[row["machine"]] = free_submit_slots(machine_config)
+            if free_slots[row["machine"]] == 0:
+                blocked.add(row["machine"])
+                continue
+
+            date = datetime.strptime(row["bundle_date"], DATE_FORMAT)
+            if key not in bundles:
+                sync_job_states(job_db, machine_config, bundle=row["bundle"])
+                jobs, dependencies, date = load_bundle(row["bundle"], date)
+                parents = {job["name"]: [] for job in jobs}
+                for parent, children in dependencies.items():
+                    for child in children:
+                        parents[child].append(parent)
+                bundles[key] = ({job["name"]: job for job in jobs}, parents)
+            jobs, parents = bundles[key]
+            job = jobs[row["job_name"]]
+
+            # Wire the dependencies to the SLURM IDs of the parents that have not completed yet
+            latest = {
+                r["job_name"]: r
+                for r in query_jobs(
+                    job_db, bundle=row["bundle"], bundle_date=date, latest_attempt=True
+                )
+            }
+            if any(parent not in latest for parent in parents[job["name"]]):
+                blocked.add(key)
+                continue
+            dependency_ids = [
+                latest[parent]["slurm_id"]
+                for parent in parents[job["name"]]
+                if latest[parent]["state"] != "COMPLETED"
+            ]
+
+            slurm_name = create_slurm_script(
+                job, date, machine_config, bundle=row["bundle"]
+            )
+            if dependency_ids:
+                update_slurm_with_dependencies(
+                    slurm_name,
+                    dependency_ids,
+                    kill_on_invalid_dep=machine_config.get("kill_on_invalid_dep", True),
+                )
+            with open(os.path.join(slurm_dir, slurm_name), "r") as f:
+                content = f.read()
+            try:
+                if is_remote_machine(machine_config):
+                    transfer_slurm_to_remote(slurm_name, machine_config=machine_config)
+                    job_id = run_slurm_remotely(
+                        slurm_name, machine_config=machine_config
+                    )
+                else:
+                    job_id = run_slurm_locally(slurm_name)
+            except ValueError as e:
+                if not is_submit_limit_error(str(e)):
+                    raise
+                blocked.add(row["machine"])
+                continue
+            record_submission(
+                job_db,
+                row["bundle"],
+                date,
+                job,
+                row["machine"],
+                job_id,
+                script_hash=script_hash(content),
+            )
+            job_db.execute("DELETE FROM backlog WHERE id = ?", (row["id"],))
+            job_db.commit()
+            if free_slots[row["machine"]] is not None:
+                free_slots[row["machine"]] -= 1
+            print(f"Submitted backlogged job {job['name']} with ID {job_id}")
+        return job_db.execute(
+            f"SELECT COUNT(*) FROM backlog{where}", parameters
+        ).fetchone()[0]
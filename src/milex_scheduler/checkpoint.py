@@ -0,0 +1,97 @@
+"""
+Checkpoint-aware requeue of jobs that do not fit in the time limit of a partition.
+
+A checkpointable job is sent SIGUSR1 'grace' seconds before its time limit. The script should then save a checkpoint
+and exit, and resume from its last checkpoint when it starts again. The job is requeued with 'scontrol requeue', which
+keeps its SLURM ID, so the jobs that depend on it keep waiting for the last continuation. The number of continuations
+is capped by 'max_continuations' ($SLURM_RESTART_COUNT counts the continuations already run).
+
+Example:
+    job = {
+        "checkpointable": True,  # Or a dict overriding keys of the default policy, e.g. {"max_continuations": 4}
+        "slurm": {"time": "24:00:00"},
+    }
+"""
+
+from typing import Optional
+
+__all__ = [
+    "checkpoint_policy",
+    "checkpoint_directives",
+    "checkpoint_commands",
+    "checkpoint_requeue_commands",
+]
+
+
+DEFAULT_CHECKPOINT_POLICY = {
+    "grace": 300,  # Seconds between SIGUSR1 and the time limit
+    "max_continuations": 10,
+}
+
+
+def checkpoint_policy(job: dict) -> Optional[dict]:
+    """
+    Resolves the checkpoint policy of a job. A job opts in with 'checkpointable': true (default policy)
+    or a dict overriding keys of the default policy.
+    """
+    job_policy = job.get("checkpointable", None)
+    if not job_policy:
+        return None
+    resolved = dict(DEFAULT_CHECKPOINT_POLICY)
+    if isinstance(job_policy, dict):
+        resolved.update(job_policy)
+    return resolved
+
+
+def checkpoint_directives(policy: dict) -> str:
+    """SBATCH directives signaling the batch shell before the time limit, and keeping the output of previous continuations."""
+    return (
+        f"#SBATCH --signal=B:USR1@{policy['grace']}\n"
+        "#SBATCH --requeue\n"
+        "#SBATCH --open-mode=append\n"
+    )
+
+
+def checkpoint_commands(main: str, policy: dict) -> str:
+    """
+    Bash commands running the main command in the background and forwarding SIGUSR1 to it.
+    When the main command runs under the timer of the instrumentation, the signal is sent to the child of the timer,
+    which does not forward it. The last command returns the exit code of the main command.
+    """
+    return f"""_milex_checkpointing=""
+_milex_checkpoint() {{
+    _milex_checkpointing=1
+    echo "milex: time limit in less than {policy['grace']} s, forwarding SIGUSR1 to save a checkpoint"
+    if [ -n "${{_milex_timer:-}}" ]; then
+        pkill -USR1 -P "$_milex_main" 2>/dev/null
+    else
+        kill -USR1 "$_milex_main" 2>/dev/null
+    fi
+}}
+trap _milex_checkpoint USR1
+{main} &
+_milex_main=$!
+# 'wait' returns when a trapped signal is received: wait again until the main command exits
+while kill -0 "$_milex_main" 2>/dev/null; do wait "$_milex_main"; done
+trap - USR1
+wait "$_milex_main"
+"""
+
+
+def checkpoint_requeue_commands(policy: dict) -> str:
+    """
+    Bash commands requeueing the job if it was checkpointed, after staging out its outputs.
+    A job that reached its maximum number of continuations fails, so that its dependents do not start.
+    """
+    max_continuations = policy["max_continuations"]
+    return f"""if [ -n "$_milex_checkpointing" ]; then
+    if [ "${{SLURM_RESTART_COUNT:-0}}" -lt {max_continuations} ]; then
+        declare -F _milex_stage_out > /dev/null && _milex_stage_out
+        echo "milex: requeueing for continuation $((${{SLURM_RESTART_COUNT:-0}} + 1)) of {max_continuations}"
+        scontrol requeue "${{SLURM_ARRAY_JOB_ID:-$SLURM_JOB_ID}}${{SLURM_ARRAY_TASK_ID:+_$SLURM_ARRAY_TASK_ID}}"
+    else
+        echo "milex: maximum number of continuations ({max_continuations}) reached" >&2
+        [ "$_milex_status" -eq 0 ] && _milex_status=1  # The job did not finish, do not release its dependents
+    fi
+fi
+"""
@@ -0,0 +1,193 @@
+"""
+Optional local daemon running the milex command line applications in a warm process.
+
+A command run through the daemon does not pay the import of milex and its dependencies, and reuses the state kept
+by the daemon between commands: the SSH master connections to the machines, kept open longer than by a single
+command, the adapted submission rate of each machine (see governor), the configuration and the saved bundles
+(reloaded when their file changes), and the sacct records of the jobs queried in the last SACCT_CACHE_TTL seconds.
+The daemon is started with 'milex-agent --serve', which also submits the backlog.
+
+milex-schedule, milex-submit and milex-status send their arguments, working directory and environment to the
+daemon when its socket exists, and stream its output back. They run in-process when the daemon is not running,
+or when MILEX_NO_DAEMON is set. The daemon runs one command at a time.
+"""
+
+from contextlib import redirect_stdout, redirect_stderr
+from typing import Optional
+from .definitions import CONFIG_FILE_PATH
+import threading
+import json
+import sys
+import io
+import os
+
+__all__ = ["daemon_socket_path", "delegate_to_daemon", "serve"]
+
+
+SOCKET_VARIABLE = "MILEX_DAEMON_SOCKET"
+DISABLE_VARIABLE = "MILEX_NO_DAEMON"
+DAEMON_APPS = {
+    "milex-schedule": "milex_schedule",
+    "milex-submit": "milex_submit",
+    "milex-status": "milex_status",
+}
+DAEMON_CONTROL_PERSIST = 600  # seconds the SSH master connections stay open after the last command of the daemon
+
+# Held while the daemon runs a command, and by milex-agent while it submits the backlog
+daemon_lock = threading.Lock()
+_local = threading.local()
+
+
+def daemon_socket_path() -> str:
+    """Path of the unix socket of the daemon, next to the configuration file unless MILEX_DAEMON_SOCKET is set."""
+    return os.environ.get(SOCKET_VARIABLE) or os.path.join(
+        os.path.dirname(CONFIG_FILE_PATH), ".milex-daemon.sock"
+    )
+
+
+def delegate_to_daemon(app: str) -> bool:
+    """
+    Runs a command line application in the daemon, with the arguments of this process, and exits with its exit code.
+
+    Args:
+        app (str): The name of the application (e.g. 'milex-submit').
+
+    Returns:
+        bool: True if the daemon ran the command, False if the command must run in-process.
+    """
+    if getattr(_local, "serving", False) or os.environ.get(DISABLE_VARIABLE):
+        return False
+    path = daemon_socket_path()
+    if not os.path.exists(path):
+        return False
+    import socket
+
+    client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        client.connect(path)
+    except OSError:  # Stale socket of a daemon that is not running anymore
+        client.close()
+        return False
+    # Once connected, the command may have started: errors are not recovered by running it again in-process
+    with client, client.makefile("rb") as responses:
+        request = {
+            "app": app,
+            "argv": sys.argv[1:],
+            "cwd": os.getcwd(),
+            "env": dict(os.environ),
+        }
+        client.sendall(json.dumps(request).encode() + b"\n")
+        for line in responses:
+            message = json.loads(line)
+            if "code" in message:
+                if message["code"]:
+                    sys.exit(message["code"])
+                return True
+            stream = sys.stdout if "stdout" in message else sys.stderr
+            stream.write(message.get("stdout", message.get("stderr")))
+            stream.flush()
+    raise ConnectionError(
+        "The milex daemon closed the connection before the end of the command"
+    )
+
+
+class _StreamWriter(io.TextIOBase):
+    """Forwards the output of a command to the client as it is written."""
+
+    def __init__(self, connection, name: str):
+        self.connection = connection
+        self.name = name
+
+    def write(self, text: str) -> int:
+        if text:
+            self.connection.sendall(json.dumps({self.name: text}).encode() + b"\n")
+        return len(text)
+
+
+def _exit_code(error: SystemExit) -> int:
+    if error.code is None or isinstance(error.code, int):
+        return error.code or 0
+    print(error.code, file=sys.stderr)
+    return 1
+
+
+def _run_command(request: dict, connection) -> int:
+    from . import tracing
+    import importlib
+    import traceback
+
+    if request["app"] not in DAEMON_APPS:
+        print(f"Unknown application: {request['app']}", file=sys.stderr)
+        return 2
+    module = importlib.import_module(
+        f"milex_scheduler.apps.{DAEMON_APPS[request['app']]}"
+    )
+    argv, cwd, environ = sys.argv, os.getcwd(), dict(os.environ)
+    stdout = _StreamWriter(connection, "stdout")
+    stderr = _StreamWriter(connection, "stderr")
+    _local.serving = True
+    try:
+        sys.argv = [request["app"], *request["argv"]]
+        os.chdir(request["cwd"])
+        os.environ.clear()
+        os.environ.update(request["env"])
+        with redirect_stdout(stdout), redirect_stderr(stderr):
+            try:
+                module.main()
+                return 0
+            except SystemExit as e:
+                return _exit_code(e)
+            except Exception:
+                traceback.print_exc()
+                return 1
+            finally:
+                # A trace is written at the end of the command, not at the exit of the daemon
+                tracing._write_at_exit()
+                tracing.disable_tracing()
+    finally:
+        _local.serving = False
+        sys.argv = argv
+        os.chdir(cwd)
+        os.environ.clear()
+        os.environ.update(environ)
+
+
+def serve(path: Optional[str] = None) -> None:
+    """Runs the daemon on a unix socket (see daemon_socket_path), only accessible to the user, until interrupted."""
+    # Imported here, so that the clients importing this module stay light
+    from . import run_slurm, utils
+    import socketserver
+    import importlib
+    import traceback
+
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            request = json.loads(self.rfile.readline())
+            with daemon_lock:
+                code = _run_command(request, self.connection)
+            self.wfile.write(json.dumps({"code": code}).encode() + b"\n")
+
+    class Server(socketserver.UnixStreamServer):
+        def handle_error(self, request, client_address):
+            # A client that disconnects does not stop the daemon
+            traceback.print_exc()
+
+    path = path or daemon_socket_path()
+    if os.path.exists(path):
+        os.remove(path)
+    run_slurm.SSH_CONTROL_PERSIST = DAEMON_CONTROL_PERSIST
+    utils.enable_daemon_cache()
+    # Applications imported before the first command, so that the first command is as fast as the next ones
+    for module in DAEMON_APPS.values():
+        importlib.import_module(f"milex_scheduler.apps.{module}")
+    old_umask = os.umask(0o177)
+    try:
+        server = Server(path, Handler)
+    finally:
+        os.umask(old_umask)
+    try:
+        print(f"milex daemon listening on {path}")
+        server.serve_forever()
+    finally:
+        server.server_close()
+        os.remove(path)
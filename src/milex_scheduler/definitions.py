@@ -15,3 +15,6 @@ MACHINE_KEYS = [
     "env_command",
     "slurm_account",
 ]
+# Bash expression of the current time in seconds, with sub-second precision on bash >= 5 ($EPOCHREALTIME).
+# 'date +%s.%N' is GNU only, BSD date prints a literal 'N'. The decimal separator of $EPOCHREALTIME follows the locale.
+SHELL_TIMESTAMP = '$(_milex_now=${EPOCHREALTIME:-$(date +%s)}; echo "${_milex_now/,/.}")'
@@ -0,0 +1,54 @@
+"""
+Snapshot of the environment produced by the 'env_command' of a machine. The first job that runs on the machine
+activates the environment and saves the exported variables it changed in '$MILEX/env/<hash>.sh', where the hash
+is computed from the env_command. Later jobs source the snapshot instead of running the env_command again.
+
+Only exported variables are captured: shell functions and aliases defined by the env_command (e.g. the 'conda'
+or 'module' functions) are not available in jobs that use the snapshot. Delete '$MILEX/env' to refresh the snapshots.
+"""
+
+import hashlib
+import shlex
+
+__all__ = ["env_snapshot_hash", "env_snapshot_commands"]
+
+
+SNAPSHOT_DIR = "env"
+# Variables that depend on the job or the shell rather than on the environment activation
+EXCLUDED_VARIABLES = r"^(SLURM_.*|SBATCH_.*|TMPDIR|PWD|OLDPWD|SHLVL|_|MILEX)$"
+
+
+def env_snapshot_hash(env_command: str) -> str:
+    return hashlib.sha256(env_command.encode()).hexdigest()[:16]
+
+
+def env_snapshot_commands(env_command: str) -> str:
+    """Bash commands sourcing the snapshot of env_command, or creating it if it does not exist yet."""
+    snapshot = f'"$MILEX/{SNAPSHOT_DIR}/{env_snapshot_hash(env_command)}.sh"'
+    return f"""_milex_snapshot={snapshot}
+if [ -f "$_milex_snapshot" ]; then
+    source "$_milex_snapshot"
+else
+    # Values before the activation, one file per variable (no associative arrays in bash 3)
+    _milex_before=$(mktemp -d)
+    for _milex_var in $(compgen -e); do printf '%s' "${{!_milex_var}}" > "$_milex_before/$_milex_var"; done
+{env_command}
+    if [ $? -eq 0 ]; then  # Never save the snapshot of a failed activation
+        _milex_excluded={shlex.quote(EXCLUDED_VARIABLES)}
+        mkdir -p "$(dirname "$_milex_snapshot")"
+        for _milex_var in $(compgen -e); do
+            [[ $_milex_var =~ $_milex_excluded ]] && continue
+            if ! printf '%s' "${{!_milex_var}}" | cmp -s - "$_milex_before/$_milex_var"; then
+                declare -p "$_milex_var"
+            fi
+        done > "$_milex_snapshot.$$"
+        for _milex_var in $(ls "$_milex_before"); do
+            [[ -z "${{!_milex_var+set}}" ]] && echo "unset $_milex_var"
+        done >> "$_milex_snapshot.$$"
+        # Atomic, in case other jobs create the snapshot at the same time
+        mv "$_milex_snapshot.$$" "$_milex_snapshot"
+    fi
+    rm -rf "$_milex_before"
+    unset _milex_before _milex_var _milex_excluded
+fi
+"""
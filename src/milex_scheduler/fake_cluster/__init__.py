@@ -0,0 +1,11 @@
+"""
+A simulated SLURM cluster with sbatch, squeue, sacct, scancel and scontrol shims, and ssh/scp shims that
+execute locally, to benchmark and test milex end to end without a cluster.
+
+Example:
+    env = install_shims("/tmp/fake/bin", "/tmp/fake/state", cpus=128, time_scale=3600)
+    os.environ.update(env)
+"""
+
+from .simulator import *
+from .shims import *
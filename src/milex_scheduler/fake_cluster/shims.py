@@ -0,0 +1,171 @@
+"""
+Executables standing in for the SLURM commands and for ssh/scp. The ssh and scp shims run everything locally,
+so a machine configured with a hostname and a local directory as its path behaves like a remote cluster.
+"""
+
+from .simulator import FakeCluster, SlurmError, parse_options
+from typing import Optional
+import subprocess
+import shutil
+import sys
+import os
+
+__all__ = ["install_shims", "fake_cluster_env"]
+
+
+SLURM_COMMANDS = ["sbatch", "squeue", "sacct", "scancel", "scontrol"]
+TRANSPORT_COMMANDS = ["ssh", "scp"]
+STATE_DIR_VARIABLE = "MILEX_FAKE_CLUSTER"
+# Options of ssh and scp that take a value (see their getopt strings in OpenSSH)
+SSH_VALUE_OPTIONS = set("bcDEeFIiJLlmOopQRSWw")
+SCP_VALUE_OPTIONS = set("cDFiJloPSX")
+
+
+def install_shims(bin_dir: str, state_dir: str, **settings) -> dict:
+    """
+    Writes the shims in bin_dir and creates the simulated cluster in state_dir.
+
+    Args:
+        bin_dir (str): Directory where the executables are written.
+        state_dir (str): Directory holding the state of the simulated cluster.
+        **settings: Settings of the cluster (see simulator.DEFAULT_SETTINGS).
+
+    Returns:
+        dict: The environment variables to use the fake cluster, with bin_dir first in the PATH.
+    """
+    os.makedirs(bin_dir, exist_ok=True)
+    FakeCluster(state_dir, **settings).close()
+    for command in SLURM_COMMANDS + TRANSPORT_COMMANDS:
+        path = os.path.join(bin_dir, command)
+        with open(path, "w") as f:
+            f.write(
+                f"#!{sys.executable}\n"
+                "import os, sys\n"
+                f"os.environ.setdefault({STATE_DIR_VARIABLE!r}, {os.path.abspath(state_dir)!r})\n"
+                "from milex_scheduler.fake_cluster.shims import main\n"
+                f"sys.exit(main({command!r}, sys.argv[1:]))\n"
+            )
+        os.chmod(path, 0o755)
+    return fake_cluster_env(bin_dir, state_dir)
+
+
+def fake_cluster_env(bin_dir: str, state_dir: str) -> dict:
+    """Environment variables that route the SLURM, ssh and scp commands to the fake cluster."""
+    return {
+        "PATH": os.path.abspath(bin_dir) + os.pathsep + os.environ.get("PATH", ""),
+        STATE_DIR_VARIABLE: os.path.abspath(state_dir),
+    }
+
+
+def getopt(args: list, value_options: set) -> tuple:
+    """
+    Parses arguments like the getopt of OpenSSH: options stop at the first operand or at '--', flags can be
+    grouped ('-tt'), and the value of an option is the rest of its argument ('-ikey') or the next argument.
+
+    Returns:
+        tuple: The (option, value) pairs, and the operands.
+    """
+    options = []
+    i = 0
+    while i < len(args) and args[i].startswith("-") and args[i] != "-":
+        arg = args[i]
+        i += 1
+        if arg == "--":
+            break
+        j = 1
+        while j < len(arg):
+            option = arg[j]
+            j += 1
+            if option not in value_options:
+                options.append((option, None))
+                continue
+            if j < len(arg):
+                value = arg[j:]
+            elif i < len(args):
+                value, i = args[i], i + 1
+            else:
+                raise ValueError(f"option requires an argument -- {option}")
+            options.append((option, value))
+            break
+    return options, args[i:]
+
+
+def split_ssh_args(args: list) -> tuple:
+    """Splits the arguments of ssh into the destination and the remote command."""
+    _, operands = getopt(args, SSH_VALUE_OPTIONS)
+    if not operands:
+        raise ValueError("usage: ssh [options] destination [command]")
+    return operands[0], " ".join(operands[1:])
+
+
+def ssh(args: list) -> int:
+    try:
+        destination, command = split_ssh_args(args)
+    except ValueError as e:
+        print(f"ssh: {e}", file=sys.stderr)
+        return 255
+    # The destination is '[user@]host', the shims run everything locally
+    if not destination or any(c.isspace() for c in destination):
+        print(f"ssh: Could not resolve hostname {destination}", file=sys.stderr)
+        return 255
+    if not command:
+        return 0
+    return subprocess.run(["bash", "-c", command]).returncode
+
+
+def scp(args: list) -> int:
+    try:
+        _, operands = getopt(args, SCP_VALUE_OPTIONS)
+    except ValueError as e:
+        print(f"scp: {e}", file=sys.stderr)
+        return 1
+    files = [path.split(":", 1)[1] if ":" in path else path for path in operands]
+    if len(files) < 2 or not all(files):
+        print("usage: scp [options] source ... target", file=sys.stderr)
+        return 1
+    *sources, target = files
+    for source in sources:
+        if os.path.isdir(source):
+            destination = (
+                os.path.join(target, os.path.basename(source.rstrip("/")))
+                if os.path.isdir(target)
+                else target
+            )
+            shutil.copytree(source, destination, dirs_exist_ok=True)
+        else:
+            shutil.copy(source, target)
+    return 0
+
+
+def main(command: str, args: list, stdin: Optional[str] = None) -> int:
+    """Runs a shim command, printing what the real command would print. Returns the exit code."""
+    if command == "ssh":
+        return ssh(args)
+    if command == "scp":
+        return scp(args)
+    state_dir = os.environ.get(STATE_DIR_VARIABLE)
+    if state_dir is None:
+        print(f"{command}: error: {STATE_DIR_VARIABLE} is not set", file=sys.stderr)
+        return 1
+    cluster = FakeCluster(state_dir)
+    try:
+        if command == "sbatch":
+            options, positional = parse_options(args)
+            if stdin is None and not positional and "wrap" not in options:
+                stdin = sys.stdin.read()  # Like sbatch, read the script from stdin
+            output = cluster.sbatch(args, stdin=stdin)
+            if "--test-only" in args:
+                print(
+                    output, file=sys.stderr
+                )  # Like SLURM, the estimate goes to stderr
+                return 0
+        else:
+            output = getattr(cluster, command)(args)
+    except SlurmError as e:
+        print(f"{command}: error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        cluster.close()
+    if output:
+        print(output)
+    return 0
@@ -0,0 +1,645 @@
+"""
+Discrete-event simulation of a SLURM cluster, persisted in a SQLite file so that every shim invocation
+(sbatch, squeue, sacct, scancel, scontrol) sees and advances the same cluster.
+
+Time is virtual: it advances with the wall clock multiplied by 'time_scale', so that a bundle of 24 hour jobs
+can be simulated in seconds. The outcome of a job is controlled by a '#MILEX_SIM' line in its script, e.g.
+
+    #MILEX_SIM runtime=3600 exit=1 state=OUT_OF_MEMORY maxrss=12G
+
+By default a job runs for 'runtime_fraction' of its time limit and completes successfully.
+"""
+
+from ..local_executor import array_indices
+from ..utils import parse_slurm_memory, parse_slurm_time
+from datetime import datetime, timedelta
+from typing import Optional
+import sqlite3
+import random
+import shlex
+import json
+import time
+import re
+import os
+
+__all__ = ["FakeCluster", "SlurmError"]
+
+
+DEFAULT_SETTINGS = {
+    "cpus": 64,  # CPUs of the cluster
+    "mem": "256G",  # Memory of the cluster
+    "time_scale": 1.0,  # Virtual seconds per wall clock second
+    "submit_latency": 0.0,  # Wall clock seconds spent in each sbatch call
+    "runtime_fraction": 0.5,  # Fraction of the time limit a job runs for by default
+    "default_time": "01:00:00",
+    "max_submit": None,  # Maximum number of pending and running jobs per user (MaxSubmitJobs)
+    "transient_error_rate": 0.0,  # Probability that a SLURM command fails with a transient error
+    "lost_reply_rate": 0.0,  # Probability that sbatch times out after the job was accepted
+    "epoch": "2024-01-01T00:00:00",  # Virtual time at the creation of the cluster
+}
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# sbatch options that do not take a value
+FLAG_OPTIONS = {
+    "parsable",
+    "test-only",
+    "requeue",
+    "no-requeue",
+    "hold",
+    "exclusive",
+    "quiet",
+    "wait",
+}
+SHORT_OPTIONS = {
+    "-J": "job-name",
+    "-t": "time",
+    "-c": "cpus-per-task",
+    "-n": "ntasks",
+    "-a": "array",
+    "-d": "dependency",
+    "-A": "account",
+    "-o": "output",
+    "-p": "partition",
+}
+SQUEUE_FLAGS = {"noheader", "all", "array"}
+SQUEUE_SHORT_OPTIONS = {"-h": "noheader", "-u": "user", "-j": "jobs", "-o": "format"}
+SACCT_FLAGS = {"noheader", "parsable", "parsable2", "allocations", "allusers"}
+SACCT_SHORT_OPTIONS = {
+    "-j": "jobs",
+    "-X": "allocations",
+    "-P": "parsable2",
+    "-n": "noheader",
+    "-o": "format",
+}
+TRANSIENT_ERRORS = [
+    "Socket timed out on send/recv operation",
+    "Resource temporarily unavailable",
+    "Slurm temporarily unable to accept job, sleeping and retrying",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER NOT NULL,
+    task INTEGER,
+    name TEXT,
+    user TEXT,
+    script TEXT,
+    cpus INTEGER,
+    mem REAL,
+    time_limit INTEGER,
+    runtime INTEGER,
+    exit_code INTEGER,
+    final_state TEXT,
+    maxrss REAL,
+    dependency TEXT,
+    kill_on_invalid_dep INTEGER,
+    comment TEXT,
+    state TEXT,
+    reason TEXT,
+    submit REAL,
+    start REAL,
+    end REAL,
+    restarts INTEGER DEFAULT 0,
+    PRIMARY KEY (id, task)
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs (state);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER);
+"""
+
+
+class SlurmError(Exception):
+    """Error reported by a simulated SLURM command, with the message the real command would print."""
+
+
+def parse_options(
+    args: list, flags: set = FLAG_OPTIONS, short_options: dict = SHORT_OPTIONS
+) -> tuple:
+    """
+    Parses the options of a SLURM command. Returns the options (by long name, True for flags)
+    and the remaining positional arguments.
+    """
+    options, positional = {}, []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg.startswith("--"):
+            key, eq, value = arg[2:].partition("=")
+            if eq:
+                options[key] = value
+            elif key in flags:
+                options[key] = True
+            else:
+                i += 1
+                options[key] = args[i]
+        elif arg[:2] in short_options:
+            key = short_options[arg[:2]]
+            if key in flags:
+                options[key] = True
+            elif len(arg) > 2:
+                options[key] = arg[2:]
+            else:
+                i += 1
+                options[key] = args[i]
+        else:
+            positional = args[i:]
+            break
+        i += 1
+    return options, positional
+
+
+def parse_script(script: str) -> tuple:
+    """Extracts the #SBATCH options and the #MILEX_SIM directives of a script."""
+    args = []
+    for line in script.splitlines():
+        line = line.strip()
+        if line.startswith("#SBATCH"):
+            args.extend(shlex.split(line[len("#SBATCH") :]))
+        elif line and not line.startswith("#"):
+            break  # SLURM stops reading directives at the first command
+    options, _ = parse_options(args)
+    simulation = {}
+    for match in re.finditer(r"^\s*#\s*MILEX_SIM\s+(.*)$", script, re.MULTILINE):
+        for item in shlex.split(match.group(1)):
+            key, _, value = item.partition("=")
+            simulation[key] = value
+    return options, simulation
+
+
+class FakeCluster:
+    """
+    A simulated SLURM cluster stored in a state directory.
+
+    Args:
+        state_dir (str): Directory holding the state of the cluster.
+        **settings: Overrides of DEFAULT_SETTINGS, saved on the first creation of the cluster.
+    """
+
+    def __init__(self, state_dir: str, **settings):
+        self.state_dir = state_dir
+        os.makedirs(state_dir, exist_ok=True)
+        self.settings_path = os.path.join(state_dir, "settings.json")
+        if os.path.exists(self.settings_path):
+            with open(self.settings_path, "r") as f:
+                self.settings = json.load(f)
+            self.settings.update(settings)
+        else:
+            self.settings = {**DEFAULT_SETTINGS, **settings, "created": time.time()}
+        if settings or not os.path.exists(self.settings_path):
+            self._save_settings()
+        self.connection = sqlite3.connect(
+            os.path.join(state_dir, "cluster.db"), timeout=60, isolation_level=None
+        )
+        self.connection.row_factory = sqlite3.Row
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        self.total_cpus = int(self.settings["cpus"])
+        self.total_mem = parse_slurm_memory(self.settings["mem"])
+        self.user = os.environ.get("USER", "user")
+
+    def close(self):
+        self.connection.close()
+
+    # Virtual clock
+
+    def now(self) -> float:
+        """Virtual time, in seconds since the epoch of the cluster."""
+        return (time.time() - self.settings["created"]) * self.settings["time_scale"]
+
+    def fast_forward(self, seconds: float) -> None:
+        """Moves the virtual clock forward, for every process using the cluster."""
+        self.settings["created"] -= seconds / self.settings["time_scale"]
+        self._save_settings()
+
+    def _save_settings(self) -> None:
+        # Shims read the settings concurrently, so they must never see a partial file
+        tmp_path = f"{self.settings_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.settings, f, indent=4)
+        os.replace(tmp_path, self.settings_path)
+
+    def isoformat(self, t: Optional[float]) -> str:
+        if t is None:
+            return "Unknown"
+        epoch = datetime.strptime(self.settings["epoch"], ISO_FORMAT)
+        return (epoch + timedelta(seconds=t)).strftime(ISO_FORMAT)
+
+    def _transaction(self):
+        self.connection.execute("BEGIN IMMEDIATE")
+
+    def _maybe_transient_error(self):
+        if random.random() < self.settings.get("transient_error_rate", 0.0):
+            raise SlurmError(random.choice(TRANSIENT_ERRORS))
+
+    # Discrete-event simulation
+
+    def _dependency_status(self, dependency: Optional[str]) -> str:
+        """'ok' if the dependency is satisfied, 'wait' if it may be satisfied later, 'never' otherwise."""
+        if not dependency:
+            return "ok"
+        # ',' separates conditions that must all be satisfied, '?' conditions of which one is enough
+        separator = "?" if "?" in dependency else ","
+        statuses = []
+        for condition in dependency.split(separator):
+            kind, _, ids = condition.partition(":")
+            for job_id in ids.split(":"):
+                base = job_id.split("_")[0]
+                rows = self.connection.execute(
+                    "SELECT state FROM jobs WHERE id = ?", (int(base),)
+                ).fetchall()
+                states = [row["state"] for row in rows]
+                if not states:
+                    statuses.append("never")
+                elif any(s in ("PENDING", "RUNNING") for s in states):
+                    statuses.append("wait")
+                elif kind == "afterany":
+                    statuses.append("ok")
+                elif kind == "afterok":
+                    ok = all(s == "COMPLETED" for s in states)
+                    statuses.append("ok" if ok else "never")
+                elif kind == "afternotok":
+                    ok = any(s != "COMPLETED" for s in states)
+                    statuses.append("ok" if ok else "never")
+                else:
+                    raise SlurmError(f"Job dependency problem: '{kind}'")
+        if separator == "?":
+            if "ok" in statuses:
+                return "ok"
+            return "wait" if "wait" in statuses else "never"
+        if "never" in statuses:
+            return "never"
+        return "wait" if "wait" in statuses else "ok"
+
+    def _schedule(self, t: float) -> None:
+        """Starts every pending job that is eligible and fits in the free resources at time t (FIFO with backfill)."""
+        used = self.connection.execute(
+            "SELECT COALESCE(SUM(cpus), 0) AS cpus, COALESCE(SUM(mem), 0) AS mem FROM jobs WHERE state = 'RUNNING'"
+        ).fetchone()
+        free_cpus = self.total_cpus - used["cpus"]
+        free_mem = self.total_mem - used["mem"]
+        pending = self.connection.execute(
+            "SELECT rowid, * FROM jobs WHERE state = 'PENDING' ORDER BY id, task"
+        ).fetchall()
+        for job in pending:
+            status = self._dependency_status(job["dependency"])
+            if status == "never":
+                if job["kill_on_invalid_dep"]:
+                    self.connection.execute(
+                        "UPDATE jobs SET state = 'CANCELLED', reason = 'DependencyNeverSatisfied', end = ? WHERE rowid = ?",
+                        (t, job["rowid"]),
+                    )
+                else:
+                    self.connection.execute(
+                        "UPDATE jobs SET reason = 'DependencyNeverSatisfied' WHERE rowid = ?",
+                        (job["rowid"],),
+                    )
+                continue
+            if status == "wait":
+                self.connection.execute(
+                    "UPDATE jobs SET reason = 'Dependency' WHERE rowid = ?",
+                    (job["rowid"],),
+                )
+                continue
+            if job["cpus"] <= free_cpus and job["mem"] <= free_mem:
+                free_cpus -= job["cpus"]
+                free_mem -= job["mem"]
+                self.connection.execute(
+                    "UPDATE jobs SET state = 'RUNNING', reason = 'None', start = ? WHERE rowid = ?",
+                    (t, job["rowid"]),
+                )
+            else:
+                self.connection.execute(
+                    "UPDATE jobs SET reason = 'Resources' WHERE rowid = ?",
+                    (job["rowid"],),
+                )
+
+    def advance(self) -> None:
+        """Processes every event (job completion followed by scheduling) up to the current virtual time."""
+        now = self.now()
+        while True:
+            event = self.connection.execute(
+                "SELECT MIN(start + MIN(runtime, time_limit)) AS t FROM jobs WHERE state = 'RUNNING'"
+            ).fetchone()["t"]
+            if event is None or event > now:
+                break
+            for job in self.connection.execute(
+                "SELECT rowid, * FROM jobs WHERE state = 'RUNNING' AND start + MIN(runtime, time_limit) <= ?",
+                (event,),
+            ).fetchall():
+                if job["runtime"] > job["time_limit"]:
+                    state, end = "TIMEOUT", job["start"] + job["time_limit"]
+                else:
+                    state, end = job["final_state"], job["start"] + job["runtime"]
+                self.connection.execute(
+                    "UPDATE jobs SET state = ?, end = ? WHERE rowid = ?",
+                    (state, end, job["rowid"]),
+                )
+            self._schedule(event)
+        self._schedule(now)
+
+    # SLURM commands
+
+    def _next_id(self) -> int:
+        row = self.connection.execute(
+            "SELECT value FROM counters WHERE name = 'job_id'"
+        ).fetchone()
+        job_id = row["value"] + 1 if row else 1000
+        self.connection.execute(
+            "INSERT OR REPLACE INTO counters VALUES ('job_id', ?)", (job_id,)
+        )
+        return job_id
+
+    def _job_shape(self, options: dict, simulation: dict) -> dict:
+        cpus = int(options.get("cpus-per-task", 1)) * int(
+            options.get("ntasks", options.get("tasks", 1))
+        )
+        mem = parse_slurm_memory(options["mem"]) if "mem" in options else 0
+        time_limit = parse_slurm_time(
+            options.get("time", self.settings["default_time"])
+        )
+        runtime = int(
+            float(
+                simulation.get(
+                    "runtime", time_limit * self.settings["runtime_fraction"]
+                )
+            )
+        )
+        exit_code = int(simulation.get("exit", 0))
+        final_state = simulation.get(
+            "state", "COMPLETED" if exit_code == 0 else "FAILED"
+        )
+        maxrss = (
+            parse_slurm_memory(simulation["maxrss"])
+            if "maxrss" in simulation
+            else mem / 2
+        )
+        return dict(
+            cpus=cpus,
+            mem=mem,
+            time_limit=time_limit,
+            runtime=runtime,
+            exit_code=exit_code,
+            final_state=final_state,
+            maxrss=maxrss,
+        )
+
+    def sbatch(self, args: list, stdin: Optional[str] = None) -> str:
+        """Simulates sbatch. Returns what sbatch prints, raises SlurmError on failure."""
+        time.sleep(self.settings["submit_latency"])
+        options, positional = parse_options(args)
+        if "wrap" in options:
+            script = f"#!/bin/bash\n{options['wrap']}\n"
+        elif positional:
+            try:
+                with open(positional[0], "r") as f:
+                    script = f.read()
+            except FileNotFoundError:
+                raise SlurmError(f"Unable to open file {positional[0]}")
+        elif stdin:
+            script = stdin
+        else:
+            raise SlurmError("Batch script is empty!")
+        script_options, simulation = parse_script(script)
+        options = {**script_options, **options}  # Command line options take precedence
+        shape = self._job_shape(options, simulation)
+        if shape["cpus"] > self.total_cpus or shape["mem"] > self.total_mem:
+            raise SlurmError(
+                "Batch job submission failed: Requested node configuration is not available"
+            )
+
+        self._transaction()
+        try:
+            self._maybe_transient_error()
+            self.advance()
+            if options.get("test-only"):
+                start = self._estimate_start(shape)
+                self.connection.execute("COMMIT")
+                return (
+                    f"sbatch: Job {self._peek_id()} to start at {self.isoformat(start)} using "
+                    f"{shape['cpus']} processors on nodes fake1 in partition fake"
+                )
+            max_submit = self.settings.get("max_submit")
+            tasks = array_indices(options.get("array"))
+            if max_submit is not None:
+                queued = self.connection.execute(
+                    "SELECT COUNT(*) AS n FROM jobs WHERE user = ? AND state IN ('PENDING', 'RUNNING')",
+                    (self.user,),
+                ).fetchone()["n"]
+                if queued + len(tasks) > max_submit:
+                    raise SlurmError(
+                        "QOSMaxSubmitJobPerUserLimit\nsbatch: error: Batch job submission failed: "
+                        "Job violates accounting/QOS policy (job submit limit, user's size and/or time limits)"
+                    )
+            job_id = self._next_id()
+            now = self.now()
+            kill = str(options.get("kill-on-invalid-dep", "no")).lower() == "yes"
+            for task in tasks:
+                self.connection.execute(
+                    "INSERT INTO jobs (id, task, name, user, script, dependency, kill_on_invalid_dep, comment, state, "
+                    "reason, submit, cpus, mem, time_limit, runtime, exit_code, final_state, maxrss) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, 'PENDING', 'None', ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        job_id,
+                        task,
+                        options.get("job-name", "sbatch"),
+                        self.user,
+                        positional[0] if positional else None,
+                        options.get("dependency"),
+                        int(kill),
+                        options.get("comment"),
+                        now,
+                        *[
+                            shape[k]
+                            for k in [
+                                "cpus",
+                                "mem",
+                                "time_limit",
+                                "runtime",
+                                "exit_code",
+                                "final_state",
+                                "maxrss",
+                            ]
+                        ],
+                    ),
+                )
+            self._schedule(now)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        if random.random() < self.settings.get("lost_reply_rate", 0.0):
+            raise SlurmError(
+                "Batch job submission failed: Socket timed out on send/recv operation"
+            )
+        if options.get("parsable"):
+            return str(job_id)
+        return f"Submitted batch job {job_id}"
+
+    def _peek_id(self) -> int:
+        row = self.connection.execute(
+            "SELECT value FROM counters WHERE name = 'job_id'"
+        ).fetchone()
+        return row["value"] + 1 if row else 1000
+
+    def _estimate_start(self, shape: dict) -> float:
+        """Earliest time at which a job of this shape fits, assuming running jobs end at their time limit."""
+        now = self.now()
+        running = self.connection.execute(
+            "SELECT cpus, mem, start + time_limit AS end FROM jobs WHERE state = 'RUNNING' ORDER BY end"
+        ).fetchall()
+        pending = self.connection.execute(
+            "SELECT COALESCE(SUM(cpus), 0) AS cpus FROM jobs WHERE state = 'PENDING' AND reason = 'Resources'"
+        ).fetchone()["cpus"]
+        free_cpus = self.total_cpus - sum(r["cpus"] for r in running) - pending
+        free_mem = self.total_mem - sum(r["mem"] for r in running)
+        if shape["cpus"] <= free_cpus and shape["mem"] <= free_mem:
+            return now
+        for job in running:
+            free_cpus += job["cpus"]
+            free_mem += job["mem"]
+            if shape["cpus"] <= free_cpus and shape["mem"] <= free_mem:
+                return max(job["end"], now)
+        return now + max((r["end"] - now for r in running), default=0)
+
+    def scancel(self, args: list) -> str:
+        self._transaction()
+        try:
+            self._maybe_transient_error()
+            self.advance()
+            now = self.now()
+            for job_id in args:
+                if job_id.startswith("-"):
+                    continue
+                base, _, task = job_id.partition("_")
+                query = "UPDATE jobs SET state = 'CANCELLED', end = ? WHERE id = ? AND state IN ('PENDING', 'RUNNING')"
+                parameters = [now, int(base)]
+                if task:
+                    query += " AND task = ?"
+                    parameters.append(int(task))
+                self.connection.execute(query, parameters)
+            self._schedule(now)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return ""
+
+    def scontrol(self, args: list) -> str:
+        """Supports 'scontrol requeue <id>': the job goes back to the queue with the same ID."""
+        if not args or args[0] != "requeue":
+            raise SlurmError(f"Unsupported scontrol command: {' '.join(args)}")
+        self._transaction()
+        try:
+            self.advance()
+            now = self.now()
+            for job_id in args[1:]:
+                self.connection.execute(
+                    "UPDATE jobs SET state = 'PENDING', reason = 'BeginTime', start = NULL, end = NULL, "
+                    "restarts = restarts + 1, submit = ? WHERE id = ?",
+                    (now, int(job_id.split("_")[0])),
+                )
+            self._schedule(now)
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        return ""
+
+    def _job_id(self, job) -> str:
+        return str(job["id"]) if job["task"] is None else f"{job['id']}_{job['task']}"
+
+    def squeue(self, args: list) -> str:
+        options, _ = parse_options(args, SQUEUE_FLAGS, SQUEUE_SHORT_OPTIONS)
+        self._transaction()
+        try:
+            self.advance()
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        query = "SELECT * FROM jobs WHERE state IN ('PENDING', 'RUNNING')"
+        parameters = []
+        if "user" in options:
+            query += " AND user = ?"
+            parameters.append(options["user"])
+        if "jobs" in options:
+            ids = [int(j.split("_")[0]) for j in str(options["jobs"]).split(",")]
+            query += f" AND id IN ({','.join('?' * len(ids))})"
+            parameters.extend(ids)
+        fmt = options.get("format", "%i %T %j %r")
+        lines = [] if "noheader" in options else ["JOBID STATE NAME REASON"]
+        for job in self.connection.execute(query + " ORDER BY id, task", parameters):
+            fields = {
+                "i": self._job_id(job),
+                "T": job["state"],
+                "t": {"PENDING": "PD", "RUNNING": "R"}[job["state"]],
+                "j": job["name"],
+                "r": job["reason"],
+                "u": job["user"],
+                "k": job["comment"] or "(null)",
+            }
+            lines.append(re.sub(r"%(\w)", lambda m: fields.get(m.group(1), ""), fmt))
+        return "\n".join(lines)
+
+    def sacct(self, args: list) -> str:
+        options, _ = parse_options(args, SACCT_FLAGS, SACCT_SHORT_OPTIONS)
+        self._transaction()
+        try:
+            self.advance()
+            self.connection.execute("COMMIT")
+        except BaseException:
+            self.connection.execute("ROLLBACK")
+            raise
+        fields = str(options.get("format", "JobID,JobName,State,ExitCode")).split(",")
+        query = "SELECT * FROM jobs"
+        parameters = []
+        if "jobs" in options:
+            ids = [
+                int(j.split("_")[0].split(".")[0])
+                for j in str(options["jobs"]).split(",")
+            ]
+            query += f" WHERE id IN ({','.join('?' * len(ids))})"
+            parameters.extend(ids)
+        separator = "|" if "parsable2" in options else " "
+        lines = [] if "noheader" in options else [separator.join(fields)]
+        for job in self.connection.execute(query + " ORDER BY id, task", parameters):
+            lines.append(separator.join(self._sacct_fields(job, fields, step=False)))
+            if "allocations" not in options and job["start"] is not None:
+                lines.append(separator.join(self._sacct_fields(job, fields, step=True)))
+        return "\n".join(lines)
+
+    def _sacct_fields(self, job, fields: list, step: bool) -> list:
+        finished = job["end"] is not None
+        elapsed = (
+            ((job["end"] if finished else self.now()) - job["start"])
+            if job["start"] is not None
+            else 0
+        )
+        exit_code = (
+            job["exit_code"] if job["state"] == job["final_state"] and finished else 0
+        )
+        values = {
+            "JobID": self._job_id(job) + (".batch" if step else ""),
+            "JobIDRaw": str(job["id"]) + (".batch" if step else ""),
+            "JobName": "batch" if step else job["name"],
+            "State": job["state"],
+            "Submit": self.isoformat(job["submit"]),
+            "Start": self.isoformat(job["start"]),
+            "End": self.isoformat(job["end"]),
+            "ExitCode": f"{exit_code}:0",
+            "AllocCPUS": str(job["cpus"]),
+            "ReqMem": f"{int(job['mem'])}M",
+            "MaxRSS": f"{int(job['maxrss'] * 1024)}K" if step else "",
+            "Timelimit": format_duration(job["time_limit"]),
+            "Elapsed": format_duration(elapsed),
+            "TotalCPU": format_duration(elapsed * job["cpus"] * 0.9),
+            "Restarts": str(job["restarts"]),
+        }
+        return [values.get(field, "") for field in fields]
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    prefix = f"{days}-" if days else ""
+    return f"{prefix}{hours:02d}:{minutes:02d}:{seconds:02d}"
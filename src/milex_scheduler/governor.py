@@ -0,0 +1,209 @@
+"""
+Adaptive pacing and retry of the sbatch submissions.
+
+During busy periods, slurmctld rejects requests with transient errors (e.g. 'Socket timed out on send/recv operation'
+or 'Resource temporarily unavailable'), and SSH connections to the login node can drop. A submission failing with
+a transient error is retried with jittered exponential backoff, instead of aborting the submission of the bundle.
+
+sbatch is not idempotent: some of these errors (e.g. a socket timeout or a dropped connection) can happen after
+slurmctld accepted the job. A submission failing with one of them is only retried once the caller checked that its
+job is not in the queue (see SubmissionGovernor.run).
+
+Submissions to a machine are paced by a governor shared by all the threads of the process. Its rate is adapted to
+the observed latency of sbatch (additive increase, multiplicative decrease): it grows while sbatch answers faster
+than 'target_latency', and is halved when sbatch is slower or fails with a transient error.
+
+The settings of a machine can be overridden with a 'governor' entry in its configuration, e.g.
+    "remote_1": {..., "governor": {"max_retries": 10, "target_latency": 5}}
+"""
+
+from collections import deque
+from typing import Callable, Optional
+import subprocess
+import threading
+import random
+import time
+import re
+
+__all__ = [
+    "is_transient_error",
+    "SubmissionGovernor",
+    "machine_governor",
+    "governor_metrics",
+]
+
+
+# Errors of slurmctld and SSH that usually go away when the request is repeated later
+TRANSIENT_ERROR = re.compile(
+    r"Socket timed out|Resource temporarily unavailable|temporarily unable to accept job|"
+    r"Unable to contact slurm controller|Zero Bytes were transmitted or received|"
+    r"Connection timed out|Connection reset by peer|Connection closed by|"
+    r"(kex|ssh)_exchange_identification|Broken pipe",
+    re.IGNORECASE,
+)
+
+# Transient errors of slurmctld raised before the job was accepted, always safe to retry
+REJECTED_ERROR = re.compile(
+    r"Resource temporarily unavailable|temporarily unable to accept job|"
+    r"Unable to contact slurm controller",
+    re.IGNORECASE,
+)
+
+# Transient errors that may happen after the job was accepted
+AMBIGUOUS_ERROR = re.compile(
+    r"Socket timed out|Zero Bytes were transmitted or received|"
+    r"Connection reset by peer|Connection closed by|Broken pipe",
+    re.IGNORECASE,
+)
+
+DEFAULT_GOVERNOR_SETTINGS = {
+    "max_retries": 6,  # Retries of a submission failing with a transient error
+    "backoff": 1.0,  # Seconds before the first retry, doubled at each retry
+    "max_backoff": 60.0,
+    "target_latency": 2.0,  # Seconds. Slower submissions reduce the rate
+    "initial_rate": 10.0,  # Submissions per second
+    "min_rate": 0.1,
+    "max_rate": 50.0,
+    "rate_increase": 0.5,  # Submissions per second added after each fast submission
+}
+
+
+def is_transient_error(message: str) -> bool:
+    """Whether a failed command is worth retrying, because slurmctld was busy or the SSH connection dropped."""
+    return TRANSIENT_ERROR.search(message) is not None
+
+
+class SubmissionGovernor:
+    """
+    Paces, retries and measures the submissions to a machine. Thread-safe.
+
+    Args:
+        **settings: Overrides of DEFAULT_GOVERNOR_SETTINGS.
+    """
+
+    def __init__(self, **settings):
+        self.settings = {**DEFAULT_GOVERNOR_SETTINGS, **settings}
+        self.rate = float(self.settings["initial_rate"])
+        self.lock = threading.Lock()
+        self.next_slot = time.monotonic()
+        self.latencies = deque(maxlen=100)
+        self.counts = {
+            "calls": 0,
+            "retries": 0,
+            "transient_errors": 0,
+            "failures": 0,
+            "recovered": 0,
+        }
+
+    def _wait_turn(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + 1 / self.rate
+        time.sleep(slot - now)
+
+    def _adapt(self, latency: float, transient: bool) -> None:
+        with self.lock:
+            self.latencies.append(latency)
+            if transient or latency > self.settings["target_latency"]:
+                self.rate = max(self.rate / 2, self.settings["min_rate"])
+            else:
+                self.rate = min(
+                    self.rate + self.settings["rate_increase"],
+                    self.settings["max_rate"],
+                )
+
+    def backoff(self, retry: int) -> float:
+        """Seconds to wait before a retry: a random fraction of the exponential backoff (full jitter)."""
+        delay = min(self.settings["backoff"] * 2**retry, self.settings["max_backoff"])
+        return random.uniform(0, delay)
+
+    def run(
+        self,
+        command: Callable[[], subprocess.CompletedProcess],
+        submitted: Optional[Callable[[], Optional[subprocess.CompletedProcess]]] = None,
+    ) -> subprocess.CompletedProcess:
+        """
+        Runs a command in its turn, retrying it while it fails with a transient error.
+
+        Args:
+            command (Callable): Runs the command and returns its subprocess.CompletedProcess.
+            submitted (Optional[Callable]): Looks for the job of a submission that failed with an error that may
+                happen after the job was accepted (see AMBIGUOUS_ERROR). Returns the result to use instead of the
+                failure if the job is in the queue, None otherwise. Without it, these errors are not retried.
+
+        Returns:
+            subprocess.CompletedProcess: The result of the last attempt. The caller checks its return code.
+        """
+        retry = 0
+        while True:
+            self._wait_turn()
+            start = time.monotonic()
+            result = command()
+            transient = result.returncode != 0 and is_transient_error(
+                f"{result.stderr}"
+            )
+            self._adapt(time.monotonic() - start, transient)
+            retrying = transient and retry < self.settings["max_retries"]
+            delay = self.backoff(retry)
+            recovered = None
+            if retrying and AMBIGUOUS_ERROR.search(f"{result.stderr}"):
+                if submitted is None:
+                    retrying = False
+                else:
+                    # Leave slurmctld the time to answer before looking for the job
+                    time.sleep(delay)
+                    delay = 0
+                    recovered = submitted()
+            with self.lock:
+                self.counts["calls"] += 1
+                if transient:
+                    self.counts["transient_errors"] += 1
+                if recovered is not None:
+                    self.counts["recovered"] += 1
+                elif retrying:
+                    self.counts["retries"] += 1
+                elif result.returncode != 0:
+                    self.counts["failures"] += 1
+            if recovered is not None:
+                return recovered
+            if not retrying:
+                return result
+            time.sleep(delay)
+            retry += 1
+
+    def metrics(self) -> dict:
+        """Counts of calls, retries, transient errors and failures, with the current rate and the recent latencies."""
+        with self.lock:
+            latencies = sorted(self.latencies)
+            return {
+                **self.counts,
+                "rate": self.rate,
+                "mean_latency": sum(latencies) / len(latencies) if latencies else None,
+                "max_latency": latencies[-1] if latencies else None,
+            }
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def machine_governor(machine_config: Optional[dict] = None) -> SubmissionGovernor:
+    """The governor shared by the submissions to a machine, configured by its 'governor' entry."""
+    machine_config = machine_config or {}
+    label = machine_config.get("hostname") or machine_config.get("hosturl") or "local"
+    settings = {**DEFAULT_GOVERNOR_SETTINGS, **machine_config.get("governor", {})}
+    with _governors_lock:
+        if label not in _governors:
+            _governors[label] = SubmissionGovernor(**settings)
+        instance = _governors[label]
+    instance.settings = (
+        settings  # The rate and the metrics are kept if the configuration changes
+    )
+    return instance
+
+
+def governor_metrics() -> dict:
+    """The metrics of the governor of each machine submitted to by this process."""
+    with _governors_lock:
+        return {label: g.metrics() for label, g in _governors.items()}
@@ -0,0 +1,135 @@
+"""
+Opt-in instrumentation of the generated SLURM scripts. An instrumented script times the environment activation,
+the pre-commands and the main command, measures their CPU time (with the 'times' builtin) and the peak memory of
+the main command (with GNU time when available), and writes a JSON sidecar next to the output of the job.
+"""
+
+from .definitions import SHELL_TIMESTAMP
+from .job_db import connect_job_db, query_jobs
+from .run_slurm import run_slurm_command
+from .utils import load_config
+from contextlib import closing
+from datetime import datetime
+from typing import Optional
+import shlex
+import json
+import re
+import os
+
+__all__ = ["collect_instrumentation", "summarize_instrumentation"]
+
+
+SIDECAR_SUFFIX = ".milex.json"
+
+INSTRUMENTATION_HEADER = (
+    r"""# milex instrumentation: timings and resources of each section are written to a JSON sidecar
+_milex_sidecar="$MILEX/slurm/${SLURM_JOB_NAME}-${SLURM_ARRAY_JOB_ID:-$SLURM_JOB_ID}${SLURM_ARRAY_TASK_ID:+_$SLURM_ARRAY_TASK_ID}.milex.json"
+_milex_tmp=$(mktemp)
+_milex_sections=""
+_milex_begin() { _milex_name=$1; _milex_start=%(now)s; }
+_milex_end() {
+    local end shell children
+    end=%(now)s
+    times > "$_milex_tmp"
+    { read -r shell; read -r children; } < "$_milex_tmp"
+    _milex_sections+="{\"name\": \"$_milex_name\", \"start\": $_milex_start, \"end\": $end, \"cpu\": \"$shell $children\"},"
+}
+"""
+    % {"now": SHELL_TIMESTAMP}
+)
+# The peak memory is measured with GNU time only (BSD time has no -f option)
+INSTRUMENTATION_MAIN = r"""_milex_timer=""
+if /usr/bin/time -f %M true >/dev/null 2>&1; then _milex_timer="/usr/bin/time -f %M -o $_milex_tmp.rss"; fi
+"""
+INSTRUMENTATION_STATUS = r"""
+_milex_status=$?
+_milex_end
+"""
+INSTRUMENTATION_FOOTER = r"""_milex_rss=$(tail -n 1 "$_milex_tmp.rss" 2>/dev/null)
+[[ "$_milex_rss" =~ ^[0-9]+$ ]] || _milex_rss=null
+printf '{"job_name": "%s", "job_id": "%s", "array_task_id": "%s", "host": "%s", "exit_code": %d, "max_rss_kb": %s, "sections": [%s]}\n' \
+    "$SLURM_JOB_NAME" "${SLURM_ARRAY_JOB_ID:-$SLURM_JOB_ID}" "${SLURM_ARRAY_TASK_ID:-}" "$(hostname)" \
+    "$_milex_status" "$_milex_rss" "${_milex_sections%,}" > "$_milex_sidecar"
+rm -f "$_milex_tmp" "$_milex_tmp.rss"
+exit $_milex_status
+"""
+
+
+def parse_times(cpu: str) -> float:
+    """Sums the durations printed by the bash 'times' builtin (e.g. '0m0.010s 0m0.002s 1m2.5s 0m0.3s')."""
+    return sum(
+        60 * float(minutes) + float(seconds)
+        for minutes, seconds in re.findall(r"(\d+)m([\d.]+)s", cpu)
+    )
+
+
+def collect_instrumentation(
+    name: str,
+    machine_config: Optional[dict] = None,
+    date: Optional[datetime] = None,
+) -> list:
+    """
+    Reads the sidecars of the latest attempt of every job of a bundle, with a single command on the machine.
+
+    Args:
+        name (str): The name of the job bundle.
+        machine_config (Optional[dict]): The machine the jobs ran on. Defaults to the local machine.
+        date (Optional[datetime]): The date of the bundle. The most recent submission is used by default.
+
+    Returns:
+        list: The sidecar of every job (and array task) that finished its main command.
+    """
+    if machine_config is None:
+        machine_config = load_config()["local"]
+    with closing(connect_job_db()) as job_db:
+        rows = query_jobs(job_db, bundle=name, bundle_date=date, latest_attempt=True)
+    if not rows:
+        return []
+    bundle_date = max(row["bundle_date"] for row in rows)
+    slurm_dir = os.path.join(machine_config["path"], "slurm")
+    paths = []
+    for row in rows:
+        if row["bundle_date"] != bundle_date:
+            continue
+        prefix = shlex.quote(
+            os.path.join(slurm_dir, f"{row['job_name']}-{row['slurm_id']}")
+        )
+        paths.extend([prefix + SIDECAR_SUFFIX, prefix + "_*" + SIDECAR_SUFFIX])
+    result = run_slurm_command(f"cat {' '.join(paths)} 2>/dev/null", machine_config)
+    records = []
+    for line in result.stdout.splitlines():
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # Sidecar of a job killed while writing it
+    return records
+
+
+def summarize_instrumentation(records: list) -> dict:
+    """
+    Aggregates sidecars per job: number of tasks, failed tasks, peak memory (MB) of the main command, and
+    for each section the mean wall time and CPU time (seconds) per task.
+    """
+    summary = {}
+    for record in records:
+        job = summary.setdefault(
+            record["job_name"],
+            {"tasks": 0, "failed": 0, "max_rss_mb": None, "sections": {}},
+        )
+        job["tasks"] += 1
+        job["failed"] += record["exit_code"] != 0
+        if record.get("max_rss_kb") is not None:
+            job["max_rss_mb"] = max(job["max_rss_mb"] or 0, record["max_rss_kb"] / 1024)
+        cpu_before = 0.0
+        for section in record["sections"]:
+            cpu = parse_times(section["cpu"])  # Cumulative since the start of the job
+            totals = job["sections"].setdefault(section["name"], [0.0, 0.0])
+            totals[0] += section["end"] - section["start"]
+            totals[1] += cpu - cpu_before
+            cpu_before = cpu
+    for job in summary.values():
+        job["sections"] = {
+            name: {"wall": wall / job["tasks"], "cpu": cpu / job["tasks"]}
+            for name, (wall, cpu) in job["sections"].items()
+        }
+    return summary
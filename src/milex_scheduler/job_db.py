@@ -0,0 +1,363 @@
+"""
+Local SQLite store of every submitted job and its state as reported by the SLURM accounting database
+"""
+
+from .utils import load_config, argument_signature
+from .definitions import DATE_FORMAT
+from .run_slurm import query_sacct
+from typing import Optional
+from datetime import datetime
+import hashlib
+import sqlite3
+import json
+import os
+
+__all__ = [
+    "connect_job_db",
+    "record_submission",
+    "query_jobs",
+    "set_failure",
+    "set_job_state",
+    "sync_job_states",
+    "script_hash",
+]
+
+
+JOB_DB_NAME = "milex.db"
+ISO_FORMAT = "%Y-%m-%dT%H:%M:%S"
+# States after which SLURM will not update a job anymore
+TERMINAL_STATES = {
+    "BOOT_FAIL",
+    "CANCELLED",
+    "COMPLETED",
+    "DEADLINE",
+    "FAILED",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+    "PREEMPTED",
+    "REVOKED",
+    "TIMEOUT",
+}
+# Ordering used to summarize the state of an array job from the state of its tasks
+STATE_SEVERITY = [
+    "COMPLETED",
+    "PENDING",
+    "REQUEUED",
+    "RUNNING",
+    "SUSPENDED",
+    "CANCELLED",
+    "PREEMPTED",
+    "DEADLINE",
+    "TIMEOUT",
+    "FAILED",
+    "BOOT_FAIL",
+    "NODE_FAIL",
+    "OUT_OF_MEMORY",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bundle TEXT NOT NULL,
+    bundle_date TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    slurm_id TEXT NOT NULL,
+    script TEXT,
+    script_hash TEXT,
+    attempt INTEGER NOT NULL DEFAULT 1,
+    submit_time TEXT NOT NULL,
+    state TEXT NOT NULL DEFAULT 'SUBMITTED',
+    start_time TEXT,
+    end_time TEXT,
+    exit_code TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_script_state_submit ON jobs (script, state, submit_time);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_submit ON jobs (state, submit_time);
+CREATE INDEX IF NOT EXISTS idx_jobs_bundle ON jobs (bundle, bundle_date, job_name);
+CREATE INDEX IF NOT EXISTS idx_jobs_machine_slurm_id ON jobs (machine, slurm_id);
+CREATE INDEX IF NOT EXISTS idx_jobs_script_hash ON jobs (script_hash);
+CREATE TABLE IF NOT EXISTS usage (
+    sacct_id TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    script TEXT,
+    signature TEXT,
+    state TEXT,
+    alloc_cpus INTEGER,
+    req_mem_mb REAL,
+    max_rss_mb REAL,
+    time_limit_s INTEGER,
+    elapsed_s REAL,
+    total_cpu_s REAL,
+    end_time TEXT,
+    PRIMARY KEY (machine, sacct_id)
+);
+CREATE INDEX IF NOT EXISTS idx_usage_script_signature ON usage (script, signature, state);
+CREATE TABLE IF NOT EXISTS backlog (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    bundle TEXT NOT NULL,
+    bundle_date TEXT NOT NULL,
+    job_name TEXT NOT NULL,
+    machine TEXT NOT NULL,
+    machine_config TEXT NOT NULL,
+    queued_time TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backlog_machine ON backlog (machine, id);
+"""
+# Columns added after the first version of the schema, created on databases that lack them
+MIGRATIONS = {
+    "resources": "ALTER TABLE jobs ADD COLUMN resources TEXT",
+    "failure": "ALTER TABLE jobs ADD COLUMN failure TEXT",
+    "signature": "ALTER TABLE jobs ADD COLUMN signature TEXT",
+}
+
+
+def job_db_path() -> str:
+    return os.path.join(load_config()["local"]["path"], JOB_DB_NAME)
+
+
+def connect_job_db(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Opens the job database, creating the tables and indexes if needed.
+
+    Args:
+        path (Optional[str]): Path to the database file. Defaults to 'milex.db' in the local milex directory.
+
+    Returns:
+        sqlite3.Connection: A connection whose rows can be accessed by column name.
+    """
+    if path is None:
+        path = job_db_path()
+    connection = sqlite3.connect(path, timeout=30)
+    connection.row_factory = sqlite3.Row
+    # Write-ahead logging lets status queries run while a submission is being recorded
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    connection.executescript(SCHEMA)
+    # Concurrent submissions open the database at the same time: the columns are checked under the write lock
+    connection.execute("BEGIN IMMEDIATE")
+    columns = {row["name"] for row in connection.execute("PRAGMA table_info(jobs)")}
+    for column, statement in MIGRATIONS.items():
+        if column not in columns:
+            connection.execute(statement)
+    connection.commit()
+    return connection
+
+
+def script_hash(content: str) -> str:
+    """SHA-256 digest of the content of a SLURM script."""
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def machine_label(machine_config: dict) -> str:
+    """Name under which jobs submitted to a machine are recorded."""
+    return machine_config.get("hostname", machine_config.get("hosturl", "local"))
+
+
+def record_submission(
+    connection: sqlite3.Connection,
+    bundle: str,
+    bundle_date: datetime,
+    job: dict,
+    machine: str,
+    slurm_id: str,
+    script_hash: Optional[str] = None,
+    attempt: int = 1,
+    submit_time: Optional[datetime] = None,
+) -> int:
+    """
+    Records a job submission in the job database, along with the SLURM resources requested by the job.
+
+    Returns:
+        int: The row ID of the recorded submission.
+    """
+    if submit_time is None:
+        submit_time = datetime.now()
+    cursor = connection.execute(
+        "INSERT INTO jobs (bundle, bundle_date, job_name, machine, slurm_id, script, script_hash, attempt, submit_time, resources, signature) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            bundle,
+            bundle_date.strftime(DATE_FORMAT),
+            job["name"],
+            machine,
+            str(slurm_id),
+            job.get("script"),
+            script_hash,
+            attempt,
+            submit_time.strftime(ISO_FORMAT),
+            json.dumps(job.get("slurm", {})),
+            argument_signature(job.get("script_args")),
+        ),
+    )
+    connection.commit()
+    return cursor.lastrowid
+
+
+def set_failure(connection: sqlite3.Connection, row_id: int, failure: str) -> None:
+    """Records the classification of the failure of a submission (see the "retry" module)."""
+    connection.execute("UPDATE jobs SET failure = ? WHERE id = ?", (failure, row_id))
+    connection.commit()
+
+
+def set_job_state(
+    connection: sqlite3.Connection,
+    row_id: int,
+    state: str,
+    start_time: Optional[datetime] = None,
+    end_time: Optional[datetime] = None,
+    exit_code: Optional[str] = None,
+) -> None:
+    """Records the state of a job that is not tracked by the SLURM accounting database (e.g. local executions)."""
+    connection.execute(
+        "UPDATE jobs SET state = ?, start_time = COALESCE(?, start_time), end_time = COALESCE(?, end_time), "
+        "exit_code = COALESCE(?, exit_code) WHERE id = ?",
+        (
+            state,
+            start_time.strftime(ISO_FORMAT) if start_time else None,
+            end_time.strftime(ISO_FORMAT) if end_time else None,
+            exit_code,
+            row_id,
+        ),
+    )
+    connection.commit()
+
+
+def query_jobs(
+    connection: sqlite3.Connection,
+    bundle: Optional[str] = None,
+    bundle_date: Optional[datetime] = None,
+    script: Optional[str] = None,
+    state: Optional[str] = None,
+    machine: Optional[str] = None,
+    since: Optional[datetime] = None,
+    latest_attempt: bool = False,
+) -> list:
+    """
+    Queries the job database. Every filter is optional and filters are combined with AND.
+
+    Example:
+        Every failed job of script X submitted this week
+        >>> query_jobs(connection, script="X", state="FAILED", since=datetime.now() - timedelta(days=7))
+
+    Args:
+        latest_attempt (bool): Only return the most recent attempt of each job in a bundle.
+
+    Returns:
+        list: The matching rows (sqlite3.Row), ordered by submission time.
+    """
+    clauses, parameters = [], []
+    for column, value in [
+        ("bundle", bundle),
+        ("script", script),
+        ("state", state),
+        ("machine", machine),
+    ]:
+        if value is not None:
+            clauses.append(f"{column} = ?")
+            parameters.append(value)
+    if bundle_date is not None:
+        clauses.append("bundle_date = ?")
+        parameters.append(bundle_date.strftime(DATE_FORMAT))
+    if since is not None:
+        clauses.append("submit_time >= ?")
+        parameters.append(since.strftime(ISO_FORMAT))
+    if latest_attempt:
+        clauses.append(
+            "id IN (SELECT MAX(id) FROM jobs GROUP BY bundle, bundle_date, job_name)"
+        )
+    query = "SELECT * FROM jobs"
+    if clauses:
+        query += " WHERE " + " AND ".join(clauses)
+    query += " ORDER BY submit_time, id"
+    return connection.execute(query, parameters).fetchall()
+
+
+def _parse_sacct_time(value: str) -> Optional[str]:
+    if value in ("", "None", "Unknown"):
+        return None
+    return value
+
+
+def _summarize_records(slurm_id: str, records: dict) -> Optional[dict]:
+    """Summarize the sacct records of a job. Array tasks are reported as 'ID_index'."""
+    if slurm_id in records:
+        return records[slurm_id]
+    tasks = [r for key, r in records.items() if key.startswith(f"{slurm_id}_")]
+    if not tasks:
+        return None
+    states = [task["State"].split()[0] for task in tasks]
+    starts = [s for s in (_parse_sacct_time(t["Start"]) for t in tasks) if s]
+    ends = [e for e in (_parse_sacct_time(t["End"]) for t in tasks) if e]
+    worst = max(
+        states,
+        key=lambda s: STATE_SEVERITY.index(s) if s in STATE_SEVERITY else 0,
+    )
+    finished = all(s in TERMINAL_STATES for s in states)
+    return {
+        "State": worst,
+        "Start": min(starts) if starts else "",
+        "End": max(ends) if ends and finished else "",
+        "ExitCode": next(
+            (t["ExitCode"] for t in tasks if t["State"].split()[0] == worst), ""
+        ),
+    }
+
+
+def sync_job_states(
+    connection: sqlite3.Connection,
+    machine_config: dict,
+    bundle: Optional[str] = None,
+) -> int:
+    """
+    Updates the state, start/end times and exit code of the unfinished jobs of a machine
+    from the SLURM accounting database, with a single sacct call (through the remote helper on a remote machine,
+    which also finds the queued jobs that are not in the accounting database yet).
+
+    Args:
+        connection (sqlite3.Connection): Connection to the job database.
+        machine_config (dict): The configuration of the machine the jobs were submitted to.
+        bundle (Optional[str]): Restrict the update to the jobs of a bundle.
+
+    Returns:
+        int: The number of updated jobs.
+    """
+    machine = machine_label(machine_config)
+    query = (
+        "SELECT id, slurm_id FROM jobs WHERE machine = ? AND state NOT IN ({})".format(
+            ",".join("?" * len(TERMINAL_STATES))
+        )
+    )
+    parameters = [machine, *sorted(TERMINAL_STATES)]
+    if bundle is not None:
+        query += " AND bundle = ?"
+        parameters.append(bundle)
+    rows = connection.execute(query, parameters).fetchall()
+    if not rows:
+        return 0
+    records = query_sacct(
+        sorted({row["slurm_id"] for row in rows}),
+        ["State", "Start", "End", "ExitCode"],
+        machine_config,
+        remote_helper=True,
+    )
+    updates = []
+    for row in rows:
+        record = _summarize_records(row["slurm_id"], records)
+        if record is None:
+            continue
+        updates.append(
+            (
+                record["State"].split()[0],  # e.g. 'CANCELLED by 1234'
+                _parse_sacct_time(record["Start"]),
+                _parse_sacct_time(record["End"]),
+                record["ExitCode"] or None,
+                row["id"],
+            )
+        )
+    connection.executemany(
+        "UPDATE jobs SET state = ?, start_time = ?, end_time = ?, exit_code = ? WHERE id = ?",
+        updates,
+    )
+    connection.commit()
+    return len(updates)
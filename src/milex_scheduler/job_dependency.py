@@ -2,10 +2,12 @@ import os
 from typing import Union
 from collections import defaultdict
 from .utils import load_config
+from .tracing import traced
 
-__all__ = ["dependency_graph", "update_slurm_with_dependencies"]
+__all__ = ["dependency_graph", "update_slurm_with_dependencies", "dependency_options"]
 
 
+@traced()
 def dependency_graph(jobs):
     """
     Build a dependency graph from a dictionary of jobs.
@@ -35,9 +37,17 @@ def dependency_graph(jobs):
     return dependency_graph
 
 
+@traced()
 def update_slurm_with_dependencies(
-    slurm_name, dependency_job_ids: Union[list, tuple, int]
+    slurm_name,
+    dependency_job_ids: Union[list, tuple, int],
+    kill_on_invalid_dep: bool = False,
 ):  # , dependency_type: Union[list, str]='afterok'):
+    """
+    Adds the SLURM IDs of the jobs a script depends on to its dependency directive.
+    With kill_on_invalid_dep, SLURM cancels the job if a dependency fails, instead of leaving it
+    pending with the reason DependencyNeverSatisfied.
+    """
     if not isinstance(dependency_job_ids, (list, tuple)):
         dependency_job_ids = [dependency_job_ids]
     # if not isinstance(dependency_type, list):
@@ -64,6 +74,8 @@ def update_slurm_with_dependencies(
         dependency_directive = (
             f"#SBATCH --dependency=afterok:{':'.join(dependency_job_ids)}\n"
         )
+        if kill_on_invalid_dep:
+            dependency_directive += "#SBATCH --kill-on-invalid-dep=yes\n"
         for i, line in enumerate(lines):
             if line.startswith("#!/bin/bash"):
                 lines.insert(i + 1, dependency_directive)
@@ -71,3 +83,18 @@ def update_slurm_with_dependencies(
 
     with open(file_path, "w") as file:
         file.writelines(lines)
+
+
+def dependency_options(
+    dependency_job_ids: list, kill_on_invalid_dep: bool = False
+) -> list:
+    """
+    sbatch command line options equivalent to the directives written by update_slurm_with_dependencies,
+    for scripts that were transferred before the IDs of their dependencies were known.
+    """
+    if not dependency_job_ids:
+        return []
+    options = [f"--dependency=afterok:{':'.join(dependency_job_ids)}"]
+    if kill_on_invalid_dep:
+        options.append("--kill-on-invalid-dep=yes")
+    return options
@@ -1,25 +1,70 @@
 from typing import Optional
+from contextlib import closing
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from .job_to_slurm import create_slurm_script
-from .job_dependency import update_slurm_with_dependencies
-from .run_slurm import run_slurm_remotely, run_slurm_locally
+import json
+import os
+from .job_to_slurm import create_slurm_script, render_slurm_script
+from .job_dependency import update_slurm_with_dependencies, dependency_options
+from .job_db import connect_job_db, record_submission, machine_label, script_hash
+from .run_slurm import run_slurm_remotely, run_slurm_locally, is_remote_machine
+from .run_slurm import run_slurm_from_stdin, run_slurm_command
 from .save_load_jobs import load_bundle, transfer_slurm_to_remote
-from .utils import load_config
+from .save_load_jobs import transfer_slurm_bundle_to_remote
+from .resource_shapes import optimize_shapes as optimize_resource_shapes
+from .local_executor import run_bundle_locally
+from .backlog import backlog_jobs, free_submit_slots, is_submit_limit_error
+from .remote_bundle import submit_with_remote_helper
+from .tracing import span, traced
+from .utils import load_config, name_slurm_script
 
-__all__ = ["submit_jobs"]
+__all__ = ["submit_jobs", "submit_bundles"]
 
 
+def submit_slurm_script(slurm_name: str, machine_config: dict) -> str:
+    """Submits a SLURM script saved in the local slurm directory, transferring it first if the machine is remote."""
+    if is_remote_machine(machine_config):
+        transfer_slurm_to_remote(slurm_name, machine_config=machine_config)
+        return run_slurm_remotely(slurm_name, machine_config=machine_config)
+    return run_slurm_locally(slurm_name)
+
+
+@traced()
 def submit_jobs(
-    name: str, machine_config: Optional[dict] = None, date: Optional[datetime] = None
-):
+    name: str,
+    machine_config: Optional[dict] = None,
+    date: Optional[datetime] = None,
+    optimize_shapes: bool = False,
+    backend: str = "slurm",
+    dedupe: bool = False,
+    in_memory: bool = False,
+    archive: bool = False,
+    remote_helper: bool = False,
+) -> dict:
     """
     Run a job with SLURM either locally or on a remote machine. This is the main function of the scheduler module.
     It assumes the job configuration is stored in a JSON file. The logic to save jobs to a JSON file is implemented in the "save_load_jobs" module.
+    Every submission is recorded in the local job database (see the "job_db" module).
 
     Parameters:
         - name (str): The name of the job bundle to be scheduled.
         - machine_config (Optional[dict]): The configuration details for the remote machine. If not provided, the default configuration will be used.
         - date (Optional[datetime]): The date and time to schedule the job. If not provided, the current date and time will be used.
+        - optimize_shapes (bool): For jobs that declare alternative resource 'shapes', submit the shape with the earliest
+            estimated completion (see the "resource_shapes" module).
+        - backend (str): 'slurm' submits the jobs with sbatch. 'local' runs the bundle on this machine with a process pool,
+            without SLURM (see the "local_executor" module).
+        - dedupe (bool): Store the scripts on a remote machine under the hash of their content, so that identical
+            scripts are transferred once, and scripts already on the machine are not transferred again.
+        - in_memory (bool): Render the scripts in memory and pipe them to 'sbatch --parsable' over a shared SSH
+            connection, without writing or transferring any file.
+        - archive (bool): With in_memory, save a copy of each submitted script in the local slurm directory,
+            in the background, for provenance.
+        - remote_helper (bool): Send the whole bundle to a helper deployed on the remote machine, which submits the
+            jobs and wires their dependencies on the login node, in a single SSH round trip (see the "remote_bundle" module).
+
+    Returns:
+        - dict: The SLURM job ID of each job in the bundle, or the final state of each job with the 'local' backend.
 
     Raises:
         - EnvironmentError: If no configuration is found for the specified machine.
@@ -27,9 +72,13 @@ def submit_jobs(
     """
     if machine_config is None:
         machine_config = load_config()["local"]
+    if backend == "local":
+        return run_bundle_locally(name, machine_config=machine_config, date=date)
+    elif backend != "slurm":
+        raise ValueError(f"Unknown backend '{backend}'. Use 'slurm' or 'local'.")
 
     # Check for presence of hostname or hosturl
-    if "hostname" not in machine_config and "hosturl" not in machine_config:
+    if not is_remote_machine(machine_config):
         machine = "local"
         host = "localhost"
     else:
@@ -38,7 +87,12 @@ def submit_jobs(
 
     # Create SLURM script for each job
     jobs, dependencies, date = load_bundle(name)
+    if optimize_shapes:
+        jobs = optimize_resource_shapes(jobs, machine_config)
+    slurm_dir = os.path.join(load_config()["local"]["path"], "slurm")
     slurm_names = {}
+    script_hashes = {}
+    contents = {}
     for job in jobs:
         if job.get("script", None) is None:
             raise ValueError(
@@ -48,20 +102,193 @@ def submit_jobs(
             raise ValueError(
                 "'name' entry is missing from one of the jobs in the configuration file {job_name}"
             )
-        slurm_name = create_slurm_script(job, date, machine_config)
-        slurm_names[job["name"]] = slurm_name
+        with span("create_slurm_script", job=job["name"]):
+            if in_memory:
+                contents[job["name"]] = render_slurm_script(job, machine_config)
+                script_hashes[job["name"]] = script_hash(contents[job["name"]])
+                continue
+            slurm_name = create_slurm_script(job, date, machine_config, bundle=name)
+            slurm_names[job["name"]] = slurm_name
+            with open(os.path.join(slurm_dir, slurm_name), "r") as f:
+                contents[job["name"]] = f.read()
+            script_hashes[job["name"]] = script_hash(contents[job["name"]])
 
-    # Submit each job in topological order and capture dependencies in SLURM script
-    for job in jobs:
-        slurm_name = slurm_names[job["name"]]
+    # Transfer every script to the remote machine at once. Their dependencies are then passed on the sbatch command line
+    kill_on_invalid_dep = machine_config.get("kill_on_invalid_dep", True)
+    remote_helper = remote_helper and machine == "remote"
+    remote_names = {}
+    if machine == "remote" and not in_memory and not remote_helper:
+        with span("transfer", jobs=len(slurm_names)):
+            remote_names = transfer_slurm_bundle_to_remote(
+                list(slurm_names.values()), machine_config, dedupe=dedupe
+            )
+
+    free_slots = free_submit_slots(machine_config)
+    # With the remote helper, every job is submitted at once. The loop below only records the submissions
+    helper_ids, helper_error = {}, None
+    if remote_helper:
+        helper_ids, helper_error = submit_with_remote_helper(
+            jobs,
+            dependencies,
+            contents,
+            machine_config,
+            slurm_names=None if in_memory else slurm_names,
+            max_jobs=free_slots,
+        )
+
+    def sbatch(job: dict, options: list) -> str:
+        if remote_helper:
+            if job["name"] not in helper_ids:
+                raise ValueError(f"Error running sbatch command: {helper_error}")
+            return helper_ids[job["name"]]
+        if in_memory:
+            return run_slurm_from_stdin(
+                contents[job["name"]], machine_config, sbatch_options=options
+            )
         if machine == "remote":
-            transfer_slurm_to_remote(slurm_name, machine_config=machine_config)
-            job_id = run_slurm_remotely(slurm_name, machine_config=machine_config)
-            print(f"Submitted job {job['name']} with ID {job_id} at {host}")
-        else:
-            job_id = run_slurm_locally(slurm_name)
-            print(f"Submitted job {job['name']} with ID {job_id} locally")
-
-        # Update dependent job scripts with the current job ID
-        for dependent_job_name in dependencies.get(job["name"], []):
-            update_slurm_with_dependencies(slurm_names[dependent_job_name], job_id)
+            if dedupe:  # Stored scripts do not carry the name of the job
+                options = [f"--job-name={job['name']}"] + options
+            return run_slurm_remotely(
+                remote_names[slurm_names[job["name"]]],
+                machine_config=machine_config,
+                sbatch_options=options,
+            )
+        return run_slurm_locally(slurm_names[job["name"]])
+
+    # Submit each job in topological order and capture dependencies in SLURM script
+    job_ids = {}
+    dependency_ids = {job["name"]: [] for job in jobs}
+    archiver = ThreadPoolExecutor(max_workers=1) if in_memory and archive else None
+    archived = []
+    with closing(connect_job_db()) as job_db:
+        for index, job in enumerate(jobs):
+            options = dependency_options(
+                dependency_ids[job["name"]], kill_on_invalid_dep
+            )
+            queue_full = free_slots is not None and len(job_ids) >= free_slots
+            if not queue_full:
+                try:
+                    with span("submit", job=job["name"]):
+                        job_id = sbatch(job, options)
+                except ValueError as e:
+                    if not is_submit_limit_error(str(e)):
+                        raise
+                    queue_full = True
+            # The jobs beyond the limit of queued jobs of the user are submitted later by milex-agent
+            if queue_full:
+                backlog = [job["name"] for job in jobs[index:]]
+                backlog_jobs(job_db, name, date, backlog, machine_config)
+                print(
+                    f"The queue is full: {len(backlog)} jobs are backlogged. Run milex-agent to submit them."
+                )
+                break
+            if archiver is not None:
+                archived.append(
+                    archiver.submit(
+                        archive_slurm_script,
+                        name_slurm_script(job, date, name),
+                        contents[job["name"]],
+                        options,
+                    )
+                )
+            if machine == "remote":
+                print(f"Submitted job {job['name']} with ID {job_id} at {host}")
+            else:
+                print(f"Submitted job {job['name']} with ID {job_id} locally")
+            job_ids[job["name"]] = job_id
+            with span("record_submission", job=job["name"]):
+                record_submission(
+                    job_db,
+                    name,
+                    date,
+                    job,
+                    machine_label(machine_config),
+                    job_id,
+                    script_hash=script_hashes[job["name"]],
+                )
+
+            # Update dependent job scripts with the current job ID. The local copy of the scripts of remote jobs
+            # keeps a record of their dependencies
+            for dependent_job_name in dependencies.get(job["name"], []):
+                dependency_ids[dependent_job_name].append(job_id)
+                if in_memory:
+                    continue
+                update_slurm_with_dependencies(
+                    slurm_names[dependent_job_name],
+                    job_id,
+                    kill_on_invalid_dep=kill_on_invalid_dep,
+                )
+    if archiver is not None:
+        archiver.shutdown(wait=True)
+        for future in archived:
+            future.result()  # Raise the errors of the archival
+    return job_ids
+
+
+@traced()
+def submit_bundles(
+    bundles: dict,
+    max_workers: int = 4,
+    journal: Optional[str] = None,
+    **options,
+) -> dict:
+    """
+    Submits independent bundles concurrently. The submissions to a machine share its SSH master connection
+    and its submission governor.
+
+    Args:
+        bundles (dict): The machine configuration of each bundle name (None for the local machine).
+        max_workers (int): Maximum number of bundles submitted at the same time.
+        journal (Optional[str]): Path of a JSON file where the outcome of every bundle is written.
+        **options: Options of submit_jobs (e.g. in_memory=True), applied to every bundle.
+
+    Returns:
+        dict: The outcome of each bundle: the SLURM job IDs returned by submit_jobs, or the exception that
+            stopped its submission.
+    """
+    # Open the SSH master connection of each remote machine once, before the bundles race to open it
+    opened = set()
+    for machine_config in bundles.values():
+        if machine_config is not None and is_remote_machine(machine_config):
+            if machine_label(machine_config) not in opened:
+                opened.add(machine_label(machine_config))
+                run_slurm_command("true", machine_config)
+
+    results = {}
+    with ThreadPoolExecutor(max_workers=max(min(max_workers, len(bundles)), 1)) as pool:
+        futures = {
+            pool.submit(submit_jobs, name, machine_config, **options): name
+            for name, machine_config in bundles.items()
+        }
+        for future in as_completed(futures):
+            try:
+                results[futures[future]] = future.result()
+            except Exception as e:
+                results[futures[future]] = e
+    results = {name: results[name] for name in bundles}  # In the order of the bundles
+
+    if journal is not None:
+        entries = {}
+        for name, result in results.items():
+            if isinstance(result, Exception):
+                entries[name] = {"error": f"{type(result).__name__}: {result}"}
+            else:
+                machine_config = bundles[name] or {}
+                entries[name] = {
+                    "machine": machine_label(machine_config),
+                    "jobs": result,
+                }
+        with open(journal, "w") as f:
+            json.dump(
+                {"time": datetime.now().isoformat(), "bundles": entries}, f, indent=4
+            )
+    return results
+
+
+def archive_slurm_script(slurm_name: str, content: str, sbatch_options: list) -> None:
+    """Saves a script submitted from memory in the local slurm directory, with its command line options as directives."""
+    shebang, _, body = content.partition("\n")
+    directives = "".join(f"#SBATCH {option}\n" for option in sbatch_options)
+    path = os.path.join(load_config()["local"]["path"], "slurm", slurm_name)
+    with open(path, "w") as f:
+        f.write(f"{shebang}\n{directives}{body}")
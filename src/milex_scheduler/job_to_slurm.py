@@ -1,28 +1,61 @@
 import os
-from io import TextIOWrapper
+from io import TextIOWrapper, StringIO
 from datetime import datetime
+from typing import Optional
 from .utils import name_slurm_script, load_config
+from .rightsizing import rightsize_job
+from .env_snapshot import env_snapshot_commands
+from .instrumentation import (
+    INSTRUMENTATION_HEADER,
+    INSTRUMENTATION_MAIN,
+    INSTRUMENTATION_STATUS,
+    INSTRUMENTATION_FOOTER,
+)
+from .staging import stage_in_commands, stage_out_commands
+from .checkpoint import checkpoint_policy, checkpoint_directives
+from .checkpoint import checkpoint_commands, checkpoint_requeue_commands
 
+__all__ = ["create_slurm_script", "render_slurm_script"]
 
-__all__ = ["create_slurm_script"]
 
-
-def create_slurm_script(job: dict, date: datetime, machine_config: dict) -> str:
-    """Creates a SLURM script and saves it locally"""
+def create_slurm_script(
+    job: dict, date: datetime, machine_config: dict, bundle: Optional[str] = None
+) -> str:
+    """
+    Creates a SLURM script and saves it locally, under a name that includes the bundle of the job if given.
+    If the job has a 'rightsize' entry ('suggest' or 'apply'), its 'mem' and 'time' are compared with the usage
+    of its past runs (see the "rightsizing" module).
+    """
     user_settings = load_config()
     path = os.path.join(user_settings["local"]["path"], "slurm")
-    slurm_name = name_slurm_script(job, date)
+    slurm_name = name_slurm_script(job, date, bundle)
     file_path = os.path.join(path, slurm_name)
     with open(file_path, "w") as f:
-        write_slurm_content(f, job, machine_config)
+        f.write(render_slurm_script(job, machine_config))
     print(f"Saved SLURM script for job {job['name']} saved to {file_path}")
     return slurm_name
 
 
+def render_slurm_script(job: dict, machine_config: dict) -> str:
+    """Renders the content of the SLURM script of a job in memory, after rightsizing its resources if requested."""
+    if job.get("rightsize"):
+        job = rightsize_job(job, job["rightsize"])
+    content = StringIO()
+    write_slurm_content(content, job, machine_config)
+    return content.getvalue()
+
+
 def write_slurm_content(file: TextIOWrapper, job: dict, machine_config: dict) -> None:
     """
     Writes the content of the SLURM script with formatted arguments, handling list arguments differently based on their type.
+    If the job has an 'instrument' entry set to True, each section of the script is timed (see the "instrumentation" module).
+    If the machine has an 'env_snapshot' entry set to True, the environment activated by its env_command is cached
+    (see the "env_snapshot" module).
+    Jobs with 'stage_in' or 'stage_out' entries run with their inputs and outputs in node-local scratch (see the "staging" module).
+    Checkpointable jobs are requeued when they reach their time limit (see the "checkpoint" module).
     """
+    instrument = job.get("instrument", False)
+    checkpoint = checkpoint_policy(job)
     env_command = machine_config.get("env_command", "")
     slurm_account = machine_config.get("slurm_account", "")
 
@@ -37,23 +70,45 @@ def write_slurm_content(file: TextIOWrapper, job: dict, machine_config: dict) ->
     for key, value in job["slurm"].items():
         if value is not None:
             file.write(f"#SBATCH --{key.replace('_', '-')}={value}\n")
+    if checkpoint:
+        file.write(checkpoint_directives(checkpoint))
 
     # Make sure path is exported to environment
     file.write(f"export MILEX=\"{machine_config['path']}\"\n")
 
+    if instrument:
+        file.write(INSTRUMENTATION_HEADER)
+        file.write("_milex_begin env\n")
+
     # Environment activation command
-    if env_command:
+    if env_command and machine_config.get("env_snapshot", False):
+        file.write(env_snapshot_commands(env_command))
+    elif env_command:
         file.write(f"{env_command}\n")
 
+    if instrument:
+        file.write("_milex_end\n_milex_begin pre_commands\n")
+
     # Pre-commands
     for cmd in job.get("pre_commands", []):
         file.write(f"{cmd}\n")
 
-    # Main command and arguments
-    file.write(f"{job['script']} \\\n")
-    job_args = job.get("script_args", {})
+    # Staging of inputs and outputs through node-local scratch
+    if job.get("stage_in") or job.get("stage_out"):
+        if instrument:
+            file.write("_milex_end\n_milex_begin stage_in\n")
+        file.write(stage_in_commands(job.get("stage_in", [])))
+    if job.get("stage_out"):
+        file.write(stage_out_commands(job["stage_out"]))
+
+    if instrument:
+        file.write("_milex_end\n_milex_begin main\n")
+        file.write(INSTRUMENTATION_MAIN)
 
-    for i, (k, v) in enumerate(job_args.items()):
+    # Main command and arguments
+    timer = "$_milex_timer " if instrument else ""
+    main = f"{timer}{job['script']}"
+    for k, v in job.get("script_args", {}).items():
         if v is None:
             continue
         if isinstance(v, bool):
@@ -69,9 +124,20 @@ def write_slurm_content(file: TextIOWrapper, job: dict, machine_config: dict) ->
                 arg_line += f" \\\n    {item}"
         else:
             arg_line = f"  --{k}={v}"
+        main += f" \\\n{arg_line}"
+    if checkpoint:
+        file.write(checkpoint_commands(main, checkpoint))
+    else:
+        file.write(f"{main}\n")
 
-        if i < len(job_args) - 1:
-            arg_line += " \\\n"
-        else:
-            arg_line += "\n"
-        file.write(arg_line)
+    if instrument:
+        file.write(INSTRUMENTATION_STATUS)
+        if job.get("stage_out"):
+            file.write("_milex_begin stage_out\n_milex_stage_out\n_milex_end\n")
+        if checkpoint:
+            file.write(checkpoint_requeue_commands(checkpoint))
+        file.write(INSTRUMENTATION_FOOTER)
+    elif checkpoint:
+        file.write("_milex_status=$?\n")
+        file.write(checkpoint_requeue_commands(checkpoint))
+        file.write("exit $_milex_status\n")
@@ -0,0 +1,236 @@
+"""
+Execution of a bundle of jobs on the local machine with a process pool, without SLURM
+"""
+
+from .job_db import connect_job_db, record_submission, set_job_state, script_hash
+from .job_to_slurm import create_slurm_script
+from .save_load_jobs import load_bundle
+from .utils import load_config, parse_slurm_memory
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import closing
+from datetime import datetime
+from typing import Optional
+import subprocess
+import tempfile
+import shutil
+import os
+import re
+
+__all__ = ["run_bundle_locally"]
+
+
+LOCAL_MACHINE = "local-executor"
+
+
+def array_indices(array: Optional[str]) -> list:
+    """
+    Expands a SLURM array specification (e.g. '1-10%6', '0-15:4', '1,3,5') into its task indices.
+    Returns [None] for a job that is not an array.
+    """
+    if array is None:
+        return [None]
+    indices = []
+    for part in str(array).split("%")[0].split(","):
+        match = re.fullmatch(r"(\d+)(?:-(\d+)(?::(\d+))?)?", part.strip())
+        if match is None:
+            raise ValueError(f"Unable to parse array specification '{array}'")
+        start, stop, step = match.groups()
+        stop = stop if stop is not None else start
+        indices.extend(range(int(start), int(stop) + 1, int(step or 1)))
+    return indices
+
+
+def job_capacity(job: dict) -> tuple:
+    """CPUs and memory (in megabytes) requested by a job (or by each task of an array job)."""
+    slurm = job.get("slurm", {})
+    cpus = int(slurm.get("cpus_per_task") or 1) * int(slurm.get("tasks") or 1)
+    memory = parse_slurm_memory(slurm["mem"]) if slurm.get("mem") else 0
+    return cpus, memory
+
+
+def total_memory() -> Optional[float]:
+    """Physical memory of the machine in megabytes, None if it cannot be determined."""
+    try:
+        return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def run_script(script_path: str, log_path: str, env: dict) -> int:
+    """Runs a SLURM script with bash, streaming its output to a log file. Returns the exit code."""
+    tmpdir = tempfile.mkdtemp(prefix="milex-")
+    env = {**env, "SLURM_TMPDIR": tmpdir, "TMPDIR": tmpdir}
+    try:
+        with open(log_path, "w") as log:
+            return subprocess.run(
+                ["bash", script_path], stdout=log, stderr=subprocess.STDOUT, env=env
+            ).returncode
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+
+
+def run_bundle_locally(
+    name: str,
+    machine_config: Optional[dict] = None,
+    max_cpus: Optional[int] = None,
+    max_mem: Optional[str] = None,
+    date: Optional[datetime] = None,
+) -> dict:
+    """
+    Runs a bundle on the local machine with a process pool instead of submitting it to SLURM.
+    Jobs start as soon as their dependencies completed successfully ('afterok') and enough CPUs and memory are free.
+    The SLURM scripts are run with bash, with the usual SLURM environment variables, and their output
+    is written to '$MILEX/slurm/%x-%j.out' (or '%x-%A_%a.out' for array tasks).
+    Every job is recorded in the job database under the machine 'local-executor'.
+
+    Parameters:
+        - name (str): The name of the job bundle.
+        - machine_config (Optional[dict]): The configuration used to render the scripts (e.g. its 'env_command').
+            Defaults to the local machine. The jobs run in the local milex directory, whatever its 'path'.
+        - max_cpus (Optional[int]): CPUs available to the jobs. Defaults to the number of CPUs of the machine.
+        - max_mem (Optional[str]): Memory available to the jobs (e.g. '64G'). Defaults to the memory of the machine.
+        - date (Optional[datetime]): The date of the bundle. The latest bundle is used by default.
+
+    Returns:
+        - dict: The state of each job ('COMPLETED', 'FAILED' or 'CANCELLED' if a dependency failed).
+
+    Raises:
+        - ValueError: If a job requests more CPUs or memory than available.
+    """
+    local_config = load_config()["local"]
+    local_path = local_config["path"]
+    machine_config = {**(machine_config or local_config), "path": local_path}
+    if max_cpus is None:
+        max_cpus = os.cpu_count() or 1
+    max_mem = parse_slurm_memory(max_mem) if max_mem is not None else total_memory()
+
+    jobs, dependencies, date = load_bundle(name, date)
+    parents = {job["name"]: [] for job in jobs}
+    for parent, children in dependencies.items():
+        for child in children:
+            parents[child].append(parent)
+    slurm_dir = os.path.join(local_path, "slurm")
+
+    # Render the scripts and check that every job fits on the machine
+    slurm_names = {}
+    for job in jobs:
+        cpus, memory = job_capacity(job)
+        if cpus > max_cpus or (max_mem is not None and memory > max_mem):
+            raise ValueError(
+                f"Job {job['name']} requests {cpus} CPUs and {memory:.0f}M of memory, "
+                f"more than the {max_cpus} CPUs and {max_mem or 0:.0f}M available locally."
+            )
+        slurm_names[job["name"]] = create_slurm_script(
+            job, date, machine_config, bundle=name
+        )
+
+    job_ids = {}
+    states = {}
+    rows = {}
+    tasks = {}  # job name -> array indices left to start
+    remaining = {job["name"]: job for job in jobs}
+    running = {}  # future -> (job name, cpus, memory)
+    free_cpus, free_mem = max_cpus, max_mem
+    next_id = 1
+    with ProcessPoolExecutor(max_workers=max_cpus) as executor, closing(
+        connect_job_db()
+    ) as job_db:
+        while remaining or running:
+            # Cancel jobs whose dependencies failed
+            for job_name in list(remaining):
+                if any(
+                    states.get(p) in ("FAILED", "CANCELLED") for p in parents[job_name]
+                ):
+                    states[job_name] = "CANCELLED"
+                    del remaining[job_name]
+                    print(f"Cancelled job {job_name}: a dependency failed")
+
+            # Start every ready job that fits in the free capacity, in topological order
+            for job_name, job in list(remaining.items()):
+                if not all(states.get(p) == "COMPLETED" for p in parents[job_name]):
+                    continue
+                if job_name not in tasks:
+                    job_ids[job_name] = str(next_id)
+                    next_id += 1
+                    tasks[job_name] = array_indices(job.get("slurm", {}).get("array"))
+                    script_path = os.path.join(slurm_dir, slurm_names[job_name])
+                    with open(script_path, "r") as f:
+                        content = f.read()
+                    rows[job_name] = record_submission(
+                        job_db,
+                        name,
+                        date,
+                        job,
+                        LOCAL_MACHINE,
+                        job_ids[job_name],
+                        script_hash=script_hash(content),
+                    )
+                cpus, memory = job_capacity(job)
+                while (
+                    tasks[job_name]
+                    and cpus <= free_cpus
+                    and (free_mem is None or memory <= free_mem)
+                ):
+                    index = tasks[job_name].pop(0)
+                    if job_name not in states:
+                        states[job_name] = "RUNNING"
+                        set_job_state(
+                            job_db, rows[job_name], "RUNNING", start_time=datetime.now()
+                        )
+                    env = dict(
+                        os.environ,
+                        MILEX=local_path,
+                        SLURM_JOB_ID=job_ids[job_name],
+                        SLURM_JOB_NAME=job_name,
+                        SLURM_CPUS_PER_TASK=str(cpus),
+                        SLURM_RESTART_COUNT="0",
+                    )
+                    log_name = f"{job_name}-{job_ids[job_name]}.out"
+                    if index is not None:
+                        env.update(
+                            SLURM_ARRAY_JOB_ID=job_ids[job_name],
+                            SLURM_ARRAY_TASK_ID=str(index),
+                        )
+                        log_name = f"{job_name}-{job_ids[job_name]}_{index}.out"
+                    future = executor.submit(
+                        run_script,
+                        os.path.join(slurm_dir, slurm_names[job_name]),
+                        os.path.join(slurm_dir, log_name),
+                        env,
+                    )
+                    running[future] = (job_name, cpus, memory)
+                    free_cpus -= cpus
+                    if free_mem is not None:
+                        free_mem -= memory
+                if not tasks[job_name]:
+                    del remaining[job_name]
+
+            if not running:
+                if remaining:  # Should not happen with a valid dependency graph
+                    raise RuntimeError(f"Jobs {list(remaining)} cannot be scheduled")
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                job_name, cpus, memory = running.pop(future)
+                free_cpus += cpus
+                if free_mem is not None:
+                    free_mem += memory
+                returncode = future.result()
+                if returncode != 0:
+                    states[job_name] = "FAILED"
+                # A job is finished once all its tasks are finished
+                if not tasks[job_name] and not any(
+                    other == job_name for other, _, _ in running.values()
+                ):
+                    if states[job_name] == "RUNNING":
+                        states[job_name] = "COMPLETED"
+                    set_job_state(
+                        job_db,
+                        rows[job_name],
+                        states[job_name],
+                        end_time=datetime.now(),
+                        exit_code=f"{returncode}:0",
+                    )
+                    print(f"Job {job_name} (ID {job_ids[job_name]}) {states[job_name]}")
+    return states
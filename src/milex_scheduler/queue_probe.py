@@ -0,0 +1,230 @@
+"""
+Estimation of job start times with 'sbatch --test-only' and queue-aware selection of a machine
+"""
+
+from .job_db import machine_label
+from .run_slurm import run_slurm_command
+from .save_load_jobs import load_bundle
+from .utils import load_config, parse_slurm_time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+import threading
+import shlex
+import json
+import time
+import re
+import os
+
+__all__ = ["probe_start_times", "estimate_makespan", "select_machine"]
+
+
+PROBE_CACHE_TTL = 300  # seconds
+PROBE_SEPARATOR = "@@milex-probe@@"
+# SLURM options that do not change the shape of the resources requested by a job
+IGNORED_PROBE_OPTIONS = {"array", "dependency", "job_name", "output"}
+_probe_cache_lock = threading.Lock()
+
+
+def sbatch_test_only_command(slurm: dict, slurm_account: Optional[str] = None) -> str:
+    """sbatch command estimating the start time of a job with the given SLURM options, without submitting it."""
+    options = []
+    if slurm_account:
+        options.append(f"--account={slurm_account}")
+    for key, value in slurm.items():
+        if value is not None and key not in IGNORED_PROBE_OPTIONS:
+            options.append(shlex.quote(f"--{key.replace('_', '-')}={value}"))
+    return " ".join(["sbatch", "--test-only", *options, "--wrap=true"])
+
+
+def parse_test_only_output(output: str) -> Optional[datetime]:
+    """Extracts the estimated start time from the output of 'sbatch --test-only'. None if the job cannot run."""
+    match = re.search(r"to start at (\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2})", output)
+    if match is None:
+        return None
+    return datetime.strptime(match.group(1), "%Y-%m-%dT%H:%M:%S")
+
+
+def shape_key(slurm: dict) -> str:
+    return json.dumps(
+        {
+            k: v
+            for k, v in slurm.items()
+            if v is not None and k not in IGNORED_PROBE_OPTIONS
+        },
+        sort_keys=True,
+    )
+
+
+def probe_cache_path() -> str:
+    return os.path.join(load_config()["local"]["path"], "cache", "probes.json")
+
+
+def _load_probe_cache() -> dict:
+    try:
+        with open(probe_cache_path(), "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+
+def _save_probe_cache(cache: dict) -> None:
+    path = probe_cache_path()
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    # Write to a temporary file first so that concurrent readers never see a partial file
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(cache, f)
+    os.replace(tmp_path, path)
+
+
+def probe_start_times(
+    shapes: list,
+    machine_config: dict,
+    ttl: float = PROBE_CACHE_TTL,
+    timeout: Optional[float] = None,
+) -> list:
+    """
+    Estimates the start time of jobs with the given SLURM options on a machine. All the shapes that are not
+    in the probe cache (or whose cache entry is older than ttl seconds) are probed with a single remote call.
+
+    Args:
+        shapes (list): The SLURM options (dict) of each job.
+        machine_config (dict): The configuration of the machine to probe.
+        ttl (float): Time in seconds during which a probe result is reused.
+        timeout (Optional[float]): Time in seconds after which the probe is abandoned.
+
+    Returns:
+        list: The estimated start time (datetime) of each shape, or None if the shape cannot run on the machine.
+    """
+    cache = _load_probe_cache()
+    machine_cache = cache.setdefault(machine_label(machine_config), {})
+    now = time.time()
+    keys = [shape_key(shape) for shape in shapes]
+    missing = {}
+    for key, shape in zip(keys, shapes):
+        entry = machine_cache.get(key)
+        if entry is None or now - entry[0] > ttl:
+            missing[key] = shape
+
+    if missing:
+        # Each output is terminated by the separator, so that a truncated reply can be detected
+        command = "".join(
+            f"{sbatch_test_only_command(shape, machine_config.get('slurm_account'))} 2>&1; echo {PROBE_SEPARATOR}; "
+            for shape in missing.values()
+        )
+        result = run_slurm_command(command, machine_config, timeout=timeout)
+        outputs = result.stdout.split(PROBE_SEPARATOR)[:-1]
+        if result.returncode != 0 or len(outputs) != len(missing):
+            raise ValueError(
+                f"Error probing machine {machine_label(machine_config)}: "
+                f"{len(outputs)} of {len(missing)} probes answered. {result.stderr or ''}".strip()
+            )
+        with _probe_cache_lock:
+            # Reload the cache in case another machine was probed in the meantime
+            cache = _load_probe_cache()
+            machine_cache = cache.setdefault(machine_label(machine_config), {})
+            for key, output in zip(missing, outputs):
+                start = parse_test_only_output(output)
+                machine_cache[key] = [now, start.isoformat() if start else None]
+            _save_probe_cache(cache)
+
+    return [
+        (
+            datetime.fromisoformat(machine_cache[key][1])
+            if machine_cache.get(key, [0, None])[1]
+            else None
+        )
+        for key in keys
+    ]
+
+
+def estimate_makespan(
+    jobs: list, dependencies: dict, start_times: dict, now: Optional[datetime] = None
+) -> datetime:
+    """
+    Estimates the completion time of a bundle along its critical path. A job starts at the latest of its
+    estimated start time and the end of its parents, and runs for its full time limit.
+
+    Args:
+        jobs (list): The jobs of the bundle in topological order.
+        dependencies (dict): The dependency graph of the bundle (see job_dependency.dependency_graph).
+        start_times (dict): The estimated start time of each job.
+
+    Returns:
+        datetime: The estimated completion time of the bundle.
+    """
+    if now is None:
+        now = datetime.now()
+    parents = {job["name"]: [] for job in jobs}
+    for parent, children in dependencies.items():
+        for child in children:
+            parents[child].append(parent)
+    end_times = {}
+    for job in jobs:
+        start = max(
+            [start_times.get(job["name"]) or now]
+            + [end_times[p] for p in parents[job["name"]] if p in end_times]
+        )
+        duration = parse_slurm_time(job.get("slurm", {}).get("time") or "0")
+        end_times[job["name"]] = start + timedelta(seconds=duration)
+    return max(end_times.values(), default=now)
+
+
+def select_machine(
+    name: str,
+    machines: Optional[list] = None,
+    ttl: float = PROBE_CACHE_TTL,
+    timeout: Optional[float] = 60,
+) -> str:
+    """
+    Selects the configured machine with the earliest estimated completion of the critical path of a bundle.
+    Every machine is probed in parallel.
+
+    Args:
+        name (str): The name of the job bundle.
+        machines (Optional[list]): The names of the machines to consider. Every configured machine by default.
+        ttl (float): Time in seconds during which a probe result is reused.
+        timeout (Optional[float]): Time in seconds after which a machine that did not answer is ignored.
+
+    Returns:
+        str: The name of the selected machine.
+
+    Raises:
+        EnvironmentError: If the bundle cannot run on any machine.
+    """
+    config = load_config()
+    if machines is None:
+        machines = list(config)
+    machines = [m for m in machines if config.get(m, {}).get("slurm_account")]
+    jobs, dependencies, _ = load_bundle(name)
+    shapes = [job.get("slurm", {}) for job in jobs]
+
+    makespans = {}
+    with ThreadPoolExecutor(max_workers=max(len(machines), 1)) as executor:
+        futures = {
+            machine: executor.submit(
+                probe_start_times, shapes, config[machine], ttl, timeout
+            )
+            for machine in machines
+        }
+        for machine, future in futures.items():
+            try:
+                start_times = future.result()
+            except Exception as e:
+                print(f"Could not probe machine {machine}: {e}")
+                continue
+            if any(start is None for start in start_times):
+                print(f"Machine {machine} cannot run every job of bundle {name}.")
+                continue
+            start_times = {job["name"]: start for job, start in zip(jobs, start_times)}
+            makespans[machine] = estimate_makespan(jobs, dependencies, start_times)
+            print(
+                f"Machine {machine}: bundle {name} estimated to complete at {makespans[machine]}"
+            )
+
+    if not makespans:
+        raise EnvironmentError(f"No configured machine can run the bundle {name}.")
+    selected = min(makespans, key=makespans.get)
+    print(f"Selected machine {selected}")
+    return selected
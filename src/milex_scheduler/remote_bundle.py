@@ -0,0 +1,183 @@
+"""
+Submission of whole bundles through the remote helper (see remote_helper), in a single SSH round trip.
+The helper also reports the state of jobs, from sacct and squeue, in a single round trip.
+
+The helper is deployed once in the milex directory of the machine, under the hash of its source, so that a new
+version of milex deploys its own helper. The rendered scripts of the bundle are then sent in a compressed payload,
+and the helper submits them on the login node, wiring their dependencies, and retrying transient errors of slurmctld.
+"""
+
+from .governor import REJECTED_ERROR, machine_governor
+from .run_slurm import ssh_args
+from .utils import ssh_host_from_config
+from .tracing import traced
+from typing import Optional
+import subprocess
+import hashlib
+import shlex
+import gzip
+import json
+import os
+
+__all__ = [
+    "deploy_remote_helper",
+    "submit_with_remote_helper",
+    "query_with_remote_helper",
+]
+
+
+HELPER_SOURCE = os.path.join(os.path.dirname(__file__), "remote_helper.py")
+
+# Helpers known to be deployed, by (host, path)
+_deployed = set()
+
+
+def _ssh(
+    machine_config: dict, command: str, stdin: bytes
+) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        ssh_args(machine_config, command),
+        input=stdin,
+        capture_output=True,
+    )
+
+
+def _run_helper(
+    machine_config: dict, helper: str, command: str, payload: dict
+) -> subprocess.CompletedProcess:
+    python = machine_config.get("python", "python3")
+    return _ssh(
+        machine_config,
+        f"{python} {shlex.quote(helper)} {command}",
+        gzip.compress(json.dumps(payload).encode()),
+    )
+
+
+@traced()
+def deploy_remote_helper(machine_config: dict) -> str:
+    """
+    Copies the remote helper in the '.milex' directory of the machine, unless it is already there.
+
+    Returns:
+        str: The path of the helper on the machine.
+    """
+    with open(HELPER_SOURCE, "rb") as f:
+        source = f.read()
+    digest = hashlib.sha256(source).hexdigest()[:16]
+    path = os.path.join(machine_config["path"], ".milex", f"milex_remote_{digest}.py")
+    key = (ssh_host_from_config(machine_config), path)
+    if key in _deployed:
+        return path
+    quoted = shlex.quote(path)
+    command = (
+        f"test -f {quoted} || {{ mkdir -p {shlex.quote(os.path.dirname(path))} && "
+        f"cat > {quoted}.$$ && mv -f {quoted}.$$ {quoted}; }}"
+    )
+    result = _ssh(machine_config, command, source)
+    if result.returncode != 0:
+        raise ValueError(
+            f"Error deploying the remote helper: {result.stderr.decode(errors='replace')}"
+        )
+    _deployed.add(key)
+    return path
+
+
+@traced("remote_helper")
+def submit_with_remote_helper(
+    jobs: list,
+    dependencies: dict,
+    contents: dict,
+    machine_config: dict,
+    slurm_names: Optional[dict] = None,
+    max_jobs: Optional[int] = None,
+) -> tuple[dict, Optional[str]]:
+    """
+    Submits the jobs of a bundle on a remote machine with the remote helper, in a single SSH call.
+
+    Args:
+        jobs (list): The jobs, in topological order.
+        dependencies (dict): The names of the dependents of each job.
+        contents (dict): The rendered SLURM script of each job.
+        machine_config (dict): The configuration of the machine. Its 'python' entry is the interpreter running
+            the helper ('python3' by default).
+        slurm_names (Optional[dict]): The name under which the script of each job is saved in the remote slurm
+            directory. If None, the scripts are piped to sbatch without being saved.
+        max_jobs (Optional[int]): Maximum number of jobs submitted (e.g. the free slots of the queue of the user).
+
+    Returns:
+        tuple: The SLURM ID of each submitted job, and the error that stopped the submission (None if every job
+            was submitted, or the submission stopped at max_jobs). The jobs submitted before the connection or the
+            helper failed are returned with the error, so that they are recorded.
+    """
+    helper = deploy_remote_helper(machine_config)
+    parents = {job["name"]: [] for job in jobs}
+    for parent, children in dependencies.items():
+        for child in children:
+            parents[child].append(parent)
+    settings = machine_governor(machine_config).settings
+    payload = {
+        "jobs": [
+            {
+                "name": job["name"],
+                "content": contents[job["name"]],
+                "slurm_name": (slurm_names or {}).get(job["name"]),
+                "dependencies": parents[job["name"]],
+            }
+            for job in jobs
+        ],
+        "slurm_dir": os.path.join(machine_config["path"], "slurm"),
+        "kill_on_invalid_dep": machine_config.get("kill_on_invalid_dep", True),
+        "max_jobs": max_jobs,
+        # The helper cannot tell whether a job was accepted before other errors: only rejections are retried
+        "transient_error": REJECTED_ERROR.pattern,
+        "max_retries": settings["max_retries"],
+        "backoff": settings["backoff"],
+        "max_backoff": settings["max_backoff"],
+    }
+    result = _run_helper(machine_config, helper, "submit", payload)
+    job_ids, error, done = {}, None, False
+    for line in result.stdout.decode(errors="replace").splitlines():
+        try:
+            message = json.loads(line)
+        except (
+            ValueError
+        ):  # The last line was cut short by the failure of the connection
+            continue
+        if "job_id" in message:
+            job_ids[message["job"]] = message["job_id"]
+        elif "error" in message:
+            error = message["error"]
+        elif message.get("done"):
+            done = True
+    if error is None and (result.returncode != 0 or not done):
+        error = (
+            f"Error running the remote helper: {result.stderr.decode(errors='replace')}"
+        )
+    return job_ids, error
+
+
+@traced("remote_helper")
+def query_with_remote_helper(
+    job_ids: list, fields: list, machine_config: dict, allocations: bool = True
+) -> dict:
+    """
+    Queries the records of jobs on a remote machine with the remote helper (see query_sacct). The jobs that are
+    not in the accounting database yet are reported with their state in the queue.
+
+    Returns:
+        dict: A mapping from job ID (or step ID) to a dict of the requested fields.
+    """
+    helper = deploy_remote_helper(machine_config)
+    payload = {
+        "job_ids": [str(job_id) for job_id in job_ids],
+        "fields": fields,
+        "allocations": allocations,
+    }
+    result = _run_helper(machine_config, helper, "status", payload)
+    try:
+        message = json.loads(result.stdout.decode(errors="replace"))
+    except ValueError:
+        message = {"error": result.stderr.decode(errors="replace")}
+    if result.returncode != 0 or "records" not in message:
+        raise ValueError(f"Error querying the job states: {message.get('error')}")
+    return message["records"]
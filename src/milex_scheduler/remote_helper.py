@@ -0,0 +1,171 @@
+"""
+Helper of milex running on the login node of a remote machine, where it is deployed in the milex directory
+(see remote_bundle). It only uses the standard library of Python 3.6, so that it runs with the system interpreter,
+without milex installed on the machine.
+
+    python3 milex_remote_<hash>.py submit < payload
+    python3 milex_remote_<hash>.py status < payload
+
+The payload of 'submit' is a gzip-compressed JSON object:
+    {
+        "jobs": [  # In topological order
+            {
+                "name": "B",
+                "content": "#!/bin/bash ...",  # The rendered SLURM script
+                "slurm_name": "B_240101120000.sh",  # Optional: the script is saved in slurm_dir and submitted from there
+                "dependencies": ["A"],  # Names of the parent jobs
+                "options": [],  # Optional: other options of sbatch
+            },
+        ],
+        "slurm_dir": "/home/user/milex/slurm",
+        "kill_on_invalid_dep": true,
+        "max_jobs": 100,  # Maximum number of jobs submitted, null if unlimited
+        "transient_error": "Resource temporarily unavailable|...",  # Rejections retried with jittered exponential backoff
+        "max_retries": 6,
+        "backoff": 1.0,
+        "max_backoff": 60.0,
+    }
+
+Each job is submitted with 'sbatch --parsable', with a dependency on the SLURM IDs of its parents. A JSON line is
+written as each job is submitted ({"job": "A", "job_id": "1234"}). The submission stops at the first error, and the
+last line reports it ({"job": "B", "error": "sbatch: error: ..."}), or {"done": true} if every job was submitted.
+
+The payload of 'status' is a gzip-compressed JSON object:
+    {
+        "job_ids": ["1234", "1235"],
+        "fields": ["State", "ExitCode"],  # sacct fields
+        "allocations": true,  # Only report allocations, not job steps
+    }
+
+The records of the jobs are queried with sacct. The jobs that sacct does not report yet (the accounting database
+can lag behind slurmctld) are looked up with squeue, which only gives their state. A single JSON line is written,
+with the records by job ID ({"records": {"1234": {"JobID": "1234", "State": "RUNNING", ...}}}), or the error of
+sacct ({"error": "sacct: error: ..."}).
+"""
+
+import subprocess
+import random
+import gzip
+import json
+import time
+import sys
+import os
+import re
+
+
+def sbatch(job, options, payload):
+    """Submits a job, retrying transient errors. Returns the CompletedProcess of the last attempt."""
+    command = ["sbatch", "--parsable"] + options
+    content = job["content"]
+    if job.get("slurm_name"):
+        path = os.path.join(payload["slurm_dir"], job["slurm_name"])
+        with open(path, "w") as f:
+            f.write(content)
+        command.append(path)
+        content = None
+    transient = re.compile(payload.get("transient_error") or "$^", re.IGNORECASE)
+    retry = 0
+    while True:
+        result = subprocess.run(
+            command,
+            input=content,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        if result.returncode == 0 or not transient.search(result.stderr):
+            return result
+        if retry >= payload.get("max_retries", 0):
+            return result
+        delay = min(
+            payload.get("backoff", 1.0) * 2**retry, payload.get("max_backoff", 60.0)
+        )
+        time.sleep(random.uniform(0, delay))
+        retry += 1
+
+
+def submit(payload, output):
+    """Submits the jobs of the payload in order, writing a JSON line for each submitted job and a last status line."""
+
+    def write(message):
+        output.write(json.dumps(message) + "\n")
+        output.flush()
+
+    job_ids = {}
+    for job in payload["jobs"]:
+        if payload.get("max_jobs") is not None and len(job_ids) >= payload["max_jobs"]:
+            break
+        options = list(job.get("options", []))
+        parents = [job_ids[parent] for parent in job.get("dependencies", [])]
+        if parents:
+            options.append("--dependency=afterok:" + ":".join(parents))
+            if payload.get("kill_on_invalid_dep"):
+                options.append("--kill-on-invalid-dep=yes")
+        result = sbatch(job, options, payload)
+        # The output is 'jobid' or 'jobid;cluster'
+        job_id = result.stdout.strip().split(";")[0]
+        if result.returncode != 0 or not job_id.isdigit():
+            write({"job": job["name"], "error": result.stderr or result.stdout})
+            return
+        job_ids[job["name"]] = job_id
+        write({"job": job["name"], "job_id": job_id})
+    write({"done": True})
+
+
+def status(payload, output):
+    """Writes the sacct records of the jobs of the payload, completed with the state of queued jobs from squeue."""
+    fields = ["JobID"] + [f for f in payload["fields"] if f != "JobID"]
+    job_ids = [str(job_id) for job_id in payload["job_ids"]]
+    command = ["sacct", "--noheader", "--parsable2"]
+    if payload.get("allocations", True):
+        command.append("--allocations")
+    command += ["--jobs=" + ",".join(job_ids), "--format=" + ",".join(fields)]
+    result = subprocess.run(
+        command, stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True
+    )
+    if result.returncode != 0:
+        output.write(json.dumps({"error": result.stderr}) + "\n")
+        return
+    records = {}
+    for line in result.stdout.splitlines():
+        values = line.split("|")
+        if len(values) == len(fields):
+            records[values[0]] = dict(zip(fields, values))
+    missing = [
+        job_id
+        for job_id in job_ids
+        if not any(r == job_id or r.startswith(job_id + "_") for r in records)
+    ]
+    if missing and "State" in fields:
+        # Fails when none of the jobs is queued anymore
+        result = subprocess.run(
+            ["squeue", "--noheader", "--jobs=" + ",".join(missing), "--format=%i|%T"],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            universal_newlines=True,
+        )
+        for line in result.stdout.splitlines():
+            job_id, _, state = line.strip().partition("|")
+            if state:
+                records[job_id] = dict(
+                    {field: "" for field in fields}, JobID=job_id, State=state
+                )
+    output.write(json.dumps({"records": records}) + "\n")
+
+
+COMMANDS = {"submit": submit, "status": status}
+
+
+def main(argv):
+    if len(argv) != 1 or argv[0] not in COMMANDS:
+        print(
+            "Usage: python3 milex_remote.py {submit,status} < payload", file=sys.stderr
+        )
+        return 2
+    payload = json.loads(gzip.decompress(sys.stdin.buffer.read()).decode())
+    COMMANDS[argv[0]](payload, sys.stdout)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
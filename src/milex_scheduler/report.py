@@ -0,0 +1,219 @@
+"""
+Execution timeline of a completed bundle: queue wait, run time, critical path and parallelism achieved
+"""
+
+from .job_db import connect_job_db, query_jobs
+from .run_slurm import query_sacct
+from .save_load_jobs import load_bundle
+from .utils import load_config
+from contextlib import closing
+from datetime import datetime, timedelta
+from typing import Optional
+
+__all__ = ["bundle_timeline", "analyze_timeline", "timeline_trace"]
+
+
+def _parse_time(value: str) -> Optional[datetime]:
+    if value in ("", "None", "Unknown"):
+        return None
+    return datetime.fromisoformat(value)
+
+
+def bundle_timeline(
+    name: str,
+    machine_config: Optional[dict] = None,
+    date: Optional[datetime] = None,
+) -> tuple:
+    """
+    Collects the submit, start and end times of the latest attempt of every job of a bundle with a single sacct call.
+
+    Args:
+        name (str): The name of the job bundle.
+        machine_config (Optional[dict]): The machine the bundle was submitted to. Defaults to the local machine.
+        date (Optional[datetime]): The date of the bundle. The latest bundle is used by default.
+
+    Returns:
+        tuple: The dependency graph of the bundle (see job_dependency.dependency_graph), and the timeline: a dict mapping
+            each submitted job to its 'slurm_id', 'state', 'submit', 'start' and 'end' (datetime or None), and the
+            'tasks' of array jobs with the same entries.
+    """
+    if machine_config is None:
+        machine_config = load_config()["local"]
+    _, dependencies, date = load_bundle(name, date)
+    with closing(connect_job_db()) as job_db:
+        rows = query_jobs(job_db, bundle=name, bundle_date=date, latest_attempt=True)
+    records = query_sacct(
+        sorted({row["slurm_id"] for row in rows}),
+        ["State", "Submit", "Start", "End"],
+        machine_config,
+    )
+
+    timeline = {}
+    for row in rows:
+        slurm_id = row["slurm_id"]
+        tasks = [
+            {
+                "slurm_id": key,
+                "state": record["State"].split()[0],
+                "submit": _parse_time(record["Submit"]),
+                "start": _parse_time(record["Start"]),
+                "end": _parse_time(record["End"]),
+            }
+            for key, record in records.items()
+            if key == slurm_id or key.startswith(f"{slurm_id}_")
+        ]
+        if not tasks:
+            continue
+        starts = [t["start"] for t in tasks if t["start"]]
+        ends = [t["end"] for t in tasks if t["end"]]
+        submits = [t["submit"] for t in tasks if t["submit"]]
+        timeline[row["job_name"]] = {
+            "slurm_id": slurm_id,
+            "attempt": row["attempt"],
+            "state": tasks[0]["state"] if len(tasks) == 1 else row["state"],
+            "submit": min(submits) if submits else None,
+            "start": min(starts) if starts else None,
+            "end": max(ends) if ends and len(ends) == len(tasks) else None,
+            "tasks": tasks if len(tasks) > 1 else [],
+        }
+    return dependencies, timeline
+
+
+def analyze_timeline(dependencies: dict, timeline: dict) -> dict:
+    """
+    Splits the makespan of a bundle into queue wait and compute.
+
+    The queue wait of a job is measured from the moment it became eligible (its submission or the end of its
+    last parent, whichever is later) to its start. The critical path is found by following, from the last job
+    to finish, the parent that finished last. The parallelism achieved is the total compute time divided by the makespan.
+
+    Returns:
+        dict: Per-job 'jobs' entries (dependency wait, queue wait and run time in seconds), and the 'makespan',
+            'total_queue_wait', 'total_run_time', 'critical_path', 'critical_queue_wait', 'critical_run_time',
+            'parallelism' and 'max_concurrency' of the bundle.
+    """
+    parents = {name: [] for name in timeline}
+    for parent, children in dependencies.items():
+        for child in children:
+            if child in parents and parent in timeline:
+                parents[child].append(parent)
+
+    jobs = {}
+    intervals = []
+    for name, job in timeline.items():
+        if job["start"] is None or job["submit"] is None:
+            continue
+        parent_ends = [timeline[p]["end"] for p in parents[name] if timeline[p]["end"]]
+        eligible = max([job["submit"]] + parent_ends)
+        end = job["end"] or job["start"]
+        tasks = job["tasks"] or [job]
+        run_time = sum(
+            (t["end"] - t["start"]).total_seconds()
+            for t in tasks
+            if t["start"] and t["end"]
+        )
+        intervals.extend(
+            (t["start"], t["end"]) for t in tasks if t["start"] and t["end"]
+        )
+        jobs[name] = {
+            "dependency_wait": (eligible - job["submit"]).total_seconds(),
+            "queue_wait": max((job["start"] - eligible).total_seconds(), 0.0),
+            "run_time": (end - job["start"]).total_seconds(),
+            "compute_time": run_time,
+        }
+    if not jobs:
+        return {"jobs": {}}
+
+    first_submit = min(timeline[name]["submit"] for name in jobs)
+    last_end = max(timeline[name]["end"] or timeline[name]["start"] for name in jobs)
+    makespan = (last_end - first_submit).total_seconds()
+
+    # Walk back from the last job to finish through the parents that gated each start
+    current = max(
+        jobs, key=lambda name: timeline[name]["end"] or timeline[name]["start"]
+    )
+    path = [current]
+    while True:
+        gating = [p for p in parents[current] if p in jobs and timeline[p]["end"]]
+        if not gating:
+            break
+        current = max(gating, key=lambda p: timeline[p]["end"])
+        path.append(current)
+    path.reverse()
+
+    # Maximum number of tasks running at the same time
+    concurrency = max_concurrency = 0
+    for _, delta in sorted(
+        [(start, 1) for start, _ in intervals] + [(end, -1) for _, end in intervals]
+    ):
+        concurrency += delta
+        max_concurrency = max(max_concurrency, concurrency)
+
+    total_compute = sum(job["compute_time"] for job in jobs.values())
+    return {
+        "jobs": jobs,
+        "makespan": makespan,
+        "total_queue_wait": sum(job["queue_wait"] for job in jobs.values()),
+        "total_run_time": sum(job["run_time"] for job in jobs.values()),
+        "critical_path": path,
+        "critical_queue_wait": sum(jobs[name]["queue_wait"] for name in path),
+        "critical_run_time": sum(jobs[name]["run_time"] for name in path),
+        "parallelism": total_compute / makespan if makespan > 0 else 0.0,
+        "max_concurrency": max_concurrency,
+    }
+
+
+def timeline_trace(timeline: dict) -> list:
+    """
+    Gantt chart of a bundle as trace events (viewable in Perfetto or chrome://tracing): one row per job,
+    with the pending and running intervals of the job (or of each of its array tasks).
+    """
+    submits = [job["submit"] for job in timeline.values() if job["submit"]]
+    if not submits:
+        return []
+    origin = min(submits)
+
+    def microseconds(t: datetime) -> float:
+        return (t - origin) / timedelta(microseconds=1)
+
+    events = []
+    for row, (name, job) in enumerate(timeline.items()):
+        events.append(
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": 1,
+                "tid": row,
+                "args": {"name": name},
+            }
+        )
+        for task in job["tasks"] or [job]:
+            label = task["slurm_id"]
+            if task["submit"] and task["start"]:
+                events.append(
+                    {
+                        "name": f"{name} (pending)",
+                        "cat": "pending",
+                        "ph": "X",
+                        "pid": 1,
+                        "tid": row,
+                        "ts": microseconds(task["submit"]),
+                        "dur": microseconds(task["start"])
+                        - microseconds(task["submit"]),
+                        "args": {"slurm_id": label},
+                    }
+                )
+            if task["start"] and task["end"]:
+                events.append(
+                    {
+                        "name": name,
+                        "cat": "run",
+                        "ph": "X",
+                        "pid": 1,
+                        "tid": row,
+                        "ts": microseconds(task["start"]),
+                        "dur": microseconds(task["end"]) - microseconds(task["start"]),
+                        "args": {"slurm_id": label, "state": task["state"]},
+                    }
+                )
+    return events
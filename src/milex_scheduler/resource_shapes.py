@@ -0,0 +1,106 @@
+"""
+Selection among alternative resource shapes of a job by estimated completion time
+"""
+
+from .queue_probe import probe_start_times, PROBE_CACHE_TTL
+from .utils import parse_slurm_time, format_slurm_time
+from datetime import datetime, timedelta
+from typing import Optional
+import copy
+import re
+
+__all__ = ["expand_shapes", "optimize_shapes"]
+
+
+def resource_units(slurm: dict) -> int:
+    """Number of GPUs requested by the 'gres' option, or number of CPUs if no GPU is requested."""
+    gres = slurm.get("gres") or ""
+    match = re.search(r"gpu(?::[\w-]+)?:(\d+)", gres)
+    if match is not None:
+        return int(match.group(1))
+    return int(slurm.get("cpus_per_task") or 1) * int(slurm.get("tasks") or 1)
+
+
+def expand_shapes(job: dict) -> list:
+    """
+    Lists the complete SLURM options of every resource shape a job accepts. The first shape is always
+    the 'slurm' entry of the job; the alternatives in the 'shapes' entry override some of its options.
+    A shape without 'time' has its time limit scaled from the time of the job with the 'shape_scaling' hint:
+    time = job_time * (job_units / shape_units) ** shape_scaling, where units are the number of GPUs
+    (or CPUs). The default hint of 1 assumes perfect scaling.
+
+    Example:
+        job = {
+            "slurm": {"gres": "gpu:4", "time": "12:00:00"},
+            "shapes": [{"gres": "gpu:2"}, {"gres": "gpu:1", "time": "1-12:00:00"}],
+            "shape_scaling": 0.9,
+        }
+    """
+    base = dict(job.get("slurm", {}))
+    shapes = [base]
+    scaling = job.get("shape_scaling", 1.0)
+    for shape in job.get("shapes", []):
+        slurm = {**base, **shape}
+        if "time" not in shape and base.get("time") is not None:
+            ratio = resource_units(base) / resource_units(slurm)
+            slurm["time"] = format_slurm_time(
+                parse_slurm_time(base["time"]) * ratio**scaling
+            )
+        shapes.append(slurm)
+    return shapes
+
+
+def optimize_shapes(
+    jobs: list,
+    machine_config: dict,
+    ttl: float = PROBE_CACHE_TTL,
+    now: Optional[datetime] = None,
+) -> list:
+    """
+    Chooses, for every job that declares alternative 'shapes', the shape with the earliest estimated completion
+    (estimated start time plus time limit). The shapes of every job are probed together with a single
+    batched 'sbatch --test-only' call.
+
+    Args:
+        jobs (list): The jobs of a bundle.
+        machine_config (dict): The configuration of the machine the jobs will be submitted to.
+        ttl (float): Time in seconds during which a probe result is reused.
+
+    Returns:
+        list: The jobs, where the 'slurm' entry of jobs with alternative shapes is replaced by the chosen shape.
+    """
+    candidates = {job["name"]: expand_shapes(job) for job in jobs if job.get("shapes")}
+    if not candidates:
+        return jobs
+    shapes = [shape for job_shapes in candidates.values() for shape in job_shapes]
+    start_times = iter(probe_start_times(shapes, machine_config, ttl))
+    if now is None:
+        now = datetime.now()
+
+    optimized = []
+    for job in jobs:
+        if job["name"] not in candidates:
+            optimized.append(job)
+            continue
+        best, best_end = None, None
+        for shape in candidates[job["name"]]:
+            start = next(start_times)
+            if start is None:  # The shape cannot run on this machine
+                continue
+            end = max(start, now) + timedelta(
+                seconds=parse_slurm_time(shape.get("time") or "0")
+            )
+            if best_end is None or end < best_end:
+                best, best_end = shape, end
+        job = copy.deepcopy(job)
+        if best is None:
+            print(
+                f"No resource shape of job {job['name']} could be probed. Using its default resources."
+            )
+        else:
+            job["slurm"] = best
+            print(
+                f"Selected resource shape {best} for job {job['name']} (estimated completion {best_end})"
+            )
+        optimized.append(job)
+    return optimized
@@ -0,0 +1,320 @@
+"""
+Classification of failed jobs and resubmission with escalated resources
+"""
+
+from .job_db import connect_job_db, query_jobs, record_submission, set_failure
+from .job_db import sync_job_states, set_job_state, machine_label, script_hash
+from .job_to_slurm import create_slurm_script
+from .job_dependency import update_slurm_with_dependencies
+from .job_runner import submit_slurm_script
+from .run_slurm import run_slurm_command
+from .save_load_jobs import load_bundle
+from .utils import load_config, parse_slurm_memory, format_slurm_memory
+from .utils import parse_slurm_time, format_slurm_time
+from contextlib import closing
+from datetime import datetime
+from typing import Optional
+import copy
+import json
+import os
+
+__all__ = [
+    "classify_failure",
+    "escalate_resources",
+    "retry_failed_jobs",
+    "prune_orphaned_jobs",
+]
+
+
+DEFAULT_RETRY_POLICY = {
+    "max_attempts": 3,
+    "on": ["OUT_OF_MEMORY", "TIMEOUT", "NODE_FAIL", "PREEMPTED"],
+    "mem_factor": 2.0,
+    "time_factor": 2.0,
+}
+
+
+def classify_failure(state: str, exit_code: Optional[str] = None) -> Optional[str]:
+    """
+    Classifies the outcome of a job from its sacct state and exit code.
+
+    Returns:
+        Optional[str]: One of 'OUT_OF_MEMORY', 'TIMEOUT', 'NODE_FAIL', 'PREEMPTED', 'CANCELLED' or 'FAILED'.
+            None if the job completed or is not finished.
+    """
+    state = state.split()[0] if state else ""
+    if state == "OUT_OF_MEMORY":
+        return "OUT_OF_MEMORY"
+    if state in ("TIMEOUT", "DEADLINE"):
+        return "TIMEOUT"
+    if state in ("NODE_FAIL", "BOOT_FAIL"):
+        return "NODE_FAIL"
+    if state == "PREEMPTED":
+        return "PREEMPTED"
+    if state == "CANCELLED":
+        return "CANCELLED"
+    if state == "FAILED":
+        # Older SLURM versions report jobs killed by the OOM killer as FAILED with signal 9 or exit code 137
+        return_code, _, signal = (exit_code or "0:0").partition(":")
+        if return_code == "137" or signal == "9":
+            return "OUT_OF_MEMORY"
+        return "FAILED"
+    return None
+
+
+def retry_policy(job: dict, policy: Optional[dict] = None) -> Optional[dict]:
+    """
+    Resolves the retry policy of a job. The 'retry' entry of the job takes precedence over the bundle policy.
+    A job opts in with 'retry': true (default policy) or a dict overriding keys of the default policy,
+    and opts out with 'retry': false.
+    """
+    job_policy = job.get("retry", None)
+    if job_policy is False:
+        return None
+    if job_policy is None and policy is None:
+        return None
+    resolved = dict(DEFAULT_RETRY_POLICY)
+    if policy:
+        resolved.update(policy)
+    if isinstance(job_policy, dict):
+        resolved.update(job_policy)
+    return resolved
+
+
+def escalate_resources(
+    slurm: dict, failure: str, policy: dict, machine_config: dict
+) -> Optional[dict]:
+    """
+    Escalates the 'mem' or 'time' SLURM options of a job after a failure,
+    capped by the 'max_mem' and 'max_time' entries of the machine configuration.
+
+    Returns:
+        Optional[dict]: The escalated SLURM options, or None if the resource cannot be escalated: the job does not
+            request it (the default of the partition applies), or it is already at its cap.
+    """
+    slurm = dict(slurm)
+    if failure == "OUT_OF_MEMORY":
+        key, factor, cap = "mem", policy["mem_factor"], machine_config.get("max_mem")
+        parse, format_ = parse_slurm_memory, format_slurm_memory
+    elif failure == "TIMEOUT":
+        key, factor, cap = "time", policy["time_factor"], machine_config.get("max_time")
+        parse, format_ = parse_slurm_time, format_slurm_time
+    else:  # Node failures and preemptions are retried with the same resources
+        return slurm
+    if slurm.get(key) is None:
+        return None
+    value = parse(slurm[key]) * factor
+    if cap is not None:
+        cap = parse(cap)
+        if parse(slurm[key]) >= cap:
+            return None
+        value = min(value, cap)
+    slurm[key] = format_(value)
+    return slurm
+
+
+def descendants(dependencies: dict, names) -> set:
+    """All the jobs that depend, directly or transitively, on the jobs in names."""
+    found = set()
+    stack = list(names)
+    while stack:
+        for child in dependencies.get(stack.pop(), []):
+            if child not in found:
+                found.add(child)
+                stack.append(child)
+    return found
+
+
+def retry_failed_jobs(
+    name: str,
+    machine_config: Optional[dict] = None,
+    policy: Optional[dict] = None,
+    date: Optional[datetime] = None,
+) -> dict:
+    """
+    Resubmits the failed jobs of a bundle that opted in a retry policy, with escalated resources,
+    along with their dependents that were cancelled or are left pending because of the failure.
+
+    States are first synced from the SLURM accounting database. Every attempt is recorded in the job database,
+    and the failure of the previous attempt is classified.
+
+    Parameters:
+        - name (str): The name of the job bundle.
+        - machine_config (Optional[dict]): The configuration of the machine the bundle was submitted to.
+        - policy (Optional[dict]): Retry policy applied to every job of the bundle (see DEFAULT_RETRY_POLICY).
+            If None, only jobs with a 'retry' entry are retried.
+        - date (Optional[datetime]): The date of the bundle. The latest bundle is used by default.
+
+    Returns:
+        - dict: The new SLURM job ID of each resubmitted job.
+    """
+    if machine_config is None:
+        machine_config = load_config()["local"]
+    jobs, dependencies, date = load_bundle(name, date)
+    jobs = {job["name"]: job for job in jobs}
+    order = list(jobs)
+    parents = {job_name: [] for job_name in jobs}
+    for parent, children in dependencies.items():
+        for child in children:
+            parents[child].append(parent)
+
+    with closing(connect_job_db()) as job_db:
+        sync_job_states(job_db, machine_config, bundle=name)
+        latest = {
+            row["job_name"]: row
+            for row in query_jobs(
+                job_db, bundle=name, bundle_date=date, latest_attempt=True
+            )
+        }
+
+        # Jobs to retry and their new resources
+        retried = {}
+        for job_name, row in latest.items():
+            failure = classify_failure(row["state"], row["exit_code"])
+            if failure is None or job_name not in jobs:
+                continue
+            set_failure(job_db, row["id"], failure)
+            job_policy = retry_policy(jobs[job_name], policy)
+            if job_policy is None or failure not in job_policy["on"]:
+                continue
+            if row["attempt"] >= job_policy["max_attempts"]:
+                print(
+                    f"Job {job_name} failed with {failure} after {row['attempt']} attempts. Not retrying."
+                )
+                continue
+            # Escalate from the resources of the last attempt
+            resources = row["resources"]
+            slurm = (
+                json.loads(resources) if resources else jobs[job_name].get("slurm", {})
+            )
+            slurm = escalate_resources(slurm, failure, job_policy, machine_config)
+            if slurm is None:
+                print(
+                    f"Job {job_name} failed with {failure} but its resources cannot be escalated "
+                    "(not requested, or already at the machine maximum). Not retrying."
+                )
+                continue
+            retried[job_name] = slurm
+        if not retried:
+            return {}
+
+        # Dependents that were cancelled or will never start because of the failures are resubmitted
+        stranded = {
+            job_name
+            for job_name in descendants(dependencies, retried)
+            if job_name in latest
+            and latest[job_name]["state"] in ("CANCELLED", "PENDING", "SUBMITTED")
+        }
+        pending_ids = [
+            latest[job_name]["slurm_id"]
+            for job_name in stranded
+            if latest[job_name]["state"] != "CANCELLED"
+        ]
+        if pending_ids:
+            result = run_slurm_command(
+                f"scancel {' '.join(pending_ids)}", machine_config
+            )
+            # Resubmitting jobs that are still queued would run them twice
+            if result.returncode != 0:
+                raise ValueError(f"Error running scancel command: {result.stderr}")
+
+        new_ids = {}
+        slurm_dir = os.path.join(load_config()["local"]["path"], "slurm")
+        for job_name in order:
+            if job_name not in retried and job_name not in stranded:
+                continue
+            job = copy.deepcopy(jobs[job_name])
+            if job_name in retried:
+                job["slurm"] = retried[job_name]
+            job["attempt"] = latest[job_name]["attempt"] + 1
+            slurm_name = create_slurm_script(job, date, machine_config, bundle=name)
+            dependency_ids = _dependency_ids(job_name, parents, new_ids, latest)
+            if dependency_ids:
+                update_slurm_with_dependencies(
+                    slurm_name,
+                    dependency_ids,
+                    kill_on_invalid_dep=machine_config.get("kill_on_invalid_dep", True),
+                )
+            with open(os.path.join(slurm_dir, slurm_name), "r") as f:
+                content = f.read()
+            job_id = submit_slurm_script(slurm_name, machine_config)
+            new_ids[job_name] = job_id
+            record_submission(
+                job_db,
+                name,
+                date,
+                job,
+                machine_label(machine_config),
+                job_id,
+                script_hash=script_hash(content),
+                attempt=job["attempt"],
+            )
+            print(
+                f"Resubmitted job {job_name} (attempt {job['attempt']}) with ID {job_id}"
+            )
+    return new_ids
+
+
+def prune_orphaned_jobs(
+    name: str,
+    machine_config: Optional[dict] = None,
+    date: Optional[datetime] = None,
+) -> list:
+    """
+    Cancels, with a single scancel, the jobs of a bundle that will never start because a job they depend on,
+    directly or transitively, failed. SLURM leaves these jobs pending with the reason DependencyNeverSatisfied,
+    where they count against the MaxSubmitJobs limit of the user. They are resubmitted if their failed parent is
+    retried later.
+
+    Parameters:
+        - name (str): The name of the job bundle.
+        - machine_config (Optional[dict]): The configuration of the machine the bundle was submitted to.
+        - date (Optional[datetime]): The date of the bundle. The latest bundle is used by default.
+
+    Returns:
+        - list: The names of the cancelled jobs.
+    """
+    if machine_config is None:
+        machine_config = load_config()["local"]
+    _, dependencies, date = load_bundle(name, date)
+    with closing(connect_job_db()) as job_db:
+        sync_job_states(job_db, machine_config, bundle=name)
+        latest = {
+            row["job_name"]: row
+            for row in query_jobs(
+                job_db, bundle=name, bundle_date=date, latest_attempt=True
+            )
+        }
+        failed = [
+            job_name
+            for job_name, row in latest.items()
+            if classify_failure(row["state"], row["exit_code"]) is not None
+        ]
+        orphans = sorted(
+            job_name
+            for job_name in descendants(dependencies, failed)
+            if job_name in latest
+            and latest[job_name]["state"] in ("PENDING", "SUBMITTED")
+        )
+        if not orphans:
+            return []
+        result = run_slurm_command(
+            f"scancel {' '.join(latest[job_name]['slurm_id'] for job_name in orphans)}",
+            machine_config,
+        )
+        if result.returncode != 0:
+            raise ValueError(f"Error running scancel command: {result.stderr}")
+        for job_name in orphans:
+            set_job_state(job_db, latest[job_name]["id"], "CANCELLED")
+    return orphans
+
+
+def _dependency_ids(job_name, parents, new_ids, latest) -> list:
+    """SLURM IDs a resubmitted job must wait for: resubmitted parents and parents that have not completed yet."""
+    ids = []
+    for parent in parents[job_name]:
+        if parent in new_ids:
+            ids.append(new_ids[parent])
+        elif parent in latest and latest[parent]["state"] != "COMPLETED":
+            ids.append(latest[parent]["slurm_id"])
+    return ids
@@ -0,0 +1,254 @@
+"""
+Resource right-sizing recommendations from the SLURM accounting data of past jobs
+"""
+
+from .job_db import connect_job_db, machine_label, TERMINAL_STATES
+from .run_slurm import query_sacct
+from .utils import argument_signature, parse_slurm_memory, format_slurm_memory
+from .utils import parse_slurm_time, format_slurm_time
+from contextlib import closing
+from datetime import datetime
+from typing import Optional
+import sqlite3
+import copy
+import math
+
+__all__ = [
+    "collect_usage",
+    "recommend_resources",
+    "rightsize_job",
+    "wasted_core_hours",
+]
+
+
+USAGE_FIELDS = [
+    "State",
+    "AllocCPUS",
+    "ReqMem",
+    "MaxRSS",
+    "Timelimit",
+    "Elapsed",
+    "TotalCPU",
+    "End",
+]
+
+
+def parse_sacct_duration(value: str) -> Optional[float]:
+    """Converts a sacct duration ('[D-][HH:]MM:SS[.fff]') to seconds."""
+    if not value or value in ("UNLIMITED", "Partition_Limit", "INVALID"):
+        return None
+    days = 0
+    if "-" in value:
+        days, value = value.split("-", 1)
+    parts = value.split(":")
+    seconds = float(parts[-1])
+    minutes = int(parts[-2]) if len(parts) > 1 else 0
+    hours = int(parts[-3]) if len(parts) > 2 else 0
+    return ((int(days) * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def parse_sacct_memory(value: str, alloc_cpus: int = 1) -> Optional[float]:
+    """Converts a sacct memory field (e.g. '1234K', '4Gn', '2000Mc') to megabytes."""
+    if not value:
+        return None
+    per_cpu = value.endswith("c")
+    value = value.rstrip("nc")
+    megabytes = parse_slurm_memory(value)
+    return megabytes * alloc_cpus if per_cpu else megabytes
+
+
+def _usage_records(records: dict) -> dict:
+    """Combines allocation and step records of sacct into one usage record per job (or array task)."""
+    usage = {}
+    for sacct_id, record in records.items():
+        job_id, _, step = sacct_id.partition(".")
+        entry = usage.setdefault(job_id, {"MaxRSS": None})
+        if not step:
+            entry.update({k: v for k, v in record.items() if k != "MaxRSS"})
+        rss = parse_sacct_memory(record.get("MaxRSS", ""))
+        if rss is not None:
+            entry["MaxRSS"] = max(rss, entry["MaxRSS"] or 0)
+    return {job_id: entry for job_id, entry in usage.items() if "State" in entry}
+
+
+def collect_usage(connection: sqlite3.Connection, machine_config: dict) -> int:
+    """
+    Collects MaxRSS, Elapsed and TotalCPU of the finished jobs of a machine that were not collected yet,
+    with a single sacct call, and stores them in the usage table of the job database.
+
+    Returns:
+        int: The number of collected usage records (one per job or array task).
+    """
+    machine = machine_label(machine_config)
+    rows = connection.execute(
+        "SELECT slurm_id, script, signature FROM jobs WHERE machine = ? AND state IN ({}) "
+        "AND NOT EXISTS (SELECT 1 FROM usage WHERE usage.machine = jobs.machine "
+        "AND (usage.sacct_id = jobs.slurm_id OR usage.sacct_id LIKE jobs.slurm_id || '\\_%' ESCAPE '\\'))".format(
+            ",".join("?" * len(TERMINAL_STATES))
+        ),
+        [machine, *sorted(TERMINAL_STATES)],
+    ).fetchall()
+    if not rows:
+        return 0
+    jobs = {row["slurm_id"]: row for row in rows}
+    records = query_sacct(sorted(jobs), USAGE_FIELDS, machine_config, allocations=False)
+    inserts = []
+    for sacct_id, record in _usage_records(records).items():
+        job = jobs.get(sacct_id.split("_")[0])
+        if job is None:
+            continue
+        alloc_cpus = int(record["AllocCPUS"] or 1)
+        inserts.append(
+            (
+                sacct_id,
+                machine,
+                job["script"],
+                job["signature"],
+                record["State"].split()[0],
+                alloc_cpus,
+                parse_sacct_memory(record["ReqMem"], alloc_cpus),
+                record["MaxRSS"],
+                parse_sacct_duration(record["Timelimit"]),
+                parse_sacct_duration(record["Elapsed"]),
+                parse_sacct_duration(record["TotalCPU"]),
+                record["End"] or None,
+            )
+        )
+    connection.executemany(
+        "INSERT OR REPLACE INTO usage VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        inserts,
+    )
+    connection.commit()
+    return len(inserts)
+
+
+def quantile(values: list, q: float) -> float:
+    """Nearest-rank quantile of a list of values."""
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def recommend_resources(
+    connection: sqlite3.Connection,
+    script: str,
+    signature: Optional[str] = None,
+    q: float = 0.95,
+    margin: float = 0.2,
+    min_samples: int = 3,
+) -> dict:
+    """
+    Recommends 'mem' and 'time' for a script from the completed runs recorded in the usage table:
+    the q-quantile of MaxRSS and Elapsed, increased by a relative margin.
+
+    Args:
+        script (str): The script of the job.
+        signature (Optional[str]): The argument signature of the job (see utils.argument_signature).
+            Runs of every signature are used if None.
+        q (float): The quantile of the observed usage to use.
+        margin (float): Relative margin added to the quantile.
+        min_samples (int): Minimum number of completed runs required to make a recommendation.
+
+    Returns:
+        dict: The recommended SLURM options. Empty if there is not enough data.
+    """
+    query = "SELECT max_rss_mb, elapsed_s FROM usage WHERE script = ? AND state = 'COMPLETED'"
+    parameters = [script]
+    if signature is not None:
+        query += " AND signature = ?"
+        parameters.append(signature)
+    rows = connection.execute(query, parameters).fetchall()
+    if len(rows) < min_samples:
+        return {}
+    recommendation = {}
+    rss = [row["max_rss_mb"] for row in rows if row["max_rss_mb"] is not None]
+    if len(rss) >= min_samples:
+        recommendation["mem"] = format_slurm_memory(
+            max(quantile(rss, q) * (1 + margin), 1)
+        )
+    elapsed = [row["elapsed_s"] for row in rows if row["elapsed_s"] is not None]
+    if len(elapsed) >= min_samples:
+        # SLURM time limits have a granularity of one minute
+        recommendation["time"] = format_slurm_time(
+            max(quantile(elapsed, q) * (1 + margin), 60)
+        )
+    return recommendation
+
+
+def rightsize_job(job: dict, mode: str = "suggest", **kwargs) -> dict:
+    """
+    Compares the 'mem' and 'time' requested by a job with the recommendation from its past runs.
+
+    Args:
+        job (dict): The job configuration.
+        mode (str): 'suggest' prints the recommendation, 'apply' also lowers the requested resources
+            (requested resources are never increased).
+        **kwargs: Passed to recommend_resources.
+
+    Returns:
+        dict: The job, with tighter SLURM options if mode is 'apply'.
+    """
+    if mode not in ("suggest", "apply"):
+        raise ValueError(
+            f"Unknown right-sizing mode '{mode}'. Use 'suggest' or 'apply'."
+        )
+    with closing(connect_job_db()) as job_db:
+        recommendation = recommend_resources(
+            job_db,
+            job["script"],
+            argument_signature(job.get("script_args")),
+            **kwargs,
+        )
+    if not recommendation:
+        return job
+    job = copy.deepcopy(job)
+    slurm = job.setdefault("slurm", {})
+    for key, parse in [("mem", parse_slurm_memory), ("time", parse_slurm_time)]:
+        if key not in recommendation:
+            continue
+        requested = slurm.get(key)
+        if requested is not None and parse(recommendation[key]) >= parse(requested):
+            continue
+        print(
+            f"Job {job['name']}: past runs suggest --{key}={recommendation[key]} (requested {requested})."
+        )
+        if mode == "apply":
+            slurm[key] = recommendation[key]
+    return job
+
+
+def wasted_core_hours(
+    connection: sqlite3.Connection, since: Optional[datetime] = None
+) -> list:
+    """
+    Reports allocated, used and wasted core-hours per script. Wasted core-hours are the allocated
+    CPU time (AllocCPUS x Elapsed) that was not used by the job (TotalCPU).
+
+    Returns:
+        list: One dict per script, sorted by decreasing wasted core-hours.
+    """
+    query = (
+        "SELECT script, COUNT(*) AS jobs, "
+        "SUM(alloc_cpus * elapsed_s) / 3600.0 AS allocated, "
+        "SUM(total_cpu_s) / 3600.0 AS used, "
+        "AVG(max_rss_mb / req_mem_mb) AS memory_efficiency "
+        "FROM usage"
+    )
+    parameters = []
+    if since is not None:
+        query += " WHERE end_time >= ?"
+        parameters.append(since.strftime("%Y-%m-%dT%H:%M:%S"))
+    query += " GROUP BY script"
+    report = []
+    for row in connection.execute(query, parameters):
+        allocated, used = row["allocated"] or 0.0, row["used"] or 0.0
+        report.append(
+            {
+                "script": row["script"],
+                "jobs": row["jobs"],
+                "allocated_core_hours": allocated,
+                "used_core_hours": used,
+                "wasted_core_hours": max(allocated - used, 0.0),
+                "memory_efficiency": row["memory_efficiency"],
+            }
+        )
+    return sorted(report, key=lambda r: r["wasted_core_hours"], reverse=True)
@@ -1,10 +1,65 @@
 import os
 import re
+import json
+import time
+import shlex
 import subprocess
-from typing import Optional
-from .utils import load_config, ssh_host_from_config
+import uuid
+from typing import Callable, Optional
+from .utils import daemon_cache, load_config, ssh_host_from_config
+from .tracing import traced
+from .governor import machine_governor
 
-__all__ = ["get_job_id_from_sbatch_output", "run_slurm_remotely", "run_slurm_locally"]
+__all__ = [
+    "get_job_id_from_sbatch_output",
+    "run_slurm_remotely",
+    "run_slurm_locally",
+    "run_slurm_from_stdin",
+    "run_slurm_command",
+    "ssh_control_options",
+    "ssh_args",
+    "query_sacct",
+]
+
+
+SACCT_CACHE_TTL = (
+    30  # seconds during which the daemon reuses the sacct records of a job
+)
+SSH_CONTROL_PERSIST = (
+    60  # seconds the shared SSH connection stays open after the last command
+)
+
+
+def ssh_control_options() -> list:
+    """
+    SSH options sharing a master connection per host (ControlMaster), so that consecutive commands
+    do not each pay a new handshake.
+    """
+    control_dir = os.path.expanduser("~/.ssh")
+    os.makedirs(control_dir, mode=0o700, exist_ok=True)
+    return [
+        "-o",
+        "ControlMaster=auto",
+        "-o",
+        f"ControlPath={os.path.join(control_dir, 'milex-%C')}",
+        "-o",
+        f"ControlPersist={SSH_CONTROL_PERSIST}",
+    ]
+
+
+def ssh_args(
+    machine_config: dict, command: str, machine_name: Optional[str] = None
+) -> list:
+    """
+    Arguments of ssh running a command on a remote machine, through the shared master connection.
+    The destination is split, as it can include options (e.g. '-i key user@host').
+    """
+    return [
+        "ssh",
+        *ssh_control_options(),
+        *shlex.split(ssh_host_from_config(machine_config, machine_name)),
+        command,
+    ]
 
 
 def get_job_id_from_sbatch_output(output):
@@ -16,16 +71,75 @@ def get_job_id_from_sbatch_output(output):
         raise ValueError(f"Unable to capture job ID from sbatch output {output}")
 
 
+def submission_token(sbatch_options: list, script: Optional[str]) -> Optional[str]:
+    """
+    A unique comment identifying a submission in the queue, so that a submission interrupted by an error that may
+    happen after the job was accepted is only retried if its job is not there (see governor). None if the job sets
+    its own comment, which is kept, or if its script cannot be read: such submissions are not retried.
+    """
+    if script is None or "#SBATCH --comment" in script:
+        return None
+    if any(option.startswith("--comment") for option in sbatch_options):
+        return None
+    return f"milex-{uuid.uuid4().hex}"
+
+
+def queued_job_lookup(
+    token: Optional[str], machine_config: Optional[dict], parsable: bool = False
+) -> Optional[Callable]:
+    """
+    Looks for the job submitted with a token in the queue of the user, with a single squeue call.
+    The lookup returns a result with the output sbatch would have printed, or None if the job is not queued.
+    """
+    if token is None:
+        return None
+
+    def lookup() -> Optional[subprocess.CompletedProcess]:
+        result = run_slurm_command(
+            'squeue --noheader --user="$USER" --format="%i|%k"', machine_config
+        )
+        if result.returncode != 0:
+            # Retrying without knowing could submit the job twice
+            raise ValueError(
+                f"Error looking for the job of an interrupted submission: {result.stderr}"
+            )
+        for line in result.stdout.splitlines():
+            job_id, _, comment = line.strip().partition("|")
+            if comment == token:
+                job_id = job_id.split("_")[0]
+                output = (
+                    f"{job_id}\n" if parsable else f"Submitted batch job {job_id}\n"
+                )
+                return subprocess.CompletedProcess("sbatch", 0, output, "")
+        return None
+
+    return lookup
+
+
+def _read_script(path: str) -> Optional[str]:
+    try:
+        with open(path, "r") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+@traced("sbatch")
 def run_slurm_remotely(
-    slurm_name, machine: Optional[str] = None, machine_config: Optional[dict] = None
+    slurm_name,
+    machine: Optional[str] = None,
+    machine_config: Optional[dict] = None,
+    sbatch_options: Optional[list] = None,
 ):
     """
     Runs a SLURM script on a remote machine via SSH and captures the job ID.
+    Transient failures of slurmctld or SSH are retried (see governor).
 
     Args:
         slurm_name (str): The name of the SLURM script to run.
         machine (Optional[str]): The name of the machine to run the script on.
         machine_config (Optional[dict]): The configuration details for the remote machine.
+        sbatch_options (Optional[list]): Options passed to sbatch on the command line (e.g. dependencies).
 
     Returns:
         str: The job ID assigned by SLURM.
@@ -36,12 +150,21 @@ def run_slurm_remotely(
         if not machine_config:
             raise EnvironmentError(f"No configuration found for machine: {machine}")
 
-    hostname = ssh_host_from_config(machine_config, machine)
     script_path = os.path.join(machine_config["path"], "slurm", slurm_name)
-    ssh_command = ["ssh", hostname, f"sbatch {script_path}"]
+    # The local copy of the script (scripts of the content store have none)
+    local_path = os.path.join(load_config()["local"]["path"], "slurm", slurm_name)
+    sbatch_options = list(sbatch_options or [])
+    token = submission_token(sbatch_options, _read_script(local_path))
+    if token is not None:
+        sbatch_options.append(f"--comment={token}")
+    options = "".join(f"{shlex.quote(option)} " for option in sbatch_options)
+    ssh_command = ssh_args(machine_config, f"sbatch {options}{script_path}", machine)
 
     # Run the sbatch command on the remote machine
-    result = subprocess.run(ssh_command, capture_output=True, text=True)
+    result = machine_governor(machine_config).run(
+        lambda: subprocess.run(ssh_command, capture_output=True, text=True),
+        submitted=queued_job_lookup(token, machine_config),
+    )
 
     # Check for errors
     if result.returncode != 0:
@@ -51,10 +174,197 @@ def run_slurm_remotely(
     return get_job_id_from_sbatch_output(output)
 
 
+@traced("sbatch")
 def run_slurm_locally(slurm_name):
-    """Runs a SLURM script locally and captures the job ID."""
+    """Runs a SLURM script locally and captures the job ID. Transient failures of slurmctld are retried."""
     user_config = load_config()
     script_path = os.path.join(user_config["local"]["path"], "slurm", slurm_name)
+    token = submission_token([], _read_script(script_path))
+    command = ["sbatch", script_path]
+    if token is not None:
+        command.insert(1, f"--comment={token}")
 
-    result = subprocess.run(["sbatch", script_path], capture_output=True, text=True)
+    result = machine_governor(user_config["local"]).run(
+        lambda: subprocess.run(command, capture_output=True, text=True),
+        submitted=queued_job_lookup(token, user_config["local"]),
+    )
+    if result.returncode != 0:
+        raise ValueError(f"Error running sbatch command: {result.stderr}")
     return get_job_id_from_sbatch_output(result.stdout)
+
+
+@traced("sbatch")
+def run_slurm_from_stdin(
+    content: str, machine_config: dict, sbatch_options: Optional[list] = None
+) -> str:
+    """
+    Submits a SLURM script rendered in memory, piped to 'sbatch --parsable' on its standard input.
+    Remote submissions share a persistent SSH connection (ControlMaster), so each job costs a single round trip.
+    Transient failures of slurmctld or SSH are retried (see governor).
+
+    Args:
+        content (str): The content of the SLURM script.
+        machine_config (dict): The configuration of the machine.
+        sbatch_options (Optional[list]): Options passed to sbatch on the command line (e.g. dependencies).
+
+    Returns:
+        str: The job ID assigned by SLURM.
+    """
+    sbatch_options = list(sbatch_options or [])
+    token = submission_token(sbatch_options, content)
+    if token is not None:
+        sbatch_options.append(f"--comment={token}")
+    submitted = queued_job_lookup(token, machine_config, parsable=True)
+    command = " ".join(
+        ["sbatch", "--parsable", *(shlex.quote(o) for o in sbatch_options)]
+    )
+    if is_remote_machine(machine_config):
+        ssh_command = ssh_args(machine_config, command)
+        result = machine_governor(machine_config).run(
+            lambda: subprocess.run(
+                ssh_command, input=content, capture_output=True, text=True
+            ),
+            submitted=submitted,
+        )
+    else:
+        result = machine_governor(machine_config).run(
+            lambda: subprocess.run(
+                command, shell=True, input=content, capture_output=True, text=True
+            ),
+            submitted=submitted,
+        )
+    if result.returncode != 0:
+        raise ValueError(f"Error running sbatch command: {result.stderr}")
+    # The output is 'jobid' or 'jobid;cluster'
+    job_id = result.stdout.strip().split(";")[0]
+    if not job_id.isdigit():
+        raise ValueError(f"Unable to capture job ID from sbatch output {result.stdout}")
+    return job_id
+
+
+def is_remote_machine(machine_config: dict) -> bool:
+    """Whether the machine configuration points to a remote host reached over SSH."""
+    return "hostname" in machine_config or "hosturl" in machine_config
+
+
+@traced()
+def run_slurm_command(
+    command: str,
+    machine_config: Optional[dict] = None,
+    timeout: Optional[float] = None,
+    input: Optional[str] = None,
+):
+    """
+    Runs a SLURM client command (sacct, squeue, scancel, ...) on the machine described by machine_config.
+
+    Args:
+        command (str): The shell command to run.
+        machine_config (Optional[dict]): The configuration of the machine. The command runs locally if None
+            or if the configuration does not describe a remote host.
+        timeout (Optional[float]): Seconds after which the command is killed (subprocess.TimeoutExpired).
+        input (Optional[str]): Standard input of the command, for arguments too long for a command line.
+
+    Returns:
+        subprocess.CompletedProcess: The result of the command.
+    """
+    if machine_config is not None and is_remote_machine(machine_config):
+        return subprocess.run(
+            ssh_args(machine_config, command),
+            input=input,
+            capture_output=True,
+            text=True,
+            timeout=timeout,
+        )
+    return subprocess.run(
+        command,
+        shell=True,
+        input=input,
+        capture_output=True,
+        text=True,
+        timeout=timeout,
+    )
+
+
+def _run_sacct(
+    job_ids: list, fields: list, machine_config: Optional[dict], allocations: bool
+) -> dict:
+    command = (
+        f"sacct --noheader --parsable2 {'--allocations ' if allocations else ''}"
+        f"--jobs={','.join(str(job_id) for job_id in job_ids)} "
+        f"--format={','.join(fields)}"
+    )
+    result = run_slurm_command(command, machine_config)
+    if result.returncode != 0:
+        raise ValueError(f"Error running sacct command: {result.stderr}")
+    records = {}
+    for line in result.stdout.splitlines():
+        values = line.split("|")
+        if len(values) != len(fields):
+            continue
+        record = dict(zip(fields, values))
+        records[record["JobID"]] = record
+    return records
+
+
+@traced("sacct")
+def query_sacct(
+    job_ids: list,
+    fields: list,
+    machine_config: Optional[dict] = None,
+    allocations: bool = True,
+    remote_helper: bool = False,
+) -> dict:
+    """
+    Queries the SLURM accounting database for a list of jobs in a single sacct call.
+
+    Args:
+        job_ids (list): The SLURM job IDs to query.
+        fields (list): The sacct fields to retrieve (e.g. ["JobID", "State", "ExitCode"]).
+        machine_config (Optional[dict]): The configuration of the machine to query.
+        allocations (bool): Only report allocations. If False, job steps (e.g. '1234.batch') are also reported,
+            which is required for step-level fields such as MaxRSS.
+        remote_helper (bool): Query a remote machine with the remote helper (see remote_bundle), which also
+            reports the state of the queued jobs that are not in the accounting database yet.
+
+    Returns:
+        dict: A mapping from job ID (or step ID) to a dict of the requested fields.
+    """
+    if not job_ids:
+        return {}
+    fields = ["JobID"] + [f for f in fields if f != "JobID"]
+    # The daemon reuses the recent records of each job, and only queries the others
+    cache = daemon_cache("sacct")
+    cached = {}
+    if cache is not None:
+        key = (json.dumps(machine_config, sort_keys=True), tuple(fields), allocations)
+        entries = cache.setdefault(key, {})
+        now = time.time()
+        fresh = {
+            str(job_id)
+            for job_id in job_ids
+            if now - entries.get(str(job_id), (0, None))[0] <= SACCT_CACHE_TTL
+        }
+        for job_id in fresh:
+            cached.update(entries[job_id][1])
+        job_ids = [job_id for job_id in job_ids if str(job_id) not in fresh]
+        if not job_ids:
+            return cached
+    if remote_helper and machine_config and is_remote_machine(machine_config):
+        from .remote_bundle import query_with_remote_helper  # Imports this module
+
+        records = query_with_remote_helper(job_ids, fields, machine_config, allocations)
+    else:
+        records = _run_sacct(job_ids, fields, machine_config, allocations)
+    if cache is not None:
+        for job_id in map(str, job_ids):
+            # Records of the job, its array tasks ('1234_5') and its steps ('1234.batch')
+            entries[job_id] = (
+                now,
+                {
+                    sacct_id: record
+                    for sacct_id, record in records.items()
+                    if sacct_id == job_id
+                    or sacct_id.startswith((f"{job_id}_", f"{job_id}."))
+                },
+            )
+    return {**cached, **records}
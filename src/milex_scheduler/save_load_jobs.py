@@ -2,14 +2,26 @@
 Utility functions to save/load bundle of jobs to/from a JSON file in the jobs directory
 """
 
-from .utils import load_config, scp_host_and_keypath_from_config
+from .utils import (
+    cached_file,
+    load_config,
+    load_json,
+    scp_host_and_keypath_from_config,
+)
 from .definitions import DATE_FORMAT
 from .job_dependency import dependency_graph
+from .run_slurm import run_slurm_command, ssh_args
+from .tracing import span, traced
 from typing import Optional
 from graphlib import TopologicalSorter
 from datetime import datetime, timedelta
 import warnings
+import fnmatch
 import subprocess
+import tarfile
+import hashlib
+import shlex
+import io
 import json
 import os
 
@@ -18,10 +30,16 @@ __all__ = [
     "save_bundle",
     "load_bundle",
     "transfer_slurm_to_remote",
+    "transfer_slurm_bundle_to_remote",
     "nearest_bundle_filename",
+    "list_bundles",
 ]
 
 
+SCRIPT_STORE_DIR = "store"
+
+
+@traced()
 def save_bundle(
     bundle: dict,
     name: str,
@@ -85,6 +103,7 @@ def save_bundle(
     print(f"Saved bundle {name} to {file_path}")
 
 
+@traced()
 def save_job(
     job: dict,
     bundle_name: Optional[str] = None,
@@ -169,6 +188,7 @@ def save_job(
     return job, file_path
 
 
+@traced("scp")
 def transfer_slurm_to_remote(
     slurm_name,
     machine_name: Optional[str] = None,
@@ -198,7 +218,7 @@ def transfer_slurm_to_remote(
     hostname, key_path = scp_host_and_keypath_from_config(machine_config, machine_name)
     ssh_command = [
         "scp",
-        key_path,
+        *shlex.split(key_path),
         local_script_path,
         f"{hostname}:{remote_script_path}",
     ]
@@ -209,6 +229,98 @@ def transfer_slurm_to_remote(
         raise ValueError(f"Error running scp command: {result.stderr}")
 
 
+@traced("tar_ssh")
+def transfer_slurm_bundle_to_remote(
+    slurm_names: list, machine_config: dict, dedupe: bool = False
+) -> dict:
+    """
+    Transfers the scripts of a bundle to a remote machine as a single compressed tar stream over one SSH connection.
+    The scripts are unpacked in a temporary directory next to their remote directory, then moved into it,
+    so that a failed transfer never leaves a truncated script behind.
+
+    With dedupe, the scripts are stored in a remote content store ('slurm/store') under the hash of their content,
+    without their '--job-name' directive, which must then be given to sbatch. A single command lists the scripts
+    missing from the store, and only those are transferred.
+
+    Returns:
+        dict: The path of each script on the remote machine, relative to the remote slurm directory.
+    """
+    if machine_config.get("path", None) is None:
+        raise ValueError(
+            "Machine configuration must contain a path to the milex directory"
+        )
+    local_dir = os.path.join(load_config()["local"]["path"], "slurm")
+    remote_dir = os.path.join(machine_config["path"], "slurm")
+    contents = {}
+    for slurm_name in slurm_names:
+        with open(os.path.join(local_dir, slurm_name), "rb") as f:
+            contents[slurm_name] = f.read()
+    if not dedupe:
+        _transfer_tar(contents, remote_dir, machine_config)
+        return {slurm_name: slurm_name for slurm_name in slurm_names}
+
+    remote_names = {}
+    store = {}
+    for slurm_name, content in contents.items():
+        content = b"".join(
+            line
+            for line in content.splitlines(keepends=True)
+            if not line.startswith(b"#SBATCH --job-name=")
+        )
+        digest = hashlib.sha256(content).hexdigest()
+        store[f"{digest}.sh"] = content
+        remote_names[slurm_name] = os.path.join(SCRIPT_STORE_DIR, f"{digest}.sh")
+
+    store_dir = os.path.join(remote_dir, SCRIPT_STORE_DIR)
+    # The names are read from stdin: a large bundle would exceed the maximum length of a command line
+    check = (
+        f'while read -r f; do [ -e {shlex.quote(store_dir)}/"$f" ] || echo "$f"; done'
+    )
+    result = run_slurm_command(
+        check, machine_config, input="".join(f"{name}\n" for name in sorted(store))
+    )
+    if result.returncode != 0:
+        raise ValueError(f"Error checking the remote script store: {result.stderr}")
+    missing = set(result.stdout.split())
+    if missing:
+        _transfer_tar(
+            {name: store[name] for name in sorted(missing) if name in store},
+            store_dir,
+            machine_config,
+        )
+    return remote_names
+
+
+def _transfer_tar(contents: dict, remote_dir: str, machine_config: dict) -> None:
+    """Sends files (name -> content) to a remote directory in a single tar stream, and moves them in place once unpacked."""
+    if not contents:
+        return
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as tar:
+        for name, content in contents.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(content)
+            info.mode = 0o644
+            tar.addfile(info, io.BytesIO(content))
+
+    remote_dir = shlex.quote(remote_dir)
+    remote_command = (
+        f"set -e; mkdir -p {remote_dir}; "
+        f"tmp=$(mktemp -d {remote_dir}/.milex-transfer.XXXXXX); "
+        "trap 'rm -rf \"$tmp\"' EXIT; "
+        'tar -xzf - -C "$tmp"; '
+        f'mv -f "$tmp"/* {remote_dir}/'
+    )
+    ssh_command = ssh_args(machine_config, remote_command)
+    result = subprocess.run(ssh_command, input=buffer.getvalue(), capture_output=True)
+
+    # Check for errors
+    if result.returncode != 0:
+        raise ValueError(
+            f"Error transferring the SLURM scripts: {result.stderr.decode(errors='replace')}"
+        )
+
+
 def order_jobs(jobs, sorted_names):
     jobs_list = []
     for name in sorted_names:
@@ -217,6 +329,7 @@ def order_jobs(jobs, sorted_names):
     return jobs_list
 
 
+@traced()
 def load_bundle(
     name: str, desired_date: Optional[datetime] = None
 ) -> tuple[list, dict, datetime]:
@@ -241,9 +354,9 @@ def load_bundle(
     job_file, date = nearest_bundle_filename(name, desired_date)
     file_path = os.path.join(user_config["local"]["path"], "jobs", job_file)
 
-    with open(file_path, "r") as file:
+    with span("read_bundle"):
         try:
-            jobs = json.load(file)
+            jobs = cached_file(file_path, load_json)
         except json.JSONDecodeError:
             raise OSError(
                 f"Error decoding the job file {name}.json (located in jobs folder). Make sure it is a valid JSON file."
@@ -252,12 +365,14 @@ def load_bundle(
     dependencies = dependency_graph(jobs)
 
     # Depth-first search topological sorting of a graph (raises error if a cycle is detected)
-    sorted_job_names = tuple(TopologicalSorter(dependencies).static_order())[::-1]
+    with span("topological_sort"):
+        sorted_job_names = tuple(TopologicalSorter(dependencies).static_order())[::-1]
     jobs = order_jobs(jobs, sorted_job_names)
 
     return jobs, dependencies, date
 
 
+@traced()
 def nearest_bundle_filename(
     name: str, desired_date: Optional[datetime] = None
 ) -> tuple[str, datetime]:
@@ -268,7 +383,7 @@ def nearest_bundle_filename(
     jobs_dir = os.path.join(user_config["local"]["path"], "jobs")
     files = [
         f[:-5]
-        for f in os.listdir(jobs_dir)
+        for f in cached_file(jobs_dir, os.listdir)
         if f.startswith(name) and f.endswith(".json")
     ]
     if not files:
@@ -288,3 +403,29 @@ def nearest_bundle_filename(
     nearest_date = min(dates, key=lambda x: abs(x - desired_date))
     file_name = f"{name}_{nearest_date.strftime(DATE_FORMAT)}.json"
     return file_name, nearest_date
+
+
+def list_bundles(patterns: list) -> list:
+    """
+    Names of the bundles saved in the jobs directory that match glob patterns (e.g. 'sweep_*').
+    A pattern without wildcards is kept as a name, even if no bundle is saved under it.
+
+    Returns:
+        list: The names, in the order of the patterns, without duplicates.
+    """
+    jobs_dir = os.path.join(load_config()["local"]["path"], "jobs")
+    saved = sorted(
+        {
+            f[:-5].rsplit("_", 1)[0]
+            for f in cached_file(jobs_dir, os.listdir)
+            if f.endswith(".json")
+        }
+    )
+    names = []
+    for pattern in patterns:
+        if any(c in pattern for c in "*?["):
+            matches = fnmatch.filter(saved, pattern)
+        else:
+            matches = [pattern]
+        names += [name for name in matches if name not in names]
+    return names
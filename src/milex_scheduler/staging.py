@@ -0,0 +1,92 @@
+"""
+Staging of job inputs and outputs through node-local scratch ($SLURM_TMPDIR).
+
+A job can declare inputs copied (or extracted, for tar archives) to the scratch directory before its main command,
+and outputs copied back from the scratch directory when the job exits, including on failure. The scratch directory
+is exported as $MILEX_SCRATCH. Without $SLURM_TMPDIR, a temporary directory is created, and removed when the job
+exits. The time spent staging is printed in the output of the job.
+
+Example:
+    job = {
+        "stage_in": ["$MILEX/data/images.tar.gz", "$MILEX/data/labels.json"],  # Extracted/copied into the scratch root
+        "stage_out": {"checkpoints": "$MILEX/models/run1"},  # Scratch path -> destination directory
+    }
+A list of stage_out paths is copied to $MILEX/results/$SLURM_JOB_NAME (in a subdirectory named after the task ID
+for array tasks). A dict of stage_in entries maps each source to its path in the scratch directory.
+"""
+
+from .definitions import SHELL_TIMESTAMP
+
+__all__ = ["stage_in_commands", "stage_out_commands"]
+
+
+ARCHIVE_SUFFIXES = (".tar", ".tar.gz", ".tgz", ".tar.bz2", ".tar.xz")
+ELAPSED = f'awk "BEGIN {{printf \\"%.1f\\", {SHELL_TIMESTAMP} - $_milex_stage_start}}"'
+RESULTS_DIR = (
+    "$MILEX/results/$SLURM_JOB_NAME${SLURM_ARRAY_TASK_ID:+/$SLURM_ARRAY_TASK_ID}"
+)
+
+
+def _normalize(entries, default) -> list:
+    if isinstance(entries, dict):
+        return list(entries.items())
+    return [(entry, default) for entry in entries]
+
+
+def stage_in_commands(stage_in) -> str:
+    """
+    Bash commands creating the scratch directory and staging in the inputs (list or dict) of a job.
+    A scratch directory created with mktemp is removed on exit by '_milex_remove_scratch', run through a trap.
+    """
+    lines = [
+        "# Stage inputs in node-local scratch",
+        'if [ -n "$SLURM_TMPDIR" ]; then',
+        '    export MILEX_SCRATCH="$SLURM_TMPDIR"',
+        "else",
+        '    export MILEX_SCRATCH="$(mktemp -d)"',
+        "    _milex_scratch_tmp=1",
+        "fi",
+        '_milex_remove_scratch() { if [ -n "$_milex_scratch_tmp" ]; then rm -rf "$MILEX_SCRATCH"; fi; }',
+        "trap _milex_remove_scratch EXIT",
+        f"_milex_stage_start={SHELL_TIMESTAMP}",
+    ]
+    for source, destination in _normalize(stage_in, ""):
+        target = (
+            f'"$MILEX_SCRATCH/{destination}"' if destination else '"$MILEX_SCRATCH"'
+        )
+        if source.endswith(ARCHIVE_SUFFIXES):
+            command = f'mkdir -p {target} && tar -xf "{source}" -C {target}'
+        else:
+            command = f'mkdir -p "$(dirname {target})" && cp -r "{source}" {target}'
+        lines.append(
+            f'{command} || {{ echo "milex: stage_in of {source} failed" >&2; exit 1; }}'
+        )
+    lines.append(f'echo "milex: stage_in took $({ELAPSED}) s"')
+    return "\n".join(lines) + "\n"
+
+
+def stage_out_commands(stage_out) -> str:
+    """
+    Bash commands defining the stage out of the outputs (list or dict) of a job, run on exit through a trap,
+    before the scratch directory is removed (see stage_in_commands, which must come first).
+    The function '_milex_stage_out' runs only once, so it can also be called explicitly.
+    """
+    lines = [
+        "# Stage outputs out of node-local scratch on exit, even if the job fails",
+        "_milex_stage_out() {",
+        '    [ -n "$_milex_staged_out" ] && return',
+        "    _milex_staged_out=1",
+        f"    _milex_stage_start={SHELL_TIMESTAMP}",
+    ]
+    for source, destination in _normalize(stage_out, RESULTS_DIR):
+        lines.append(
+            f'    if [ -e "$MILEX_SCRATCH/{source}" ]; then mkdir -p "{destination}" && '
+            f'cp -r "$MILEX_SCRATCH/{source}" "{destination}/"; '
+            f'else echo "milex: output {source} not found in $MILEX_SCRATCH" >&2; fi'
+        )
+    lines += [
+        f'    echo "milex: stage_out took $({ELAPSED}) s"',
+        "}",
+        "trap '_milex_stage_out; _milex_remove_scratch' EXIT",
+    ]
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,152 @@
+"""
+Phase-level tracing of milex, exported in the Chrome trace-event format (viewable in Perfetto or chrome://tracing).
+Tracing is disabled by default, in which case spans cost a single attribute check. It is enabled with
+enable_tracing(), or by setting the environment variable MILEX_TRACE to the path of the trace file.
+"""
+
+from contextlib import contextmanager
+from functools import wraps
+from typing import Optional
+import threading
+import atexit
+import time
+import json
+import os
+
+__all__ = ["span", "traced", "enable_tracing", "disable_tracing", "write_trace"]
+
+
+TRACE_VARIABLE = "MILEX_TRACE"
+
+
+class Tracer:
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.events = []
+        self.origin = time.perf_counter()
+        self.pid = os.getpid()
+
+    def add(self, name: str, category: str, start: float, end: float, args: dict):
+        self.events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "ts": (start - self.origin) * 1e6,
+                "dur": (end - start) * 1e6,
+                "pid": self.pid,
+                "tid": threading.get_ident(),
+                "args": args,
+            }
+        )
+
+
+_tracer: Optional[Tracer] = None
+
+
+class _NullSpan:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+@contextmanager
+def _span(name: str, category: str, args: dict):
+    tracer = _tracer
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        tracer.add(name, category, start, time.perf_counter(), args)
+
+
+def span(name: str, category: str = "milex", **args):
+    """
+    Context manager timing a phase. Keyword arguments are attached to the event (e.g. the job name).
+
+    Example:
+        with span("sbatch", job=job["name"]):
+            ...
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _span(name, category, args)
+
+
+def traced(name: Optional[str] = None, category: str = "milex"):
+    """Decorator tracing every call of a function as a span named after the function."""
+
+    def decorator(function):
+        span_name = name or function.__name__
+
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _span(span_name, category, {}):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def enable_tracing(path: Optional[str] = None) -> None:
+    """
+    Starts recording spans. If a path is given, the trace is written there at exit of the program,
+    followed by a summary of the time spent in each phase.
+    """
+    global _tracer
+    _tracer = Tracer(path)
+    if path is not None:
+        atexit.unregister(_write_at_exit)  # Register once
+        atexit.register(_write_at_exit)
+
+
+def disable_tracing() -> list:
+    """Stops recording spans. Returns the recorded events."""
+    global _tracer
+    events = _tracer.events if _tracer is not None else []
+    _tracer = None
+    return events
+
+
+def trace_summary(events: list) -> str:
+    """Table of the number of calls, total and mean time of each phase, sorted by total time."""
+    totals = {}
+    for event in events:
+        count, total = totals.get(event["name"], (0, 0.0))
+        totals[event["name"]] = (count + 1, total + event["dur"] / 1e6)
+    width = max([len(name) for name in totals] + [5])
+    lines = [f"{'Phase':<{width}} {'Calls':>7} {'Total (s)':>10} {'Mean (ms)':>10}"]
+    for name, (count, total) in sorted(totals.items(), key=lambda x: -x[1][1]):
+        lines.append(
+            f"{name:<{width}} {count:>7} {total:>10.3f} {1e3 * total / count:>10.2f}"
+        )
+    return "\n".join(lines)
+
+
+def write_trace(path: str, events: Optional[list] = None) -> None:
+    """Writes the recorded events (or the given events) to a trace-event JSON file."""
+    if events is None:
+        events = _tracer.events if _tracer is not None else []
+    with open(path, "w") as f:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+
+def _write_at_exit() -> None:
+    if _tracer is None or _tracer.path is None:
+        return
+    write_trace(_tracer.path)
+    print(f"Trace written to {_tracer.path}")
+    print(trace_summary(_tracer.events))
+
+
+if os.environ.get(TRACE_VARIABLE):
+    # Removed from the environment so that subprocesses importing milex do not overwrite the trace
+    enable_tracing(os.environ.pop(TRACE_VARIABLE))
@@ -1,19 +1,137 @@
 from typing import Optional
 from argparse import Namespace
 from .definitions import CONFIG_FILE_PATH, DATE_FORMAT, MACHINE_KEYS
+from .tracing import traced
 from datetime import datetime
 import os
+import re
 import json
-
+import copy
+import hashlib
 
 __all__ = ["load_config", "machine_config"]
 
 
-def name_slurm_script(job: dict, date: datetime):
+MEMORY_UNITS = {"K": 1 / 1024, "M": 1, "G": 1024, "T": 1024**2}
+
+# Caches kept by the warm daemon between commands (see daemon). None in the command line applications, which run once
+_daemon_cache: Optional[dict] = None
+
+
+def enable_daemon_cache() -> None:
+    global _daemon_cache
+    _daemon_cache = {}
+
+
+def daemon_cache(name: str) -> Optional[dict]:
+    """The cache of the daemon with the given name, or None outside of the daemon."""
+    if _daemon_cache is None:
+        return None
+    return _daemon_cache.setdefault(name, {})
+
+
+def cached_file(path: str, load):
+    """
+    Result of load(path) (e.g. a parsed file or a directory listing). In the daemon, the result is reused
+    until the modification time or the size of path changes. Callers get their own copy of the result.
+    """
+    cache = daemon_cache("files")
+    if cache is None:
+        return load(path)
+    stat = os.stat(path)
+    signature = (stat.st_mtime_ns, stat.st_size)
+    entry = cache.get(path)
+    if entry is None or entry[0] != signature:
+        entry = cache[path] = (signature, load(path))
+    return copy.deepcopy(entry[1])
+
+
+def load_json(path: str):
+    with open(path, "r") as file:
+        return json.load(file)
+
+
+def name_slurm_script(job: dict, date: datetime, bundle: Optional[str] = None):
     name = job["name"]
+    attempt = job.get("attempt", 1)
+    if attempt > 1:
+        name = f"{name}.attempt{attempt}"
+    # Bundles saved in the same second may have jobs with the same name
+    if bundle is not None:
+        name = f"{name}.{bundle}"
     return f"{name}_{date.strftime(DATE_FORMAT)}.sh"
 
 
+def argument_signature(script_args: Optional[dict]) -> str:
+    """
+    Normalised signature of the arguments of a script, used to group the runs of a script with the same
+    configuration shape. Argument names and boolean flags are kept, other values are replaced by their type.
+    """
+    normalised = {}
+    for key, value in sorted((script_args or {}).items()):
+        if value is None or isinstance(value, bool):
+            normalised[key] = value
+        elif isinstance(value, list):
+            normalised[key] = f"list[{len(value)}]"
+        else:
+            normalised[key] = type(value).__name__
+    return hashlib.sha1(json.dumps(normalised).encode()).hexdigest()[:12]
+
+
+def parse_slurm_memory(memory: str) -> float:
+    """
+    Converts a SLURM memory specification (e.g. '16G', '500M', '4000') to megabytes.
+    SLURM uses megabytes when no unit is given.
+    """
+    match = re.fullmatch(r"\s*([\d.]+)\s*([KMGT]?)B?\s*", str(memory), re.IGNORECASE)
+    if match is None:
+        raise ValueError(f"Unable to parse memory specification '{memory}'")
+    value, unit = match.groups()
+    return float(value) * MEMORY_UNITS[unit.upper() or "M"]
+
+
+def format_slurm_memory(megabytes: float) -> str:
+    """Converts megabytes to a SLURM memory specification, rounding up."""
+    megabytes = int(-(-megabytes // 1))
+    if megabytes % 1024 == 0:
+        return f"{megabytes // 1024}G"
+    return f"{megabytes}M"
+
+
+def parse_slurm_time(time: str) -> int:
+    """
+    Converts a SLURM time specification to seconds.
+    Accepted formats are 'minutes', 'minutes:seconds', 'hours:minutes:seconds', 'days-hours',
+    'days-hours:minutes' and 'days-hours:minutes:seconds'.
+    """
+    time = str(time).strip()
+    days = 0
+    if "-" in time:
+        days, time = time.split("-", 1)
+        days = int(days)
+        parts = [int(p) for p in time.split(":")]
+        parts += [0] * (3 - len(parts))
+    else:
+        parts = [int(p) for p in time.split(":")]
+        if len(parts) == 1:
+            parts = [0, parts[0], 0]
+        elif len(parts) == 2:
+            parts = [0] + parts
+    if len(parts) != 3:
+        raise ValueError(f"Unable to parse time specification '{time}'")
+    hours, minutes, seconds = parts
+    return ((days * 24 + hours) * 60 + minutes) * 60 + seconds
+
+
+def format_slurm_time(seconds: float) -> str:
+    """Converts seconds to a SLURM time specification 'days-hours:minutes:seconds', rounding up."""
+    seconds = int(-(-seconds // 1))
+    days, seconds = divmod(seconds, 86400)
+    hours, seconds = divmod(seconds, 3600)
+    minutes, seconds = divmod(seconds, 60)
+    return f"{days}-{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
 def update_job_info_with_id(bundle_name, date, job_name, job_id):
     """Updates the job JSON file with the job ID"""
     path = os.path.join(
@@ -28,6 +146,7 @@ def update_job_info_with_id(bundle_name, date, job_name, job_id):
         json.dump(jobs, f, indent=4)
 
 
+@traced()
 def load_config() -> dict:
     """
     Loads the configuration file.
@@ -42,8 +161,7 @@ def load_config() -> dict:
         raise EnvironmentError(
             f"Configuration file not found at {CONFIG_FILE_PATH}. Please use `milex-configurations` to create the configurations for milex."
         )
-    with open(CONFIG_FILE_PATH, "r") as file:
-        return json.load(file)
+    return cached_file(CONFIG_FILE_PATH, load_json)
 
 
 def machine_config(args: Namespace) -> dict:
@@ -59,6 +59,7 @@ expected_bundle_content = {
     "JobB": [
         "#!/bin/bash\n",
         f"#SBATCH --dependency=afterok:{mock_job_ids['JobA']}\n",
+        "#SBATCH --kill-on-invalid-dep=yes\n",
         "#SBATCH --output=/path/to/remote/slurm/%x-%j.out\n",
         "#SBATCH --job-name=JobB\n",
         "#SBATCH --tasks=1\n",
@@ -74,6 +75,7 @@ expected_bundle_content = {
     "JobC": [
         "#!/bin/bash\n",
         f"#SBATCH --dependency=afterok:{mock_job_ids['JobA']}:{mock_job_ids['JobB']}\n",
+        "#SBATCH --kill-on-invalid-dep=yes\n",
         "#SBATCH --output=/path/to/remote/slurm/%x-%j.out\n",
         "#SBATCH --job-name=JobC\n",
         "#SBATCH --tasks=1\n",
@@ -138,6 +140,7 @@ def mock_load_config(monkeypatch, tmp_path):
     monkeypatch.setattr("milex_scheduler.job_runner.load_config", lambda: mock_config)
     monkeypatch.setattr("milex_scheduler.run_slurm.load_config", lambda: mock_config)
     monkeypatch.setattr("milex_scheduler.utils.load_config", lambda: mock_config)
+    monkeypatch.setattr("milex_scheduler.job_db.load_config", lambda: mock_config)
 
     with patch(
         "milex_scheduler.load_config", return_value=mock_config
@@ -151,8 +154,11 @@ def setup_mock_subprocess_run() -> MagicMock:
 
     # Define the behavior of subprocess.run to simulate sbatch job submission
     def mock_run(cmd, *args, **kwargs):
+        if "tar -xzf" in cmd[-1]:  # Transfer of the scripts to the remote machine
+            mock_run_instance.return_value.returncode = 0
+            return mock_run_instance.return_value
         job = os.path.split(cmd[-1])[-1]
-        job_name = job.split("_")[-2].split(".")[0]  # Extract job name
+        job_name = job.split(".")[0]  # Extract job name
         job_id = mock_job_ids[job_name]
         mock_run_instance.return_value.stdout = f"Submitted batch job {job_id}\n"
         mock_run_instance.return_value.returncode = 0
@@ -189,14 +195,23 @@ def test_integration_schedule_jobs(
     print(os.listdir(milex_path))
     print(os.listdir(slurm_dir))
 
+    # Remote scripts are transferred together before their submission, and receive their dependencies on the command line
+    if mock_machine_config is not mock_machine_config_local:
+        commands = [call.args[0][-1] for call in mock_ssh_client.call_args_list]
+        assert "tar -xzf" in commands[0]
+        assert (
+            f"--dependency=afterok:{mock_job_ids['JobA']}:{mock_job_ids['JobB']}"
+            in commands[-1]
+        )
+
     files_created = glob(os.path.join(slurm_dir, "*.sh"))
     assert len(files_created) == 3, "Expected 3 SLURM scripts to be created"
 
     for file in files_created:
         with open(file, "r") as f:
             script_content = f.readlines()
-        # extract job name from file name (see make_script_name in scheduler/utils.py, job_name is saved as the second to last element)
-        job_name = os.path.split(file)[-1].split("_")[-2].split(".")[0]
+        # extract job name from file name (see name_slurm_script in milex_scheduler/utils.py, the job name comes before the first dot)
+        job_name = os.path.split(file)[-1].split(".")[0]
         # Check if the content of the script matches the expected content
         expected_content_lines = expected_bundle_content[job_name]
         for i, (line, expected_line) in enumerate(
@@ -1,9 +1,11 @@
 import os
 import json
+import subprocess
 import pytest
 from unittest.mock import patch, MagicMock
 from milex_scheduler.apps.milex_configuration import (
     main,
+    provision_command,
 )
 
 # Mock configuration for testing
@@ -72,29 +74,22 @@ def mock_os_system(tmp_path):
 # Mock subprocess.run function and check that it is called correctly
 def setup_mock_subprocess_run(tmp_path):
     def mock_subprocess_run(cmd, *args, **kwargs):
-        # Check that command is in one of the expected one
-        assert cmd[0] == "ssh"
-        task = cmd[2].split(" ")[0]
-        if task == "mkdir":
-            assert cmd[1] in [
-                "-i ~/.ssh/id1_rsa user1@machine.domain.com",
-                "user1@machine.domain.com",
-                "machine",
-            ]
-            dirname = cmd[2].split(" ")[-1]
-            path = os.path.join(tmp_path, dirname)
-            os.makedirs(path, exist_ok=True)
-        elif task == "echo":
-            assert cmd[2].startswith('echo "export MILEX=')
-            if cmd[1] == "-i ~/.ssh/id1_rsa user1@machine.domain.com":
-                path = EXAMPLE_CONFIG["remote_machine_w_key"]["path"]
-            elif cmd[1] == "user1@machine.domain.com":
-                path = EXAMPLE_CONFIG["remote_machine_wo_key"]["path"]
-            elif cmd[1] == "machine":
-                path = EXAMPLE_CONFIG["remote_machine_w_hostname"]["path"]
-            bashrc_content = f"export MILEX={path}"
-            with open(os.path.join(tmp_path, ".bashrc"), "a") as f:
-                f.write(bashrc_content + "\n")
+        # A single command per machine creates the directories and exports MILEX
+        assert cmd[:3] == ["ssh", "-o", "ConnectTimeout=60"]
+        destination, command = cmd[3:-1], cmd[-1]
+        assert destination in [
+            ["-i", "~/.ssh/id1_rsa", "user1@machine.domain.com"],
+            ["user1@machine.domain.com"],
+            ["machine"],
+        ]
+        mkdir, export = command.split(" && ")
+        directories = mkdir.split(" ")[2:]
+        for dirname in directories:
+            os.makedirs(os.path.join(tmp_path, dirname), exist_ok=True)
+        assert "export MILEX=" in export
+        path = os.path.dirname(directories[0])
+        with open(os.path.join(tmp_path, ".bashrc"), "a") as f:
+            f.write(f"export MILEX={path}\n")
         return MagicMock(returncode=0, stderr="")
 
     return mock_subprocess_run
@@ -115,9 +110,11 @@ def test_milex_configuration(
     mock_os_makedirs,
     mock_os_system,
 ):
-    mock_gethostbyname.side_effect = lambda x: (
-        "127.0.0.1" if hostname_resolvable else mock_gaierror
-    )
+    def gethostbyname(host):
+        assert host in ["machine.domain.com", "machine"]  # Not the SSH destination
+        return "127.0.0.1" if hostname_resolvable else mock_gaierror
+
+    mock_gethostbyname.side_effect = gethostbyname
     mock_subprocess_run.side_effect = setup_mock_subprocess_run(tmp_path)
     mock_open_editor.side_effect = (
         lambda file_path: None
@@ -166,3 +163,11 @@ def test_milex_configuration(
         else:
             path = EXAMPLE_CONFIG["local"]["path"]
             assert f"export MILEX={path}" in bashrc_content
+
+
+def test_provision_command_is_idempotent(tmp_path):
+    command = provision_command(str(tmp_path / "milex"), ["jobs", "slurm"])
+    for _ in range(2):
+        subprocess.run(["bash", "-c", command], check=True, env={"HOME": str(tmp_path)})
+    assert (tmp_path / "milex" / "jobs").is_dir()
+    assert (tmp_path / ".bashrc").read_text() == f'export MILEX="{tmp_path}/milex"\n'
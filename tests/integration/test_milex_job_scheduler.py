@@ -23,7 +23,7 @@ def mock_submit_job():
     We avoid the full integration of submit_jobs, which is integrated in another test (see test_job_runner.py)
     Here, we test up until the point where submit_jobs is called.
     """
-    with patch("milex_scheduler.apps.milex_schedule.submit_jobs") as mock_submit_job:
+    with patch("milex_scheduler.job_runner.submit_jobs") as mock_submit_job:
         yield mock_submit_job
 
 
@@ -40,6 +40,14 @@ def mock_parse_known_args():
                 submit=False,
                 dependencies=None,
                 pre_commands=None,
+                retry=None,
+                rightsize=None,
+                trace=None,
+                instrument=False,
+                checkpointable=None,
+                stage_in=None,
+                stage_out=None,
+                env_snapshot=False,
                 array=None,
                 tasks=None,
                 cpus_per_task=None,
@@ -83,6 +91,7 @@ def mock_load_config(monkeypatch, tmp_path):
     monkeypatch.setattr("milex_scheduler.job_runner.load_config", lambda: mock_config)
     monkeypatch.setattr("milex_scheduler.run_slurm.load_config", lambda: mock_config)
     monkeypatch.setattr("milex_scheduler.utils.load_config", lambda: mock_config)
+    monkeypatch.setattr("milex_scheduler.job_db.load_config", lambda: mock_config)
 
     with patch(
         "milex_scheduler.load_config", return_value=mock_config
@@ -150,6 +159,14 @@ def test_schedule_main(
             submit=True,
             dependencies=[],
             pre_commands=[],
+            retry=None,
+            rightsize=None,
+            trace=None,
+            instrument=False,
+            checkpointable=None,
+            stage_in=None,
+            stage_out=None,
+            env_snapshot=False,
             array=None,
             tasks=None,
             cpus_per_task=None,
@@ -0,0 +1,52 @@
+from milex_scheduler.fake_cluster import FakeCluster, install_shims
+import pytest
+
+# Modules that read the milex configuration
+CONFIG_MODULES = [
+    "backlog",
+    "instrumentation",
+    "job_db",
+    "job_dependency",
+    "job_runner",
+    "job_to_slurm",
+    "local_executor",
+    "queue_probe",
+    "report",
+    "retry",
+    "run_slurm",
+    "save_load_jobs",
+    "utils",
+]
+
+
+@pytest.fixture
+def fake_cluster(monkeypatch, tmp_path):
+    """
+    Puts the shims of the simulated cluster (sbatch, squeue, sacct, ssh, ...) in front of the PATH.
+    Called with the settings of the cluster, returns the FakeCluster.
+    """
+
+    def setup(**settings) -> FakeCluster:
+        env = install_shims(
+            str(tmp_path / "bin"),
+            str(tmp_path / "state"),
+            **{"time_scale": 1e-9, **settings},
+        )
+        for key, value in env.items():
+            monkeypatch.setenv(key, value)
+        monkeypatch.setenv("USER", "tester")
+        return FakeCluster(env["MILEX_FAKE_CLUSTER"])
+
+    return setup
+
+
+@pytest.fixture
+def milex_config(monkeypatch):
+    """Called with a milex configuration, makes every module read it instead of the configuration file."""
+
+    def setup(config: dict) -> dict:
+        for module in CONFIG_MODULES:
+            monkeypatch.setattr(f"milex_scheduler.{module}.load_config", lambda: config)
+        return config
+
+    return setup
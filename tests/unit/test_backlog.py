@@ -0,0 +1,82 @@
+from milex_scheduler.backlog import is_submit_limit_error, submit_backlog
+from milex_scheduler.job_db import connect_job_db, query_jobs
+from milex_scheduler.job_runner import submit_jobs
+from milex_scheduler.run_slurm import query_sacct
+from milex_scheduler import save_bundle
+from contextlib import closing
+import os
+import pytest
+
+
+@pytest.fixture
+def fake_cluster(fake_cluster, milex_config, tmp_path):
+    cluster = fake_cluster(max_submit=2)
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    for path in [local / "jobs", local / "slurm", remote / "slurm"]:
+        os.makedirs(path)
+    config = {
+        "local": {"path": str(local)},
+        "fake": {
+            "path": str(remote),
+            "hostname": "fake",
+            "slurm_account": "def-fake",
+            "env_command": "true",
+        },
+    }
+    milex_config(config)
+    save_bundle(
+        {
+            "A": {
+                "script": "a",
+                "slurm": {},
+                "pre_commands": ["#MILEX_SIM runtime=60"],
+            },
+            "B": {
+                "script": "b",
+                "slurm": {},
+                "pre_commands": ["#MILEX_SIM runtime=3000"],
+                "dependencies": ["A"],
+            },
+            "C": {"script": "c", "slurm": {}, "dependencies": ["B"]},
+        },
+        "bundle",
+    )
+    yield config, cluster
+    cluster.close()
+
+
+def test_is_submit_limit_error():
+    assert is_submit_limit_error(
+        "sbatch: error: QOSMaxSubmitJobPerUserLimit\nsbatch: error: Batch job submission failed"
+    )
+    assert not is_submit_limit_error("sbatch: error: Invalid account")
+
+
+@pytest.mark.parametrize("max_submit", [None, 2])
+def test_backlog_submitted_as_slots_free_up(fake_cluster, max_submit):
+    config, cluster = fake_cluster
+    machine_config = dict(config["fake"])
+    if max_submit is not None:  # The limit is known: sbatch is not called beyond it
+        machine_config["max_submit"] = max_submit
+    job_ids = submit_jobs("bundle", machine_config)
+    assert sorted(job_ids) == ["A", "B"]
+
+    # The queue is still full
+    assert submit_backlog() == 1
+
+    # A completes, B is still running: C is submitted with a dependency on B
+    cluster.fast_forward(600)
+    assert submit_backlog() == 0
+    with closing(connect_job_db()) as job_db:
+        rows = {
+            row["job_name"]: row["slurm_id"]
+            for row in query_jobs(job_db, bundle="bundle")
+        }
+    slurm_dir = os.path.join(config["local"]["path"], "slurm")
+    script = [name for name in os.listdir(slurm_dir) if name.startswith("C.")][0]
+    with open(os.path.join(slurm_dir, script)) as f:
+        assert f"#SBATCH --dependency=afterok:{rows['B']}\n" in f.read()
+
+    cluster.fast_forward(7200)
+    records = query_sacct(list(rows.values()), ["State"], machine_config)
+    assert {records[i]["State"] for i in rows.values()} == {"COMPLETED"}
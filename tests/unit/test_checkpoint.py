@@ -0,0 +1,116 @@
+from milex_scheduler.job_to_slurm import write_slurm_content
+from milex_scheduler.checkpoint import checkpoint_policy
+import subprocess
+import json
+import signal
+import time
+import pytest
+import sys
+
+# Saves a checkpoint and exits when it receives SIGUSR1
+TRAINING = (
+    f'{sys.executable} -c "import signal, sys, time, pathlib; '
+    "signal.signal(signal.SIGUSR1, lambda *_: (pathlib.Path('checkpoint').write_text('1'), sys.exit(0))); "
+    "pathlib.Path('started').write_text('1'); time.sleep(30)\""
+)
+
+
+# Like GNU time (-f %M [-o output]), runs the command in the foreground, and is killed by SIGUSR1 without
+# forwarding it
+TIMER = """#!/bin/bash
+output=/dev/stderr
+if [ "$3" = -o ]; then output=$4; shift 2; fi
+shift 2
+"$@"
+status=$?
+echo 1024 > "$output"
+exit $status
+"""
+
+
+def run_job(tmp_path, script=TRAINING, restart_count=0, instrument=False, timer=False):
+    (tmp_path / "slurm").mkdir(exist_ok=True)
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir(exist_ok=True)
+    scontrol = bin_dir / "scontrol"
+    scontrol.write_text(f'#!/bin/sh\necho "$@" >> {tmp_path / "scontrol.log"}\n')
+    scontrol.chmod(0o755)
+    job = {
+        "name": "train",
+        "script": script,
+        "slurm": {"time": "24:00:00"},
+        "checkpointable": {"grace": 600, "max_continuations": 2},
+        "instrument": instrument,
+    }
+    with open(tmp_path / "job.sh", "w") as f:
+        write_slurm_content(f, job, {"path": str(tmp_path)})
+    if timer:
+        (bin_dir / "time").write_text(TIMER)
+        (bin_dir / "time").chmod(0o755)
+        content = (tmp_path / "job.sh").read_text()
+        (tmp_path / "job.sh").write_text(
+            content.replace("/usr/bin/time", str(bin_dir / "time"))
+        )
+    process = subprocess.Popen(
+        ["bash", str(tmp_path / "job.sh")],
+        cwd=tmp_path,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        env={
+            "PATH": f"{bin_dir}:/usr/bin:/bin",
+            "SLURM_JOB_NAME": "train",
+            "SLURM_JOB_ID": "7",
+            "SLURM_RESTART_COUNT": str(restart_count),
+        },
+    )
+    if script == TRAINING:
+        deadline = time.time() + 20
+        while not (tmp_path / "started").exists() and time.time() < deadline:
+            time.sleep(0.05)
+        process.send_signal(signal.SIGUSR1)
+    stdout, stderr = process.communicate(timeout=20)
+    return process.returncode, stdout, stderr
+
+
+def test_checkpoint_policy():
+    assert checkpoint_policy({}) is None
+    assert checkpoint_policy({"checkpointable": True})["max_continuations"] == 10
+    assert checkpoint_policy({"checkpointable": {"grace": 60}})["grace"] == 60
+
+
+def test_checkpoint_directives(tmp_path):
+    job = {"name": "train", "script": "train.py", "slurm": {}, "checkpointable": True}
+    with open(tmp_path / "job.sh", "w") as f:
+        write_slurm_content(f, job, {"path": str(tmp_path)})
+    content = (tmp_path / "job.sh").read_text()
+    assert "#SBATCH --signal=B:USR1@300\n" in content
+    assert "#SBATCH --requeue\n" in content
+
+
+@pytest.mark.parametrize(
+    "instrument, timer", [(False, False), (True, False), (True, True)]
+)
+def test_requeue_on_signal(tmp_path, instrument, timer):
+    returncode, stdout, _ = run_job(tmp_path, instrument=instrument, timer=timer)
+    assert returncode == 0
+    assert (tmp_path / "checkpoint").exists()
+    assert "requeueing for continuation 1 of 2" in stdout
+    assert (tmp_path / "scontrol.log").read_text() == "requeue 7\n"
+    if instrument:
+        sidecar = json.loads((tmp_path / "slurm" / "train-7.milex.json").read_text())
+        assert sidecar["max_rss_kb"] == (1024 if timer else None)
+
+
+def test_maximum_number_of_continuations(tmp_path):
+    returncode, _, stderr = run_job(tmp_path, restart_count=2)
+    assert returncode == 1  # Its dependents must not start
+    assert "maximum number of continuations (2) reached" in stderr
+    assert not (tmp_path / "scontrol.log").exists()
+
+
+def test_no_requeue_without_signal(tmp_path):
+    returncode, stdout, _ = run_job(tmp_path, script="sh -c 'exit 4'")
+    assert returncode == 4
+    assert "requeueing" not in stdout
+    assert not (tmp_path / "scontrol.log").exists()
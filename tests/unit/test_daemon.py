@@ -0,0 +1,113 @@
+from milex_scheduler.daemon import delegate_to_daemon, serve
+from milex_scheduler.run_slurm import query_sacct
+from milex_scheduler.utils import cached_file, load_json
+from unittest.mock import MagicMock
+import multiprocessing
+import socket
+import time
+import sys
+import os
+import pytest
+
+
+@pytest.fixture
+def daemon(monkeypatch, tmp_path):
+    path = str(tmp_path / "daemon.sock")
+    monkeypatch.setenv("MILEX_DAEMON_SOCKET", path)
+    monkeypatch.delenv("MILEX_NO_DAEMON", raising=False)
+
+    def main():
+        print(f"{' '.join(sys.argv)} in {os.getcwd()} for {os.environ['MILEX_CLIENT']}")
+        if "--fail" in sys.argv:
+            sys.exit(3)
+
+    monkeypatch.setattr("milex_scheduler.apps.milex_status.main", main)
+    # A separate process, like in practice: the daemon redirects the output of its own process
+    process = multiprocessing.get_context("fork").Process(target=serve, daemon=True)
+    process.start()
+    deadline = time.time() + 10
+    while not os.path.exists(path) and time.time() < deadline:
+        time.sleep(0.01)
+    yield path
+    process.terminate()
+    process.join()
+
+
+def test_command_runs_in_daemon(daemon, monkeypatch, capsys, tmp_path):
+    monkeypatch.setenv("MILEX_CLIENT", "client")
+    monkeypatch.setattr(sys, "argv", ["milex-status", "bundle"])
+    monkeypatch.chdir(tmp_path)
+    assert delegate_to_daemon("milex-status")
+    assert capsys.readouterr().out == f"milex-status bundle in {tmp_path} for client\n"
+    # The next command runs with its own arguments and environment
+    monkeypatch.setenv("MILEX_CLIENT", "other")
+    monkeypatch.setattr(sys, "argv", ["milex-status", "other_bundle"])
+    assert delegate_to_daemon("milex-status")
+    assert (
+        capsys.readouterr().out
+        == f"milex-status other_bundle in {tmp_path} for other\n"
+    )
+
+
+def test_exit_code_of_the_daemon_command(daemon, monkeypatch):
+    monkeypatch.setenv("MILEX_CLIENT", "client")
+    monkeypatch.setattr(sys, "argv", ["milex-status", "bundle", "--fail"])
+    with pytest.raises(SystemExit) as e:
+        delegate_to_daemon("milex-status")
+    assert e.value.code == 3
+
+
+def test_fallback_to_in_process(monkeypatch, tmp_path):
+    path = tmp_path / "daemon.sock"
+    monkeypatch.setenv("MILEX_DAEMON_SOCKET", str(path))
+    assert not delegate_to_daemon("milex-status")  # No daemon
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(str(path))
+    stale.close()
+    # The daemon exited without removing its socket
+    assert not delegate_to_daemon("milex-status")
+
+
+@pytest.fixture
+def daemon_cache(monkeypatch):
+    monkeypatch.setattr("milex_scheduler.utils._daemon_cache", {})
+
+
+def test_files_cached_until_modified(daemon_cache, tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text('{"a": 1}')
+    loads = []
+
+    def load(path):
+        loads.append(path)
+        return load_json(path)
+
+    assert cached_file(str(path), load) == {"a": 1}
+    cached_file(str(path), load)["a"] = 2  # Callers get their own copy
+    assert cached_file(str(path), load) == {"a": 1}
+    assert len(loads) == 1
+    path.write_text('{"a": 10}')
+    assert cached_file(str(path), load) == {"a": 10}
+    assert len(loads) == 2
+
+
+def test_recent_sacct_records_cached(daemon_cache, monkeypatch):
+    def sacct(command, *args, **kwargs):
+        job_ids = command.split("--jobs=")[1].split()[0].split(",")
+        return MagicMock(
+            returncode=0,
+            stdout="".join(f"{i}|RUNNING\n{i}.batch|RUNNING\n" for i in job_ids),
+        )
+
+    mock_run = MagicMock(side_effect=sacct)
+    monkeypatch.setattr("subprocess.run", mock_run)
+    monkeypatch.setattr("milex_scheduler.run_slurm.load_config", lambda: {})
+    assert set(query_sacct(["1"], ["State"])) == {"1", "1.batch"}
+    # Only the jobs that were not queried recently are queried
+    assert set(query_sacct(["1", "2"], ["State"])) == {"1", "1.batch", "2", "2.batch"}
+    assert "--jobs=2 " in mock_run.call_args[0][0]
+    query_sacct(["1", "2"], ["State"])
+    assert mock_run.call_count == 2
+    monkeypatch.setattr("milex_scheduler.run_slurm.SACCT_CACHE_TTL", -1)
+    query_sacct(["1", "2"], ["State"])
+    assert mock_run.call_count == 3
@@ -0,0 +1,44 @@
+from milex_scheduler.env_snapshot import env_snapshot_commands, env_snapshot_hash
+from milex_scheduler.job_to_slurm import write_slurm_content
+from io import StringIO
+import subprocess
+
+
+def test_env_snapshot_reused(tmp_path):
+    counter = tmp_path / "activations"
+    env_command = (
+        f'echo x >> {counter}; export FOO="a b"; unset GONE; PATH="/env:$PATH"'
+    )
+    script = tmp_path / "job.sh"
+    script.write_text(
+        f"export MILEX={tmp_path}\nexport GONE=1 SAME=1\n"
+        + env_snapshot_commands(env_command)
+        + 'echo "$FOO|${GONE-unset}|${PATH%%:*}"\n'
+    )
+    for _ in range(3):
+        result = subprocess.run(["bash", str(script)], capture_output=True, text=True)
+        assert result.stdout == "a b|unset|/env\n"
+    # The env_command only ran once
+    assert counter.read_text() == "x\n"
+    snapshot = tmp_path / "env" / f"{env_snapshot_hash(env_command)}.sh"
+    assert "unset GONE" in snapshot.read_text()
+    # Only the variables changed by the env_command are saved
+    assert "SAME" not in snapshot.read_text()
+
+
+def test_failed_activation_not_cached(tmp_path):
+    script = tmp_path / "job.sh"
+    script.write_text(f"export MILEX={tmp_path}\n" + env_snapshot_commands("false"))
+    subprocess.run(["bash", str(script)])
+    assert not (tmp_path / "env").exists() or not any((tmp_path / "env").iterdir())
+
+
+def test_write_slurm_content_with_snapshot(tmp_path):
+    job = {"name": "job", "script": "echo", "slurm": {}}
+    machine = {"path": str(tmp_path), "env_command": "source activate"}
+    file = StringIO()
+    write_slurm_content(file, job, machine)
+    assert "_milex_snapshot" not in file.getvalue()
+    file = StringIO()
+    write_slurm_content(file, job, {**machine, "env_snapshot": True})
+    assert env_snapshot_hash("source activate") in file.getvalue()
@@ -0,0 +1,231 @@
+from milex_scheduler.fake_cluster import FakeCluster, SlurmError
+from milex_scheduler.fake_cluster.shims import split_ssh_args
+from milex_scheduler.fake_cluster import shims
+from milex_scheduler.run_slurm import query_sacct
+from milex_scheduler.job_db import connect_job_db, query_jobs, sync_job_states
+from milex_scheduler import save_bundle, submit_jobs, submit_bundles
+from contextlib import closing
+import subprocess
+import json
+import sys
+import os
+import pytest
+
+
+def write_script(tmp_path, name, directives="", sim=""):
+    path = tmp_path / f"{name}.sh"
+    path.write_text(
+        f"#!/bin/bash\n#SBATCH --job-name={name}\n{directives}{sim}\necho {name}\n"
+    )
+    return str(path)
+
+
+@pytest.fixture
+def cluster(tmp_path):
+    # A frozen clock: virtual time only moves with fast_forward
+    cluster = FakeCluster(str(tmp_path / "state"), cpus=4, mem="16G", time_scale=1e-9)
+    yield cluster
+    cluster.close()
+
+
+def job_states(cluster):
+    output = cluster.sacct(["-X", "-n", "-P", "--format=JobID,State"])
+    return dict(line.split("|") for line in output.splitlines())
+
+
+def test_dependencies_and_capacity(cluster, tmp_path):
+    a = write_script(
+        tmp_path, "A", "#SBATCH --cpus-per-task=4\n", "#MILEX_SIM runtime=60\n"
+    )
+    b = write_script(tmp_path, "B", "", "#MILEX_SIM runtime=60 exit=1\n")
+    assert cluster.sbatch([a]) == "Submitted batch job 1000"
+    id_b = cluster.sbatch(["--parsable", b])
+    c = write_script(tmp_path, "C")
+    cluster.sbatch(["--parsable", f"--dependency=afterok:{id_b}", c])
+    # B waits for the CPUs used by A
+    assert job_states(cluster) == {
+        "1000": "RUNNING",
+        "1001": "PENDING",
+        "1002": "PENDING",
+    }
+    cluster.fast_forward(61)
+    assert job_states(cluster)["1001"] == "RUNNING"
+    cluster.fast_forward(61)
+    states = job_states(cluster)
+    assert states["1000"] == "COMPLETED"
+    assert states["1001"] == "FAILED"
+    assert states["1002"] == "PENDING"  # DependencyNeverSatisfied
+    assert "DependencyNeverSatisfied" in cluster.squeue(["-h", "-o", "%i %r"])
+
+
+def test_kill_on_invalid_dep_and_arrays(cluster, tmp_path):
+    a = write_script(tmp_path, "A", "#SBATCH --array=1-3\n", "#MILEX_SIM exit=2\n")
+    id_a = cluster.sbatch(["--parsable", a])
+    b = write_script(tmp_path, "B")
+    cluster.sbatch([f"--dependency=afterok:{id_a}", "--kill-on-invalid-dep=yes", b])
+    cluster.fast_forward(3600)
+    states = job_states(cluster)
+    assert [states[f"{id_a}_{i}"] for i in range(1, 4)] == ["FAILED"] * 3
+    assert states["1001"] == "CANCELLED"
+
+
+def test_timeout_scancel_and_limits(tmp_path):
+    cluster = FakeCluster(str(tmp_path / "state"), time_scale=1e-9, max_submit=2)
+    a = write_script(
+        tmp_path, "A", "#SBATCH --time=00:10:00\n", "#MILEX_SIM runtime=3600\n"
+    )
+    cluster.sbatch([a])
+    cluster.sbatch([a])
+    with pytest.raises(SlurmError, match="QOSMaxSubmitJobPerUserLimit"):
+        cluster.sbatch([a])
+    cluster.scancel(["1001"])
+    cluster.fast_forward(601)
+    assert job_states(cluster) == {"1000": "TIMEOUT", "1001": "CANCELLED"}
+    with pytest.raises(SlurmError, match="not available"):
+        cluster.sbatch(["--cpus-per-task=1000", a])
+    cluster.close()
+
+
+def test_split_ssh_args():
+    assert split_ssh_args(["-i", "/key", "user@host", "sbatch x.sh"]) == (
+        "user@host",
+        "sbatch x.sh",
+    )
+    assert split_ssh_args(["-o", "BatchMode=yes", "host", "squeue", "-h"]) == (
+        "host",
+        "squeue -h",
+    )
+    assert split_ssh_args(["-tt", "-i/key", "--", "host", "true"]) == ("host", "true")
+
+
+def test_ssh_destination_with_options_is_rejected(capsys):
+    # Like OpenSSH, the key is ' /key user@host' and the command is the destination
+    assert shims.main("ssh", ["-i /key user@host", "sbatch x.sh"]) == 255
+    assert "Could not resolve hostname sbatch x.sh" in capsys.readouterr().err
+    # An empty argument is a file for scp
+    assert shims.main("scp", ["", "a", "host:b"]) == 1
+
+
+@pytest.fixture
+def fake_machine(fake_cluster, milex_config, tmp_path):
+    """A remote machine 'fake' running on the fake cluster. Returns the cluster and the configuration."""
+    cluster = fake_cluster()
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    for path in [local / "jobs", local / "slurm", remote / "slurm"]:
+        os.makedirs(path)
+    config = {
+        "local": {"path": str(local)},
+        "fake": {
+            "path": str(remote),
+            # A key, so that the destination of ssh is '-i key user@host'
+            "username": "tester",
+            "hosturl": "fake",
+            "key_path": str(tmp_path / "key"),
+            "slurm_account": "def-fake",
+            "env_command": "true",
+            "python": sys.executable,
+        },
+    }
+    return cluster, milex_config(config)
+
+
+def test_sync_job_states_with_remote_helper(fake_machine, tmp_path):
+    cluster, config = fake_machine
+    save_bundle({"A": {"script": "a", "slurm": {"time": "00:10:00"}}}, "bundle")
+    submit_jobs("bundle", config["fake"])
+    cluster.fast_forward(3600)
+    with closing(connect_job_db()) as job_db:
+        assert sync_job_states(job_db, config["fake"]) == 1
+        assert [row["state"] for row in query_jobs(job_db)] == ["COMPLETED"]
+    # The states were queried through the helper
+    assert len(os.listdir(tmp_path / "remote" / ".milex")) == 1
+
+
+@pytest.mark.parametrize(
+    "options",
+    [
+        {},
+        {"dedupe": True},
+        {"in_memory": True, "archive": True},
+        {"remote_helper": True},
+        {"remote_helper": True, "in_memory": True, "archive": True},
+    ],
+)
+def test_submit_jobs_end_to_end(fake_machine, tmp_path, options):
+    cluster, config = fake_machine
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    save_bundle(
+        {
+            "A": {"script": "a", "slurm": {"time": "00:10:00"}},
+            "B": {"script": "b", "slurm": {"time": "00:10:00"}, "dependencies": ["A"]},
+        },
+        "bundle",
+    )
+    job_ids = submit_jobs("bundle", config["fake"], **options)
+    assert sorted(job_ids) == ["A", "B"]
+    cluster.fast_forward(3600)
+    rows = query_sacct(list(job_ids.values()), ["State", "JobName"], config["fake"])
+    assert {rows[i]["State"] for i in job_ids.values()} == {"COMPLETED"}
+    assert {rows[i]["JobName"] for i in job_ids.values()} == {"A", "B"}
+    if options.get("dedupe"):
+        assert len(os.listdir(remote / "slurm" / "store")) == 2
+    if options.get("remote_helper"):
+        assert len(os.listdir(remote / ".milex")) == 1
+    if options.get("in_memory"):
+        assert os.listdir(remote / "slurm") == []
+        scripts = {
+            path.name.split(".")[0]: path for path in (local / "slurm").iterdir()
+        }
+        assert (
+            f"#SBATCH --dependency=afterok:{job_ids['A']}\n" in scripts["B"].read_text()
+        )
+    # The ssh shim runs the command locally
+    result = subprocess.run(
+        ["ssh", "fake", "echo hello"], capture_output=True, text=True
+    )
+    assert result.stdout == "hello\n"
+
+
+@pytest.mark.parametrize("options", [{}, {"in_memory": True}])
+def test_submit_bundles_concurrently(fake_machine, tmp_path, options):
+    cluster, config = fake_machine
+    local, remote = tmp_path / "local", tmp_path / "remote"
+    for name in ["sweep_1", "sweep_2", "sweep_3"]:
+        save_bundle(
+            {
+                "A": {"script": f"a_{name}", "slurm": {"time": "00:10:00"}},
+                "B": {
+                    "script": f"b_{name}",
+                    "slurm": {"time": "00:10:00"},
+                    "dependencies": ["A"],
+                },
+            },
+            name,
+        )
+        # The bundles of a sweep are saved in the same second
+        (saved,) = (local / "jobs").glob(f"{name}_*.json")
+        saved.rename(local / "jobs" / f"{name}_20260101000000.json")
+    journal = tmp_path / "journal.json"
+    names = ["sweep_1", "sweep_2", "sweep_3", "missing"]
+    results = submit_bundles(
+        {name: config["fake"] for name in names},
+        max_workers=3,
+        journal=str(journal),
+        **options,
+    )
+    assert list(results) == names
+    assert isinstance(results["missing"], FileNotFoundError)
+    job_ids = [i for name in names[:3] for i in results[name].values()]
+    assert len(set(job_ids)) == 6
+    cluster.fast_forward(3600)
+    rows = query_sacct(job_ids, ["State"], config["fake"])
+    assert {rows[i]["State"] for i in job_ids} == {"COMPLETED"}
+    if not options.get("in_memory"):
+        # Each bundle submitted its own scripts
+        for name in names[:3]:
+            for job in ["A", "B"]:
+                script = remote / "slurm" / f"{job}.{name}_20260101000000.sh"
+                assert f"{job.lower()}_{name}" in script.read_text()
+    entries = json.loads(journal.read_text())["bundles"]
+    assert entries["sweep_2"] == {"machine": "fake", "jobs": results["sweep_2"]}
+    assert entries["missing"]["error"].startswith("FileNotFoundError")
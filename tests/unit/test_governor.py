@@ -0,0 +1,129 @@
+from milex_scheduler.governor import (
+    SubmissionGovernor,
+    machine_governor,
+    is_transient_error,
+)
+from milex_scheduler.backlog import is_submit_limit_error
+from milex_scheduler.run_slurm import run_slurm_locally
+from unittest.mock import Mock
+import subprocess
+import pytest
+
+FAST = {"backoff": 0.001, "max_backoff": 0.01}
+
+
+def test_is_transient_error():
+    assert is_transient_error(
+        "sbatch: error: Batch job submission failed: Socket timed out on send/recv operation"
+    )
+    assert is_transient_error("sbatch: error: Resource temporarily unavailable")
+    assert is_transient_error(
+        "kex_exchange_identification: read: Connection reset by peer"
+    )
+    assert not is_transient_error(
+        "sbatch: error: Invalid account or account/partition combination"
+    )
+
+
+def test_retry_transient_errors():
+    results = [
+        Mock(returncode=1, stderr="sbatch: error: Resource temporarily unavailable"),
+        Mock(
+            returncode=1,
+            stderr="sbatch: error: Socket timed out on send/recv operation",
+        ),
+        Mock(returncode=0, stdout="Submitted batch job 1", stderr=""),
+    ]
+    command = Mock(side_effect=results)
+    instance = SubmissionGovernor(**FAST)
+    # The job of the timed out submission is not in the queue
+    assert instance.run(command, submitted=lambda: None).returncode == 0
+    assert command.call_count == 3
+    metrics = instance.metrics()
+    assert metrics["retries"] == 2 and metrics["failures"] == 0
+    assert metrics["rate"] < instance.settings["initial_rate"]
+
+
+def test_permanent_errors_are_not_retried():
+    command = Mock(
+        return_value=Mock(returncode=1, stderr="sbatch: error: Invalid account")
+    )
+    instance = SubmissionGovernor(**FAST)
+    assert instance.run(command).returncode == 1
+    assert command.call_count == 1
+    assert instance.metrics()["failures"] == 1
+
+
+def test_give_up_after_max_retries():
+    command = Mock(
+        return_value=Mock(returncode=1, stderr="Resource temporarily unavailable")
+    )
+    instance = SubmissionGovernor(max_retries=2, **FAST)
+    assert instance.run(command).returncode == 1
+    assert command.call_count == 3
+    assert instance.metrics()["failures"] == 1
+
+
+def test_submissions_that_may_have_succeeded():
+    timeout = Mock(returncode=1, stderr="sbatch: error: Socket timed out")
+    instance = SubmissionGovernor(**FAST)
+    # Not retried without a way to look for the job
+    command = Mock(return_value=timeout)
+    assert instance.run(command).returncode == 1
+    assert command.call_count == 1
+    # The job was accepted before the error: it is not submitted again
+    queued = Mock(returncode=0, stdout="Submitted batch job 1")
+    assert instance.run(command, submitted=lambda: queued) is queued
+    assert command.call_count == 2
+    assert instance.metrics()["recovered"] == 1
+
+
+def test_rate_adapts_to_latency():
+    instance = SubmissionGovernor(initial_rate=4, rate_increase=1, max_rate=5, **FAST)
+    for _ in range(3):
+        instance.run(lambda: Mock(returncode=0))
+    assert instance.rate == 5
+    instance.settings["target_latency"] = -1  # Every submission is now too slow
+    instance.run(lambda: Mock(returncode=0))
+    assert instance.rate == 2.5
+
+
+@pytest.fixture
+def fake_cluster(fake_cluster, milex_config, monkeypatch, tmp_path):
+    def setup(**settings):
+        fake_cluster(**settings)
+        (tmp_path / "slurm").mkdir()
+        (tmp_path / "slurm" / "job.sh").write_text(
+            "#!/bin/bash\n#SBATCH --time=00:10:00\necho\n"
+        )
+        config = {
+            "local": {
+                "path": str(tmp_path),
+                "governor": {"max_retries": 20, "min_rate": 50, **FAST},
+            }
+        }
+        milex_config(config)
+        # A new governor, whose rate was not reduced by previous tests
+        monkeypatch.setattr("milex_scheduler.governor._governors", {})
+        return machine_governor(config["local"])
+
+    return setup
+
+
+def test_submissions_survive_a_busy_controller(fake_cluster):
+    instance = fake_cluster(transient_error_rate=0.3, lost_reply_rate=0.3)
+    calls = instance.metrics()["calls"]
+    job_ids = [run_slurm_locally("job.sh") for _ in range(8)]
+    assert len(set(job_ids)) == 8
+    assert instance.metrics()["calls"] > calls + 8  # Some submissions were retried
+    # The jobs accepted before a timeout were not submitted twice
+    queue = subprocess.run(["squeue", "-h", "-o", "%i"], capture_output=True, text=True)
+    assert sorted(queue.stdout.split()) == sorted(job_ids)
+
+
+def test_local_sbatch_errors_are_raised(fake_cluster):
+    fake_cluster(max_submit=1)
+    run_slurm_locally("job.sh")
+    with pytest.raises(ValueError) as e:
+        run_slurm_locally("job.sh")
+    assert is_submit_limit_error(str(e.value))
@@ -0,0 +1,76 @@
+import milex_scheduler
+import importlib
+import subprocess
+import time
+import sys
+import os
+import pytest
+
+APPS = [
+    "milex_agent",
+    "milex_configuration",
+    "milex_initialize",
+    "milex_report",
+    "milex_schedule",
+    "milex_status",
+    "milex_submit",
+    "milex_usage",
+]
+
+# Modules that the entry points must not load before parsing their arguments
+HEAVY_MODULES = [
+    "milex_scheduler.job_runner",
+    "milex_scheduler.save_load_jobs",
+    "milex_scheduler.run_slurm",
+    "milex_scheduler.job_db",
+    "concurrent.futures",
+    "sqlite3",
+    "graphlib",
+]
+
+
+def run_python(code: str) -> float:
+    """Best wall time of a fresh interpreter running the code, in seconds."""
+    best = float("inf")
+    for _ in range(5):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], check=True, capture_output=True)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def test_lazy_exports_match_submodules():
+    for module, names in milex_scheduler._SUBMODULES.items():
+        submodule = importlib.import_module(f"milex_scheduler.{module}")
+        assert names == submodule.__all__, module
+    assert milex_scheduler.submit_jobs.__module__ == "milex_scheduler.job_runner"
+    with pytest.raises(AttributeError):
+        milex_scheduler.not_a_name
+
+
+@pytest.mark.parametrize("app", APPS)
+def test_entry_points_import_graph(app):
+    code = (
+        f"import sys, milex_scheduler.apps.{app}; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    assert result.stdout.split() == []
+
+
+# Wall-clock assertions are flaky on shared runners: the import graph above is checked instead by default
+@pytest.mark.skipif(
+    not os.environ.get("MILEX_TIMING_TESTS"),
+    reason="Set MILEX_TIMING_TESTS=1 to measure the startup time",
+)
+def test_help_startup_time():
+    baseline = run_python("pass")
+    elapsed = run_python(
+        "import sys; sys.argv = ['milex-submit', '--help']\n"
+        "from milex_scheduler.apps.milex_submit import main\n"
+        "try:\n    main()\nexcept SystemExit:\n    pass"
+    )
+    # Time spent by milex on top of the startup of the interpreter
+    assert elapsed - baseline < 0.05
@@ -0,0 +1,64 @@
+from milex_scheduler.instrumentation import (
+    collect_instrumentation,
+    summarize_instrumentation,
+    parse_times,
+)
+from milex_scheduler.local_executor import run_bundle_locally
+from milex_scheduler import save_bundle
+import os
+import pytest
+
+
+@pytest.fixture
+def mock_load_config(monkeypatch, tmp_path):
+    mock_config = {"local": {"path": str(tmp_path), "env_command": "true"}}
+    os.makedirs(tmp_path / "jobs", exist_ok=True)
+    os.makedirs(tmp_path / "slurm", exist_ok=True)
+    for module in [
+        "save_load_jobs",
+        "job_to_slurm",
+        "job_db",
+        "local_executor",
+        "instrumentation",
+    ]:
+        monkeypatch.setattr(
+            f"milex_scheduler.{module}.load_config", lambda: mock_config
+        )
+    return mock_config
+
+
+def test_parse_times():
+    assert parse_times("0m0.010s 0m0.002s\n1m2.500s 0m0.300s") == pytest.approx(62.812)
+
+
+def test_instrumented_bundle(mock_load_config):
+    bundle = {
+        "A": {
+            "script": "sleep",
+            "slurm": {"array": "1-2"},
+            "pre_commands": ["echo pre"],
+            "script_args": {},
+            "instrument": True,
+        },
+        "B": {"script": "false", "slurm": {}, "instrument": True},
+        "C": {"script": "echo", "slurm": {}, "script_args": {"x": 1}},
+    }
+    save_bundle(bundle, "bundle")
+    run_bundle_locally("bundle", max_cpus=2)
+
+    records = collect_instrumentation("bundle")
+    assert sorted((r["job_name"], r["array_task_id"]) for r in records) == [
+        ("A", "1"),
+        ("A", "2"),
+        ("B", ""),
+    ]
+    record = records[0]
+    assert [s["name"] for s in record["sections"]] == ["env", "pre_commands", "main"]
+    assert all(s["end"] >= s["start"] for s in record["sections"])
+
+    summary = summarize_instrumentation(records)
+    assert summary["A"]["tasks"] == 2
+    assert summary["A"]["failed"] == 2  # 'sleep' without argument fails
+    assert summary["B"]["failed"] == 1
+    assert set(summary["B"]["sections"]) == {"env", "pre_commands", "main"}
+    assert "C" not in summary
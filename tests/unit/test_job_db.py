@@ -0,0 +1,83 @@
+from milex_scheduler.job_db import (
+    connect_job_db,
+    record_submission,
+    query_jobs,
+    sync_job_states,
+)
+from unittest.mock import patch, MagicMock
+from datetime import datetime, timedelta
+import pytest
+
+
+@pytest.fixture
+def job_db(tmp_path):
+    connection = connect_job_db(str(tmp_path / "milex.db"))
+    yield connection
+    connection.close()
+
+
+def test_indexes_are_created(job_db):
+    indexes = {
+        row["name"]
+        for row in job_db.execute("SELECT name FROM sqlite_master WHERE type='index'")
+    }
+    assert "idx_jobs_script_state_submit" in indexes
+    assert "idx_jobs_bundle" in indexes
+
+
+def test_query_uses_script_state_index(job_db):
+    plan = job_db.execute(
+        "EXPLAIN QUERY PLAN SELECT * FROM jobs WHERE script = ? AND state = ? AND submit_time >= ?",
+        ("x", "FAILED", "2024"),
+    ).fetchall()
+    assert any("idx_jobs_script_state_submit" in row[-1] for row in plan)
+
+
+def test_record_and_query(job_db):
+    date = datetime(2024, 1, 1)
+    record_submission(
+        job_db, "bundle", date, {"name": "JobA", "script": "a"}, "local", "1"
+    )
+    record_submission(
+        job_db, "bundle", date, {"name": "JobB", "script": "b"}, "local", "2"
+    )
+    record_submission(
+        job_db,
+        "bundle",
+        date,
+        {"name": "JobA", "script": "a"},
+        "local",
+        "3",
+        attempt=2,
+    )
+    assert len(query_jobs(job_db, bundle="bundle")) == 3
+    assert [row["slurm_id"] for row in query_jobs(job_db, script="a")] == ["1", "3"]
+    latest = query_jobs(job_db, bundle="bundle", latest_attempt=True)
+    assert sorted(row["slurm_id"] for row in latest) == ["2", "3"]
+    assert query_jobs(job_db, since=datetime.now() + timedelta(days=1)) == []
+
+
+def test_sync_job_states(job_db):
+    date = datetime(2024, 1, 1)
+    record_submission(job_db, "bundle", date, {"name": "JobA"}, "local", "11")
+    record_submission(job_db, "bundle", date, {"name": "JobB"}, "local", "12")
+    sacct_output = (
+        "11|OUT_OF_MEMORY|2024-01-01T10:00:00|2024-01-01T10:05:00|0:125\n"
+        "12_1|COMPLETED|2024-01-01T10:00:00|2024-01-01T10:01:00|0:0\n"
+        "12_2|CANCELLED by 99|2024-01-01T10:00:00|2024-01-01T10:02:00|0:0\n"
+    )
+    with patch("subprocess.run") as mock_run:
+        mock_run.return_value = MagicMock(returncode=0, stdout=sacct_output)
+        assert sync_job_states(job_db, {"path": "/milex"}) == 2
+        # A single sacct call is made for all the jobs
+        assert mock_run.call_count == 1
+    rows = {row["job_name"]: row for row in query_jobs(job_db)}
+    assert rows["JobA"]["state"] == "OUT_OF_MEMORY"
+    assert rows["JobA"]["exit_code"] == "0:125"
+    assert rows["JobB"]["state"] == "CANCELLED"
+    assert rows["JobB"]["end_time"] == "2024-01-01T10:02:00"
+
+    # Jobs in a terminal state are not queried again
+    with patch("subprocess.run") as mock_run:
+        assert sync_job_states(job_db, {"path": "/milex"}) == 0
+        mock_run.assert_not_called()
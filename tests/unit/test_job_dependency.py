@@ -89,6 +89,27 @@ def test_update_slurm_script_without_dependency(tmp_path):
         assert content == expected_script
 
 
+def test_update_slurm_script_kill_on_invalid_dep(tmp_path):
+    original_script = "#!/bin/bash\n#SBATCH --job-name=test_job\n"
+    expected_script = (
+        "#!/bin/bash\n"
+        + "#SBATCH --dependency=afterok:123:456\n"
+        + "#SBATCH --kill-on-invalid-dep=yes\n"
+        + "#SBATCH --job-name=test_job\n"
+    )
+    script_name = "dummy_job.sh"
+    script_path = create_temp_slurm_script(tmp_path, script_name, original_script)
+
+    mock_config = {"local": {"path": str(tmp_path)}}
+    with patch("milex_scheduler.job_dependency.load_config", return_value=mock_config):
+        update_slurm_with_dependencies(script_name, ["123"], kill_on_invalid_dep=True)
+        # The option is not repeated when more dependencies are added
+        update_slurm_with_dependencies(script_name, ["456"], kill_on_invalid_dep=True)
+        with open(script_path, "r") as f:
+            content = f.read()
+        assert content == expected_script
+
+
 def test_update_empty_slurm_script(tmp_path):
     script_name = "dummy_job.sh"
     script_path = create_temp_slurm_script(tmp_path, script_name, "")
@@ -0,0 +1,84 @@
+from milex_scheduler.local_executor import array_indices, run_bundle_locally
+from milex_scheduler.job_db import connect_job_db, query_jobs
+from milex_scheduler import save_bundle
+from contextlib import closing
+import os
+import pytest
+
+
+@pytest.fixture
+def mock_load_config(monkeypatch, tmp_path):
+    mock_config = {"local": {"path": str(tmp_path), "env_command": "true"}}
+    os.makedirs(tmp_path / "jobs", exist_ok=True)
+    os.makedirs(tmp_path / "slurm", exist_ok=True)
+    for module in ["save_load_jobs", "job_to_slurm", "job_db", "local_executor"]:
+        monkeypatch.setattr(
+            f"milex_scheduler.{module}.load_config", lambda: mock_config
+        )
+    return mock_config
+
+
+@pytest.mark.parametrize(
+    "array, expected",
+    [
+        (None, [None]),
+        ("1-4", [1, 2, 3, 4]),
+        ("1-10%2", list(range(1, 11))),
+        ("0-8:4", [0, 4, 8]),
+        ("1,3,5-6", [1, 3, 5, 6]),
+    ],
+)
+def test_array_indices(array, expected):
+    assert array_indices(array) == expected
+
+
+def test_run_bundle_locally(mock_load_config):
+    path = mock_load_config["local"]["path"]
+    bundle = {
+        "A": {"script": "echo", "slurm": {}, "script_args": {"a": "1"}},
+        "B": {"script": "echo", "slurm": {}, "dependencies": ["A"], "script_args": {}},
+        "C": {"script": "false", "slurm": {}, "script_args": {}},
+        "D": {"script": "echo", "slurm": {}, "dependencies": ["C"], "script_args": {}},
+        "E": {
+            "script": 'echo "task $SLURM_ARRAY_TASK_ID" && echo',
+            "slurm": {"array": "1-3", "cpus_per_task": 1},
+            "script_args": {},
+        },
+    }
+    save_bundle(bundle, "bundle")
+    states = run_bundle_locally("bundle", max_cpus=2)
+    assert states == {
+        "A": "COMPLETED",
+        "B": "COMPLETED",
+        "C": "FAILED",
+        "D": "CANCELLED",
+        "E": "COMPLETED",
+    }
+    logs = os.listdir(os.path.join(path, "slurm"))
+    assert "A-" in " ".join(logs)
+    array_logs = sorted(log for log in logs if log.startswith("E-"))
+    assert len(array_logs) == 3
+    with open(os.path.join(path, "slurm", array_logs[1])) as f:
+        assert "task 2" in f.read()
+    with closing(connect_job_db()) as job_db:
+        rows = {row["job_name"]: row for row in query_jobs(job_db, bundle="bundle")}
+    assert rows["C"]["state"] == "FAILED"
+    assert rows["A"]["start_time"] is not None
+
+
+def test_run_bundle_locally_with_remote_config(mock_load_config):
+    path = mock_load_config["local"]["path"]
+    save_bundle({"A": {"script": 'echo "in $MILEX"', "slurm": {}}}, "bundle")
+    remote = {"hostname": "remote", "path": "/remote/milex", "env_command": "true"}
+    assert run_bundle_locally("bundle", machine_config=remote) == {"A": "COMPLETED"}
+    (log,) = [
+        log for log in os.listdir(os.path.join(path, "slurm")) if log.startswith("A-")
+    ]
+    with open(os.path.join(path, "slurm", log)) as f:
+        assert f.read() == f"in {path}\n"
+
+
+def test_run_bundle_locally_too_large(mock_load_config):
+    save_bundle({"A": {"script": "echo", "slurm": {"cpus_per_task": 64}}}, "bundle")
+    with pytest.raises(ValueError):
+        run_bundle_locally("bundle", max_cpus=2)
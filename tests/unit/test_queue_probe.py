@@ -0,0 +1,114 @@
+from milex_scheduler.queue_probe import (
+    sbatch_test_only_command,
+    parse_test_only_output,
+    probe_start_times,
+    estimate_makespan,
+    select_machine,
+)
+from milex_scheduler import save_bundle
+from unittest.mock import MagicMock
+from datetime import datetime
+import os
+import pytest
+
+
+@pytest.fixture
+def mock_load_config(monkeypatch, tmp_path):
+    mock_config = {
+        "local": {"path": str(tmp_path), "slurm_account": "def-local"},
+        "busy": {"path": "/busy", "hostname": "busy", "slurm_account": "rrg-busy"},
+        "idle": {"path": "/idle", "hostname": "idle", "slurm_account": "rrg-idle"},
+    }
+    os.makedirs(tmp_path / "jobs", exist_ok=True)
+    for module in ["save_load_jobs", "queue_probe", "utils"]:
+        monkeypatch.setattr(
+            f"milex_scheduler.{module}.load_config", lambda: mock_config
+        )
+    return mock_config
+
+
+def test_sbatch_test_only_command():
+    command = sbatch_test_only_command(
+        {"gres": "gpu:1", "cpus_per_task": 4, "array": "1-10", "mem": None}, "def-x"
+    )
+    assert command == (
+        "sbatch --test-only --account=def-x --gres=gpu:1 --cpus-per-task=4 --wrap=true"
+    )
+
+
+def test_parse_test_only_output():
+    output = "sbatch: Job 1234 to start at 2024-01-01T10:00:00 using 4 processors on nodes n1 in partition gpu"
+    assert parse_test_only_output(output) == datetime(2024, 1, 1, 10)
+    assert (
+        parse_test_only_output(
+            "sbatch: error: Requested node configuration is not available"
+        )
+        is None
+    )
+
+
+def test_probe_start_times_batched_and_cached(mock_load_config, monkeypatch):
+    output = (
+        "sbatch: Job 1 to start at 2024-01-01T10:00:00 using 1 processors\n@@milex-probe@@\n"
+        "sbatch: error: Requested node configuration is not available\n@@milex-probe@@\n"
+    )
+    mock_run = MagicMock(return_value=MagicMock(returncode=0, stdout=output))
+    monkeypatch.setattr("subprocess.run", mock_run)
+    shapes = [{"gres": "gpu:1"}, {"gres": "gpu:64"}]
+    machine = mock_load_config["busy"]
+    assert probe_start_times(shapes, machine) == [datetime(2024, 1, 1, 10), None]
+    assert mock_run.call_count == 1
+    # Results are cached
+    assert probe_start_times(shapes, machine) == [datetime(2024, 1, 1, 10), None]
+    assert mock_run.call_count == 1
+    # Unless expired
+    probe_start_times(shapes, machine, ttl=-1)
+    assert mock_run.call_count == 2
+
+
+def test_probe_start_times_failure(mock_load_config, monkeypatch):
+    # The connection drops after the first probe
+    output = "sbatch: Job 1 to start at 2024-01-01T10:00:00 using 1 processors\n@@milex-probe@@\n"
+    mock_run = MagicMock(
+        return_value=MagicMock(returncode=255, stdout=output, stderr="Broken pipe")
+    )
+    monkeypatch.setattr("subprocess.run", mock_run)
+    shapes = [{"gres": "gpu:1"}, {"gres": "gpu:64"}]
+    machine = mock_load_config["busy"]
+    with pytest.raises(ValueError, match="1 of 2 probes answered"):
+        probe_start_times(shapes, machine)
+    # Nothing is cached, the next call probes again
+    mock_run.return_value = MagicMock(returncode=0, stdout=output * 2)
+    assert probe_start_times(shapes, machine) == [datetime(2024, 1, 1, 10)] * 2
+    assert mock_run.call_count == 2
+
+
+def test_estimate_makespan():
+    jobs = [
+        {"name": "A", "slurm": {"time": "01:00:00"}},
+        {"name": "B", "slurm": {"time": "02:00:00"}, "dependencies": ["A"]},
+        {"name": "C", "slurm": {"time": "00:30:00"}},
+    ]
+    dependencies = {"A": ["B"], "B": [], "C": []}
+    now = datetime(2024, 1, 1)
+    start_times = {"A": datetime(2024, 1, 1, 1), "C": datetime(2024, 1, 1, 5)}
+    assert estimate_makespan(jobs, dependencies, start_times, now) == datetime(
+        2024, 1, 1, 5, 30
+    )
+
+
+def test_select_machine(mock_load_config, monkeypatch):
+    save_bundle({"A": {"script": "a", "slurm": {"time": "01:00:00"}}}, "bundle")
+
+    def mock_run(command, *args, **kwargs):
+        if isinstance(command, str):  # Local machine has no SLURM
+            return MagicMock(returncode=127, stdout="sbatch: command not found")
+        start = (
+            "2030-01-01T00:00:00" if command[-2] == "busy" else "2020-01-01T00:00:00"
+        )
+        return MagicMock(
+            returncode=0, stdout=f"Job 1 to start at {start}\n@@milex-probe@@\n"
+        )
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    assert select_machine("bundle") == "idle"
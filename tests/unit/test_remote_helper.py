@@ -0,0 +1,92 @@
+from milex_scheduler.remote_helper import status, submit
+from milex_scheduler.remote_bundle import submit_with_remote_helper
+from milex_scheduler.backlog import is_submit_limit_error
+import subprocess
+import json
+import os
+import io
+
+SCRIPT = "#!/bin/bash\n#SBATCH --job-name={}\n#SBATCH --time=00:10:00\necho\n"
+
+
+def run_helper(tmp_path, **payload):
+    payload = {
+        "jobs": [
+            {"name": "A", "content": SCRIPT.format("A"), "slurm_name": "A.sh"},
+            {"name": "B", "content": SCRIPT.format("B"), "dependencies": ["A"]},
+            {"name": "C", "content": SCRIPT.format("C"), "dependencies": ["A", "B"]},
+        ],
+        "slurm_dir": str(tmp_path),
+        "kill_on_invalid_dep": True,
+        **payload,
+    }
+    output = io.StringIO()
+    submit(payload, output)
+    return [json.loads(line) for line in output.getvalue().splitlines()]
+
+
+def test_submit_with_dependencies(fake_cluster, tmp_path):
+    fake_cluster()
+    messages = run_helper(tmp_path)
+    assert messages[-1] == {"done": True}
+    assert [m["job"] for m in messages[:-1]] == ["A", "B", "C"]
+    assert (tmp_path / "A.sh").read_text() == SCRIPT.format("A")
+
+
+def test_stop_at_max_jobs(fake_cluster, tmp_path):
+    fake_cluster()
+    messages = run_helper(tmp_path, max_jobs=2)
+    assert [m.get("job") for m in messages] == ["A", "B", None]
+
+
+def test_stop_at_first_error(fake_cluster, tmp_path):
+    fake_cluster(max_submit=1)
+    messages = run_helper(tmp_path)
+    assert messages[0]["job"] == "A" and "job_id" in messages[0]
+    assert messages[1]["job"] == "B"
+    assert is_submit_limit_error(messages[1]["error"])
+    assert len(messages) == 2
+
+
+def run_status(**payload):
+    output = io.StringIO()
+    status({"fields": ["State", "ExitCode"], **payload}, output)
+    return json.loads(output.getvalue())
+
+
+def test_status(fake_cluster, tmp_path, monkeypatch):
+    cluster = fake_cluster()
+    job_ids = [m["job_id"] for m in run_helper(tmp_path)[:-1]]
+    cluster.fast_forward(3600)
+    records = run_status(job_ids=job_ids[:2])["records"]
+    assert set(records) == set(job_ids[:2])
+    assert {r["State"] for r in records.values()} == {"COMPLETED"}
+    assert records[job_ids[0]]["ExitCode"] == "0:0"
+    # The queued jobs that sacct does not report yet are found in the queue
+    job_id = [m["job_id"] for m in run_helper(tmp_path)[:-1]][-1]
+    (tmp_path / "lag").mkdir()
+    (tmp_path / "lag" / "sacct").write_text("#!/bin/sh\n")
+    (tmp_path / "lag" / "sacct").chmod(0o755)
+    monkeypatch.setenv("PATH", f"{tmp_path / 'lag'}:{os.environ['PATH']}")
+    records = run_status(job_ids=[job_id])["records"]
+    assert records == {job_id: {"JobID": job_id, "State": "PENDING", "ExitCode": ""}}
+
+
+def test_jobs_submitted_before_a_failure_are_returned(monkeypatch, tmp_path):
+    def ssh(machine_config, command, stdin):
+        if command.endswith(" submit"):
+            # The connection dropped while the helper was reporting the second job
+            stdout = b'{"job": "A", "job_id": "1000"}\n{"job": "B", "jo'
+            return subprocess.CompletedProcess(command, 255, stdout, b"Broken pipe")
+        return subprocess.CompletedProcess(command, 0, b"", b"")
+
+    monkeypatch.setattr("milex_scheduler.remote_bundle._ssh", ssh)
+    jobs = [{"name": "A"}, {"name": "B"}]
+    job_ids, error = submit_with_remote_helper(
+        jobs,
+        {"A": ["B"]},
+        {"A": SCRIPT.format("A"), "B": SCRIPT.format("B")},
+        {"hostname": "fake", "path": str(tmp_path)},
+    )
+    assert job_ids == {"A": "1000"}
+    assert "Broken pipe" in error
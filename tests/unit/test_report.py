@@ -0,0 +1,45 @@
+from milex_scheduler.report import bundle_timeline, analyze_timeline, timeline_trace
+from milex_scheduler import save_bundle, submit_jobs
+import os
+import pytest
+
+
+@pytest.fixture
+def fake_cluster(fake_cluster, milex_config, tmp_path):
+    cluster = fake_cluster(cpus=1)
+    os.makedirs(tmp_path / "jobs")
+    os.makedirs(tmp_path / "slurm")
+    milex_config({"local": {"path": str(tmp_path), "env_command": "true"}})
+    return cluster
+
+
+def test_bundle_report(fake_cluster):
+    def job(dependencies=None):
+        return {
+            "script": "echo",
+            "slurm": {"time": "00:10:00"},
+            "pre_commands": ["#MILEX_SIM runtime=60"],
+            "dependencies": dependencies,
+        }
+
+    save_bundle(
+        {"A": job(), "B": job(["A"]), "C": job(["A"]), "D": job(["B", "C"])},
+        "bundle",
+    )
+    submit_jobs("bundle")
+    fake_cluster.fast_forward(1000)
+
+    dependencies, timeline = bundle_timeline("bundle")
+    assert set(timeline) == {"A", "B", "C", "D"}
+    analysis = analyze_timeline(dependencies, timeline)
+    # B and C share the single CPU of the cluster: one of them waits in the queue for 60 s
+    assert analysis["makespan"] == pytest.approx(240, abs=2)
+    assert analysis["total_queue_wait"] == pytest.approx(60, abs=2)
+    assert analysis["critical_path"][0] == "A"
+    assert analysis["critical_path"][-1] == "D"
+    assert len(analysis["critical_path"]) == 3
+    assert analysis["max_concurrency"] == 1
+    assert analysis["parallelism"] == pytest.approx(1, abs=0.05)
+
+    events = timeline_trace(timeline)
+    assert len([e for e in events if e.get("cat") == "run"]) == 4
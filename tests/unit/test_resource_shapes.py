@@ -0,0 +1,52 @@
+from milex_scheduler.resource_shapes import expand_shapes, optimize_shapes
+from unittest.mock import MagicMock
+from datetime import datetime
+import os
+import pytest
+
+
+@pytest.fixture
+def mock_load_config(monkeypatch, tmp_path):
+    mock_config = {"local": {"path": str(tmp_path)}}
+    os.makedirs(tmp_path / "jobs", exist_ok=True)
+    monkeypatch.setattr("milex_scheduler.queue_probe.load_config", lambda: mock_config)
+    return mock_config
+
+
+job = {
+    "name": "train",
+    "script": "train",
+    "slurm": {"gres": "gpu:4", "time": "12:00:00"},
+    "shapes": [{"gres": "gpu:2"}, {"gres": "gpu:1", "time": "2-00:00:00"}],
+}
+
+
+def test_expand_shapes():
+    shapes = expand_shapes(job)
+    assert shapes[0] == job["slurm"]
+    assert shapes[1] == {"gres": "gpu:2", "time": "1-00:00:00"}
+    assert shapes[2] == {"gres": "gpu:1", "time": "2-00:00:00"}
+    # Sub-linear scaling hint
+    shapes = expand_shapes({**job, "shape_scaling": 0.5})
+    assert shapes[1]["time"] == "0-16:58:15"
+
+
+def test_optimize_shapes(mock_load_config, monkeypatch):
+    # gpu:4 starts in 24 hours, gpu:2 now, gpu:1 cannot run
+    output = (
+        "Job 1 to start at 2024-01-02T00:00:00\n@@milex-probe@@\n"
+        "Job 2 to start at 2024-01-01T00:00:00\n@@milex-probe@@\n"
+        "sbatch: error: Batch job submission failed\n@@milex-probe@@\n"
+    )
+    mock_run = MagicMock(return_value=MagicMock(returncode=0, stdout=output))
+    monkeypatch.setattr("subprocess.run", mock_run)
+    other_job = {"name": "other", "script": "other", "slurm": {"time": "01:00:00"}}
+    jobs = optimize_shapes(
+        [job, other_job], {"path": "/milex"}, now=datetime(2024, 1, 1)
+    )
+    # One batched probe for all the shapes
+    assert mock_run.call_count == 1
+    assert jobs[0]["slurm"] == {"gres": "gpu:2", "time": "1-00:00:00"}
+    assert jobs[1] is other_job
+    # The bundle configuration is not modified
+    assert job["slurm"]["gres"] == "gpu:4"
@@ -0,0 +1,191 @@
+from milex_scheduler.retry import (
+    classify_failure,
+    escalate_resources,
+    retry_failed_jobs,
+    prune_orphaned_jobs,
+    DEFAULT_RETRY_POLICY,
+)
+from milex_scheduler.job_db import connect_job_db, record_submission, query_jobs
+from milex_scheduler.save_load_jobs import load_bundle
+from milex_scheduler import save_bundle
+from unittest.mock import MagicMock
+from contextlib import closing
+import os
+import pytest
+
+
+@pytest.fixture
+def mock_load_config(monkeypatch, tmp_path):
+    mock_config = {"local": {"path": str(tmp_path)}}
+    os.makedirs(tmp_path / "jobs", exist_ok=True)
+    os.makedirs(tmp_path / "slurm", exist_ok=True)
+    for module in [
+        "save_load_jobs",
+        "job_to_slurm",
+        "job_dependency",
+        "job_runner",
+        "run_slurm",
+        "job_db",
+        "retry",
+    ]:
+        monkeypatch.setattr(
+            f"milex_scheduler.{module}.load_config", lambda: mock_config
+        )
+    return mock_config
+
+
+@pytest.mark.parametrize(
+    "state, exit_code, expected",
+    [
+        ("OUT_OF_MEMORY", "0:125", "OUT_OF_MEMORY"),
+        ("FAILED", "137:0", "OUT_OF_MEMORY"),
+        ("FAILED", "1:0", "FAILED"),
+        ("TIMEOUT", "0:0", "TIMEOUT"),
+        ("CANCELLED by 123", "0:0", "CANCELLED"),
+        ("NODE_FAIL", "0:0", "NODE_FAIL"),
+        ("COMPLETED", "0:0", None),
+        ("RUNNING", "0:0", None),
+    ],
+)
+def test_classify_failure(state, exit_code, expected):
+    assert classify_failure(state, exit_code) == expected
+
+
+def test_escalate_resources():
+    slurm = {"mem": "4G", "time": "01:00:00"}
+    policy = DEFAULT_RETRY_POLICY
+    assert escalate_resources(slurm, "OUT_OF_MEMORY", policy, {})["mem"] == "8G"
+    assert escalate_resources(slurm, "TIMEOUT", policy, {})["time"] == "0-02:00:00"
+    # Capped by the machine maximum
+    capped = escalate_resources(slurm, "OUT_OF_MEMORY", policy, {"max_mem": "6G"})
+    assert capped["mem"] == "6G"
+    assert (
+        escalate_resources(capped, "OUT_OF_MEMORY", policy, {"max_mem": "6G"}) is None
+    )
+    # Other failures are retried with the same resources
+    assert escalate_resources(slurm, "NODE_FAIL", policy, {}) == slurm
+    # A resource the job does not request cannot be escalated
+    assert escalate_resources({}, "OUT_OF_MEMORY", policy, {}) is None
+    assert escalate_resources({"mem": "4G"}, "TIMEOUT", policy, {}) is None
+
+
+def test_retry_failed_jobs(mock_load_config, monkeypatch):
+    bundle = {
+        "JobA": {"script": "a", "slurm": {"mem": "4G"}, "retry": True},
+        "JobB": {"script": "b", "slurm": {}, "dependencies": ["JobA"]},
+        "JobC": {"script": "c", "slurm": {}},
+    }
+    save_bundle(bundle, "bundle")
+    jobs, _, date = load_bundle("bundle")
+    with closing(connect_job_db()) as job_db:
+        for job in jobs:
+            slurm_id = {"JobA": "1", "JobB": "2", "JobC": "3"}[job["name"]]
+            record_submission(job_db, "bundle", date, job, "local", slurm_id)
+
+    commands = []
+
+    def mock_run(command, *args, **kwargs):
+        commands.append(command)
+        if isinstance(command, str) and command.startswith("sacct"):
+            stdout = (
+                "1|OUT_OF_MEMORY|2024-01-01T10:00:00|2024-01-01T10:01:00|0:125\n"
+                "2|PENDING|Unknown|Unknown|0:0\n"
+                "3|COMPLETED|2024-01-01T10:00:00|2024-01-01T10:01:00|0:0\n"
+            )
+        else:
+            stdout = f"Submitted batch job {10 + len(commands)}\n"
+        return MagicMock(returncode=0, stdout=stdout, stderr="")
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    new_ids = retry_failed_jobs("bundle", machine_config={"path": "/milex"})
+
+    assert set(new_ids) == {"JobA", "JobB"}
+    assert "scancel 2" in commands
+    with closing(connect_job_db()) as job_db:
+        rows = query_jobs(job_db, bundle="bundle", latest_attempt=True)
+        attempts = {row["job_name"]: row for row in rows}
+        first_attempt = query_jobs(job_db, bundle="bundle")[0]
+    assert first_attempt["failure"] == "OUT_OF_MEMORY"
+    assert attempts["JobA"]["attempt"] == 2
+    assert attempts["JobB"]["attempt"] == 2
+    assert attempts["JobC"]["attempt"] == 1
+
+    # Escalated resources and dependency on the new ID of the parent
+    slurm_dir = os.path.join(mock_load_config["local"]["path"], "slurm")
+    scripts = {name.split(".")[0]: name for name in os.listdir(slurm_dir)}
+    with open(os.path.join(slurm_dir, scripts["JobA"])) as f:
+        assert "#SBATCH --mem=8G\n" in f.read()
+    with open(os.path.join(slurm_dir, scripts["JobB"])) as f:
+        assert f"#SBATCH --dependency=afterok:{new_ids['JobA']}\n" in f.read()
+
+
+def test_no_retry_without_resource_to_escalate(mock_load_config, monkeypatch, capsys):
+    save_bundle({"JobA": {"script": "a", "slurm": {}, "retry": True}}, "bundle")
+    jobs, _, date = load_bundle("bundle")
+    with closing(connect_job_db()) as job_db:
+        record_submission(job_db, "bundle", date, jobs[0], "local", "1")
+
+    def mock_run(command, *args, **kwargs):
+        stdout = "1|TIMEOUT|2024-01-01T10:00:00|2024-01-01T11:00:00|0:0\n"
+        return MagicMock(returncode=0, stdout=stdout, stderr="")
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    assert retry_failed_jobs("bundle", machine_config={"path": "/milex"}) == {}
+    assert "Job JobA failed with TIMEOUT" in capsys.readouterr().out
+
+
+@pytest.mark.parametrize("scancel_returncode", [0, 1])
+def test_prune_orphaned_jobs(mock_load_config, monkeypatch, scancel_returncode):
+    bundle = {
+        "JobA": {"script": "a", "slurm": {}},
+        "JobB": {"script": "b", "slurm": {}, "dependencies": ["JobA"]},
+        "JobC": {"script": "c", "slurm": {}, "dependencies": ["JobB"]},
+        "JobD": {"script": "d", "slurm": {}},
+        "JobE": {"script": "e", "slurm": {}, "dependencies": ["JobD"]},
+    }
+    save_bundle(bundle, "bundle")
+    jobs, _, date = load_bundle("bundle")
+    slurm_ids = {"JobA": "1", "JobB": "2", "JobC": "3", "JobD": "4", "JobE": "5"}
+    with closing(connect_job_db()) as job_db:
+        for job in jobs:
+            record_submission(
+                job_db, "bundle", date, job, "local", slurm_ids[job["name"]]
+            )
+
+    commands = []
+
+    def mock_run(command, *args, **kwargs):
+        commands.append(command)
+        stdout = ""
+        if command.startswith("sacct"):
+            stdout = (
+                "1|FAILED|2024-01-01T10:00:00|2024-01-01T10:01:00|1:0\n"
+                "2|PENDING|Unknown|Unknown|0:0\n"
+                "3|PENDING|Unknown|Unknown|0:0\n"
+                "4|RUNNING|2024-01-01T10:00:00|Unknown|0:0\n"
+                "5|PENDING|Unknown|Unknown|0:0\n"
+            )
+        if command.startswith("scancel"):
+            return MagicMock(
+                returncode=scancel_returncode, stdout="", stderr="scancel: error"
+            )
+        return MagicMock(returncode=0, stdout=stdout, stderr="")
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    if scancel_returncode:
+        with pytest.raises(ValueError, match="scancel: error"):
+            prune_orphaned_jobs("bundle", machine_config={"path": "/milex"})
+    else:
+        pruned = prune_orphaned_jobs("bundle", machine_config={"path": "/milex"})
+        # Every descendant of the failed job is cancelled with a single scancel
+        assert pruned == ["JobB", "JobC"]
+    assert [c for c in commands if c.startswith("scancel")] == ["scancel 2 3"]
+    with closing(connect_job_db()) as job_db:
+        states = {
+            row["job_name"]: row["state"]
+            for row in query_jobs(job_db, bundle="bundle", latest_attempt=True)
+        }
+    # Jobs that may not have been cancelled are not marked as such
+    expected = "PENDING" if scancel_returncode else "CANCELLED"
+    assert states["JobB"] == states["JobC"] == expected
+    assert states["JobE"] == "PENDING"
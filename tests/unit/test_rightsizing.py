@@ -0,0 +1,88 @@
+from milex_scheduler.rightsizing import (
+    collect_usage,
+    recommend_resources,
+    rightsize_job,
+    wasted_core_hours,
+    parse_sacct_duration,
+    parse_sacct_memory,
+)
+from milex_scheduler.job_db import connect_job_db, record_submission
+from unittest.mock import patch, MagicMock
+from datetime import datetime
+import pytest
+
+
+@pytest.fixture
+def job_db(tmp_path, monkeypatch):
+    mock_config = {"local": {"path": str(tmp_path)}}
+    monkeypatch.setattr("milex_scheduler.job_db.load_config", lambda: mock_config)
+    connection = connect_job_db()
+    yield connection
+    connection.close()
+
+
+def test_parse_sacct_fields():
+    assert parse_sacct_duration("1-00:00:01") == 86401
+    assert parse_sacct_duration("05:30.500") == 330.5
+    assert parse_sacct_duration("UNLIMITED") is None
+    assert parse_sacct_memory("2048K") == 2
+    assert parse_sacct_memory("4Gn") == 4096
+    assert parse_sacct_memory("1000Mc", alloc_cpus=4) == 4000
+    assert parse_sacct_memory("") is None
+
+
+def populate(job_db):
+    date = datetime(2024, 1, 1)
+    job = {"name": "train", "script": "train", "script_args": {"lr": 0.1}}
+    for slurm_id in ["1", "2", "3"]:
+        record_submission(job_db, "bundle", date, job, "local", slurm_id)
+    job_db.execute("UPDATE jobs SET state = 'COMPLETED'")
+    job_db.commit()
+    sacct_output = ""
+    for slurm_id, rss, elapsed in [
+        ("1", "1000000K", "00:50:00"),
+        ("2", "2000000K", "01:00:00"),
+        ("3", "1500000K", "00:40:00"),
+    ]:
+        sacct_output += f"{slurm_id}|COMPLETED|4|16G||04:00:00|{elapsed}|01:00:00|2024-01-01T12:00:00\n"
+        sacct_output += f"{slurm_id}.batch|COMPLETED|4||{rss}||{elapsed}|00:59:00|\n"
+    with patch("subprocess.run") as mock_run:
+        mock_run.return_value = MagicMock(returncode=0, stdout=sacct_output)
+        assert collect_usage(job_db, {"path": "/milex"}) == 3
+        assert "--allocations" not in mock_run.call_args[0][0]
+
+
+def test_recommend_resources(job_db):
+    populate(job_db)
+    recommendation = recommend_resources(job_db, "train", margin=0.5)
+    # p95 of MaxRSS is ~1953M, p95 of Elapsed is one hour
+    assert recommendation["mem"] == "2930M"
+    assert recommendation["time"] == "0-01:30:00"
+    assert recommend_resources(job_db, "train", min_samples=4) == {}
+
+
+def test_rightsize_job(job_db):
+    populate(job_db)
+    job = {
+        "name": "train",
+        "script": "train",
+        "script_args": {"lr": 0.01},
+        "slurm": {"mem": "16G", "time": "04:00:00"},
+    }
+    suggested = rightsize_job(job, "suggest")
+    assert suggested["slurm"] == job["slurm"]
+    applied = rightsize_job(job, "apply")
+    assert applied["slurm"]["mem"] == "2344M"
+    assert applied["slurm"]["time"] == "0-01:12:00"
+    # The original job is not modified
+    assert job["slurm"]["mem"] == "16G"
+
+
+def test_wasted_core_hours(job_db):
+    populate(job_db)
+    report = wasted_core_hours(job_db)
+    assert report[0]["script"] == "train"
+    assert report[0]["jobs"] == 3
+    # 4 cpus for 2.5 hours, 3 hours of CPU time used
+    assert report[0]["allocated_core_hours"] == pytest.approx(10)
+    assert report[0]["wasted_core_hours"] == pytest.approx(7)
@@ -1,7 +1,7 @@
 import pytest
 from unittest.mock import patch, MagicMock, Mock
 from milex_scheduler.run_slurm import get_job_id_from_sbatch_output
-from milex_scheduler.run_slurm import run_slurm_remotely, run_slurm_locally
+from milex_scheduler.run_slurm import run_slurm_remotely, run_slurm_locally, ssh_args
 import os
 
 
@@ -52,10 +52,24 @@ def test_run_slurm_remotely(mock_ssh, mock_load_config):
     assert job_id == "12345"
 
 
+def test_run_slurm_remotely_with_key(mock_ssh, mock_load_config):
+    machine_config = {
+        "username": "testuser",
+        "hosturl": "testhost",
+        "key_path": "/path/to/key",
+        "path": "/path/to/remote",
+    }
+    assert run_slurm_remotely("script.sh", machine_config=machine_config) == "12345"
+    command = mock_ssh.call_args[0][0]
+    # The key and the destination are separate arguments of ssh
+    assert command[-4:-1] == ["-i", "/path/to/key", "testuser@testhost"]
+    assert command[:-4] == ssh_args(machine_config, "")[:-4]
+
+
 @patch("subprocess.run")
 def test_run_slurm_locally(mock_run, mock_load_config):
     # Setup mock behavior
-    mock_run.return_value = Mock(stdout="Submitted batch job 67890")
+    mock_run.return_value = Mock(returncode=0, stdout="Submitted batch job 67890")
 
     # Call the function
     job_id = run_slurm_locally("local_script.sh")
@@ -3,12 +3,15 @@ from milex_scheduler.save_load_jobs import (
     save_job,
     save_bundle,
     transfer_slurm_to_remote,
+    transfer_slurm_bundle_to_remote,
     nearest_bundle_filename,
+    list_bundles,
 )
 from milex_scheduler import DATE_FORMAT
 from unittest.mock import patch
 from unittest.mock import MagicMock
 from datetime import datetime
+import subprocess
 import json
 import os
 import pytest
@@ -305,6 +308,85 @@ def test_transfer_script_to_remote(
     transfer_slurm_to_remote("test_job", machine_config=mock_machine_config)
 
 
+def test_transfer_bundle_to_remote(tmp_path, mock_load_config, monkeypatch):
+    os.makedirs(tmp_path / "slurm")
+    names = [f"job_{i}.sh" for i in range(3)]
+    for name in names:
+        (tmp_path / "slurm" / name).write_text(f"#!/bin/bash\necho {name}\n")
+    remote = tmp_path / "remote"
+    commands = []
+    run = subprocess.run
+
+    def mock_run(command, **kwargs):
+        # Run the remote command locally
+        commands.append(command)
+        return run(["bash", "-c", command[-1]], **kwargs)
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    transfer_slurm_bundle_to_remote(
+        names, machine_config={"hostname": "remote", "path": str(remote)}
+    )
+    assert len(commands) == 1  # A single connection for the whole bundle
+    assert commands[0][0] == "ssh" and commands[0][-2] == "remote"
+    assert sorted(os.listdir(remote / "slurm")) == names  # No temporary directory left
+    assert (remote / "slurm" / "job_1.sh").read_text() == "#!/bin/bash\necho job_1.sh\n"
+
+
+def test_transfer_bundle_to_remote_dedupe(tmp_path, mock_load_config, monkeypatch):
+    os.makedirs(tmp_path / "slurm")
+    for name, script in [("a", "train"), ("b", "train"), ("c", "evaluate")]:
+        (tmp_path / "slurm" / f"{name}.sh").write_text(
+            f"#!/bin/bash\n#SBATCH --job-name={name}\n{script}\n"
+        )
+    remote = tmp_path / "remote"
+    commands = []
+    run = subprocess.run
+
+    def mock_run(command, **kwargs):
+        commands.append(command)
+        return run(["bash", "-c", command[-1]], **kwargs)
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    machine_config = {"hostname": "remote", "path": str(remote)}
+    names = ["a.sh", "b.sh", "c.sh"]
+    remote_names = transfer_slurm_bundle_to_remote(names, machine_config, dedupe=True)
+
+    # Scripts identical apart from their name are stored once, without the name
+    assert remote_names["a.sh"] == remote_names["b.sh"] != remote_names["c.sh"]
+    assert len(os.listdir(remote / "slurm" / "store")) == 2
+    content = (remote / "slurm" / remote_names["a.sh"]).read_text()
+    assert content == "#!/bin/bash\ntrain\n"
+    assert len(commands) == 2  # Existence check and transfer
+
+    # Nothing is transferred when the machine already has every script
+    commands.clear()
+    assert (
+        transfer_slurm_bundle_to_remote(names, machine_config, dedupe=True)
+        == remote_names
+    )
+    assert len(commands) == 1
+
+
+def test_transfer_large_bundle_to_remote_dedupe(
+    tmp_path, mock_load_config, monkeypatch
+):
+    os.makedirs(tmp_path / "slurm")
+    names = [f"job_{i}.sh" for i in range(3000)]
+    for name in names:
+        (tmp_path / "slurm" / name).write_text(f"#!/bin/bash\necho {name}\n")
+    run = subprocess.run
+
+    def mock_run(command, **kwargs):
+        return run(["bash", "-c", command[-1]], **kwargs)
+
+    monkeypatch.setattr("subprocess.run", mock_run)
+    machine_config = {"hostname": "remote", "path": str(tmp_path / "remote")}
+    # The names of the scripts do not fit on a single command line
+    remote_names = transfer_slurm_bundle_to_remote(names, machine_config, dedupe=True)
+    assert len(set(remote_names.values())) == 3000
+    assert len(os.listdir(tmp_path / "remote" / "slurm" / "store")) == 3000
+
+
 def test_transfer_script_to_remote_no_config_raises_error(mock_load_config):
     job_name = "job_name"
     with pytest.raises(ValueError) as excinfo:
@@ -321,3 +403,16 @@ def test_transfer_script_to_remote_no_machine_found_raises_error(mock_load_confi
         with pytest.raises(EnvironmentError) as excinfo:
             transfer_slurm_to_remote(job_name, machine_name=machine_name)
         assert "No configuration found for machine" in str(excinfo.value)
+
+
+def test_list_bundles(tmp_path, mock_load_config):
+    for name in ["sweep_1", "sweep_2", "other"]:
+        create_mock_job_file(tmp_path, name, {})
+    assert list_bundles(["sweep_*"]) == ["sweep_1", "sweep_2"]
+    assert list_bundles(["other", "sweep_?", "sweep_1", "new"]) == [
+        "other",
+        "sweep_1",
+        "sweep_2",
+        "new",
+    ]
+    assert list_bundles(["none_*"]) == []
@@ -0,0 +1,116 @@
+from milex_scheduler.definitions import SHELL_TIMESTAMP
+from milex_scheduler.job_to_slurm import write_slurm_content
+import subprocess
+import tarfile
+import json
+import pytest
+
+
+@pytest.mark.parametrize("instrument", [False, True])
+def test_stage_in_and_out(tmp_path, instrument):
+    milex = tmp_path / "milex"
+    (milex / "data").mkdir(parents=True)
+    (milex / "slurm").mkdir()
+    (milex / "data" / "input.txt").write_text("hello")
+    (milex / "data" / "extra.txt").write_text("world")
+    with tarfile.open(milex / "data" / "archive.tar.gz", "w:gz") as tar:
+        tar.add(milex / "data" / "extra.txt", arcname="extracted/extra.txt")
+    job = {
+        "name": "job",
+        "script": "sh -c 'cat $MILEX_SCRATCH/input.txt $MILEX_SCRATCH/extracted/extra.txt > $MILEX_SCRATCH/out.txt; exit 3'",
+        "slurm": {},
+        "stage_in": ["$MILEX/data/input.txt", "$MILEX/data/archive.tar.gz"],
+        "stage_out": ["out.txt", "missing.txt"],
+        "instrument": instrument,
+    }
+    script = tmp_path / "job.sh"
+    with open(script, "w") as f:
+        write_slurm_content(f, job, {"path": str(milex)})
+    scratch = tmp_path / "scratch"
+    scratch.mkdir()
+    result = subprocess.run(
+        ["bash", str(script)],
+        capture_output=True,
+        text=True,
+        env={
+            "PATH": "/usr/bin:/bin",
+            "SLURM_TMPDIR": str(scratch),
+            "SLURM_JOB_NAME": "job",
+            "SLURM_JOB_ID": "1",
+        },
+    )
+    # The outputs are staged out although the main command failed
+    assert result.returncode == 3
+    assert (milex / "results" / "job" / "out.txt").read_text() == "helloworld"
+    assert "milex: stage_in took" in result.stdout
+    assert "milex: stage_out took" in result.stdout
+    assert "output missing.txt not found" in result.stderr
+    if instrument:
+        sidecar = json.loads((milex / "slurm" / "job-1.milex.json").read_text())
+        assert [s["name"] for s in sidecar["sections"]] == [
+            "env",
+            "pre_commands",
+            "stage_in",
+            "main",
+            "stage_out",
+        ]
+
+
+def test_array_tasks_without_slurm_tmpdir(tmp_path):
+    milex = tmp_path / "milex"
+    milex.mkdir()
+    job = {
+        "name": "job",
+        "script": 'sh -c "echo $SLURM_ARRAY_TASK_ID > $MILEX_SCRATCH/out.txt"',
+        "slurm": {"array": "1-2"},
+        "stage_out": ["out.txt"],
+    }
+    script = tmp_path / "job.sh"
+    with open(script, "w") as f:
+        write_slurm_content(f, job, {"path": str(milex)})
+    tmp = tmp_path / "tmp"
+    tmp.mkdir()
+    for task in ["1", "2"]:
+        result = subprocess.run(
+            ["bash", str(script)],
+            capture_output=True,
+            text=True,
+            env={
+                "PATH": "/usr/bin:/bin",
+                "TMPDIR": str(tmp),
+                "SLURM_JOB_NAME": "job",
+                "SLURM_ARRAY_TASK_ID": task,
+            },
+        )
+        assert result.returncode == 0
+    # Each task keeps its own outputs, and the temporary scratch directories are removed
+    for task in ["1", "2"]:
+        assert (milex / "results" / "job" / task / "out.txt").read_text() == f"{task}\n"
+    assert list(tmp.iterdir()) == []
+
+
+def test_failed_stage_in(tmp_path):
+    job = {"name": "job", "script": "echo", "slurm": {}, "stage_in": ["/missing"]}
+    script = tmp_path / "job.sh"
+    with open(script, "w") as f:
+        write_slurm_content(f, job, {"path": str(tmp_path)})
+    result = subprocess.run(
+        ["bash", str(script)],
+        capture_output=True,
+        text=True,
+        env={"PATH": "/usr/bin:/bin", "SLURM_TMPDIR": str(tmp_path)},
+    )
+    assert result.returncode == 1
+    assert "stage_in of /missing failed" in result.stderr
+
+
+@pytest.mark.parametrize("setup", ["", "unset EPOCHREALTIME;"])
+def test_shell_timestamp(setup):
+    # Without $EPOCHREALTIME (bash < 5), falls back to 'date +%s', which is portable
+    result = subprocess.run(
+        ["bash", "-c", f"{setup} echo {SHELL_TIMESTAMP}"],
+        capture_output=True,
+        text=True,
+        env={"PATH": "/usr/bin:/bin"},
+    )
+    assert float(result.stdout) > 1.7e9
@@ -0,0 +1,47 @@
+from milex_scheduler.tracing import (
+    span,
+    traced,
+    enable_tracing,
+    disable_tracing,
+    write_trace,
+    trace_summary,
+)
+from milex_scheduler import dependency_graph
+import json
+
+
+def test_spans_are_noop_when_disabled():
+    disable_tracing()
+    with span("phase"):
+        pass
+    assert disable_tracing() == []
+
+
+def test_spans_recorded_and_written(tmp_path):
+    @traced()
+    def phase():
+        with span("inner", job="A"):
+            pass
+
+    enable_tracing()
+    phase()
+    dependency_graph({"A": {}, "B": {"dependencies": ["A"]}})
+    events = disable_tracing()
+    assert [e["name"] for e in events] == ["inner", "phase", "dependency_graph"]
+    assert events[0]["args"] == {"job": "A"}
+    assert all(e["ph"] == "X" and e["dur"] >= 0 for e in events)
+
+    path = tmp_path / "trace.json"
+    write_trace(str(path), events)
+    with open(path) as f:
+        assert len(json.load(f)["traceEvents"]) == 3
+    summary = trace_summary(events)
+    assert summary.splitlines()[0].split() == [
+        "Phase",
+        "Calls",
+        "Total",
+        "(s)",
+        "Mean",
+        "(ms)",
+    ]
+    assert len(summary.splitlines()) == 4